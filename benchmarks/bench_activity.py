@@ -0,0 +1,74 @@
+"""Benchmark of the trade activity tables, integer binning against the previous groupby and
+per-row formatting
+
+The legacy columns are the monthly transactions and the counts per day and hour as computed
+before scr.activity; the new ones add the turnover per month and the weekday by hour heatmap.
+
+run from the root of the repository: python -m benchmarks.bench_activity
+"""
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from scr.activity import monthly_activity, weekday_hour
+
+
+def _transactions(n_rows, years=10, seed=0):
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp("2012-01-01").value
+    seconds = rng.integers(0, years * 365 * 86400, n_rows)
+    return pd.DataFrame(
+        {
+            "Time": pd.to_datetime(start + seconds * 10 ** 9),
+            "Action": pd.Categorical.from_codes(rng.integers(0, 2, n_rows), ["buy", "sell"]),
+            "No. of shares": rng.uniform(1, 100, n_rows).round(2),
+            "pirce_per_share_eur": rng.uniform(5, 500, n_rows),
+        }
+    )
+
+
+def legacy_monthly(tr):
+    mt = (
+        tr.groupby(by=[pd.Grouper(key="Time", freq="M"), "Action"], observed=True)["Action"]
+        .count()
+        .rename("transactions")
+        .reset_index()
+    )
+    mt["mnth_yr"] = mt["Time"].apply(lambda x: x.strftime("%b-%Y"))
+    return mt
+
+
+def legacy_trading_times(tr):
+    day_counts = tr.Time.dt.day_name().value_counts()
+    hour_counts = tr.Time.round("1h").dt.time.value_counts()
+    return day_counts, hour_counts
+
+
+def _timeit(func, *args, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    print(
+        f"{'rows':>9} {'legacy month [s]':>17} {'month [s]':>10} {'legacy times [s]':>17}"
+        f" {'heatmap [s]':>12} {'heatmap tz [s]':>15}"
+    )
+    for n_rows in [10_000, 100_000, 1_000_000]:
+        tr = _transactions(n_rows)
+        print(
+            f"{n_rows:9d} {_timeit(legacy_monthly, tr):17.3f} {_timeit(monthly_activity, tr):10.3f}"
+            f" {_timeit(legacy_trading_times, tr):17.3f} {_timeit(weekday_hour, tr.Time):12.3f}"
+            f" {_timeit(weekday_hour, tr.Time, 'Europe/London'):15.3f}"
+        )
+
+
+if __name__ == "__main__":
+    warnings.simplefilter("ignore")
+    main()
@@ -0,0 +1,90 @@
+"""Spec size and build time of the candlestick chart, per-layer data against shared data and
+weekly or monthly bars
+
+The time covers building the chart and serializing its Vega-Lite spec on the server, as done
+before sending it to the browser; the drawing time in the browser is not measured.
+
+run from the root of the repository: python -m benchmarks.bench_altair
+"""
+import time
+import warnings
+
+import altair as alt
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import generate_prices
+from scr.plotting import plot_transactions, plot_transactions_2
+
+
+def _inputs(years, n_transactions=50):
+    start = pd.Timestamp("2010-01-04")
+    bars = generate_prices(["T0000"], start, start + pd.DateOffset(years=years))["T0000"]
+    # as read_ticker_ts
+    ts = bars.rename_axis("date").reset_index()
+    ts.columns = [column.lower() for column in ts.columns]
+
+    rng = np.random.default_rng(0)
+    rows = np.sort(rng.integers(0, len(ts), n_transactions))
+    subset = pd.DataFrame(
+        {
+            "Time": ts["date"].to_numpy()[rows],
+            "Price / share": ts["close"].to_numpy()[rows],
+            "action": np.where(rng.random(n_transactions) < 0.5, "buy", "sell"),
+            "No. of shares": np.round(rng.uniform(1, 10, n_transactions), 2),
+            "textof": "|",
+        }
+    )
+    return subset, ts
+
+
+def _per_layer(subset, ts):
+    """the candlesticks with the whole frames given to each layer"""
+    color = alt.condition(
+        "datum.open <= datum.close", alt.value("#06982d"), alt.value("#ae1325")
+    )
+    base = alt.Chart(ts).encode(alt.X("date:T"), color=color)
+    rule = base.mark_rule().encode(alt.Y("low:Q", scale=alt.Scale(zero=False)), alt.Y2("high:Q"))
+    bar = base.mark_bar(size=2).encode(alt.Y("open:Q"), alt.Y2("close:Q")).interactive()
+    annotation = (
+        alt.Chart(subset)
+        .mark_text(dx=7)
+        .encode(x="Time:T", y="Price / share:Q", text="label:N", color="action:N")
+        .transform_calculate(label='datum.action + " " + datum["No. of shares"]')
+    )
+    text = alt.Chart(subset).mark_text(angle=90).encode(
+        x="Time:T", y="Price / share:Q", text="textof:N", color="action:N"
+    )
+    return rule + bar + annotation + text
+
+
+def _measure(build, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        spec = build().to_json()
+        best = min(best, time.perf_counter() - t0)
+    return len(spec), best
+
+
+def main():
+    print(f"{'years':>5} {'chart':<22} {'spec [kB]':>10} {'time [ms]':>10}")
+    for years in [1, 5, 10]:
+        subset, ts = _inputs(years)
+        charts = [
+            ("per layer", lambda: _per_layer(subset, ts)),
+            ("shared", lambda: plot_transactions(subset, ts)),
+            ("shared, weekly", lambda: plot_transactions(subset, ts, freq="W")),
+            ("shared, monthly", lambda: plot_transactions(subset, ts, freq="M")),
+            ("shared, auto", lambda: plot_transactions(subset, ts, freq="auto")),
+            ("close line", lambda: plot_transactions_2(subset, ts)),
+            ("close line, auto", lambda: plot_transactions_2(subset, ts, freq="auto")),
+        ]
+        for name, build in charts:
+            n_bytes, seconds = _measure(build)
+            print(f"{years:5d} {name:<22} {n_bytes / 1e3:10.1f} {1e3 * seconds:10.1f}")
+
+
+if __name__ == "__main__":
+    warnings.simplefilter("ignore")
+    main()
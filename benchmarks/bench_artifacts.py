@@ -0,0 +1,53 @@
+"""Serving a known export from the artifact store against preprocessing it again
+
+The preprocessing reads the prices from a LocalProvider, so the time of downloading them, which
+a new worker pays as well, is not included.
+
+run from the root of the repository: python -m benchmarks.bench_artifacts
+"""
+import os
+import tempfile
+import time
+import warnings
+
+from benchmarks.suite import SIZES
+from benchmarks.synthetic import generate_portfolio
+from scr.artifacts import ArtifactStore, _size
+from scr.dashboard import Dashboard
+from scr.data_preparation import data_preprocessing
+from scr.market_data import LocalProvider
+from scr.memo import content_hash
+
+
+def main():
+    print(
+        f"{'size':>8} {'preprocess [s]':>15} {'put [s]':>8} {'get [s]':>8} {'disk [MB]':>10}"
+    )
+    for size, params in SIZES.items():
+        export, frames = generate_portfolio(**params)
+        with tempfile.TemporaryDirectory() as directory:
+            fln = os.path.join(directory, "transactions.csv")
+            export.to_csv(fln, index=False)
+            fln_hash = content_hash(fln)
+
+            t0 = time.perf_counter()
+            result = data_preprocessing(fln, LocalProvider(frames))
+            pnl = Dashboard(result[0], result[1], result[4], result[3]).section("pnl")
+            t_cold = time.perf_counter() - t0
+
+            store = ArtifactStore(os.path.join(directory, "artifacts"))
+            t0 = time.perf_counter()
+            store.put(fln_hash, result, {"pnl": pnl})
+            t_put = time.perf_counter() - t0
+
+            # as a new worker would
+            t0 = time.perf_counter()
+            ArtifactStore(store.directory).get(fln_hash)
+            t_get = time.perf_counter() - t0
+            nbytes = _size(store.directory)
+        print(f"{size:>8} {t_cold:15.3f} {t_put:8.3f} {t_get:8.3f} {nbytes / 1e6:10.1f}")
+
+
+if __name__ == "__main__":
+    warnings.simplefilter("ignore")
+    main()
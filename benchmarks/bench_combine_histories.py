@@ -0,0 +1,86 @@
+"""Benchmark of the panel-wide merge of transactions and prices against the per-ticker merge loop
+
+run from the root of the repository: python -m benchmarks.bench_combine_histories
+"""
+import time
+import warnings
+
+import pandas as pd
+
+from benchmarks.synthetic import generate_forex, generate_prices, generate_transactions
+from scr.data_preparation import combine_histories, feature_engineering
+from scr.fx import RateTable
+from scr.market_data import LocalProvider, download_forex
+from scr.utility import read_transactions
+
+
+def _legacy_merge_histories(tr_sub, tts_sub, ticker, df_forex):
+    merged = tts_sub.merge(right=tr_sub, left_on="time_ts", right_on="Time", how="outer")
+    merged = merged.merge(df_forex, left_on="time_ts", right_on="date")
+    merged["cum_shares"] = merged["cum_shares"].fillna(method="ffill")
+    merged["value"] = merged["close_price"] * merged["cum_shares"] * merged["rate"]
+    merged["ticker"] = ticker
+    merged["cum_total_eur"] = merged["cum_total_eur"].fillna(method="ffill")
+    merged["value"] = merged["value"].fillna(method="ffill")
+    return merged
+
+
+def legacy_combine_histories(tr, data, df_forex, tickers):
+    """the loop over tickers, with two merges per ticker"""
+    dfs = []
+    groups = tr.groupby(by="Ticker")
+    for ticker in tickers:
+        tr_sub = groups.get_group(ticker).copy()[
+            ["Time", "Ticker", "Action", "No. of shares", "cum_shares", "cum_total_eur", "profit_eur"]
+        ]
+        tr_sub["Time"] = tr_sub["Time"].dt.floor("d")
+        # the export was read with object columns at the time
+        tr_sub[["Ticker", "Action"]] = tr_sub[["Ticker", "Action"]].astype("object")
+        tts_sub = data[[("Close", ticker)]].reset_index()
+        tts_sub.columns = ["time_ts", "close_price"]
+        dfs.append(_legacy_merge_histories(tr_sub, tts_sub, ticker, df_forex))
+    df_combined = pd.concat(dfs)
+    return df_combined.drop_duplicates(subset=["time_ts", "ticker"], keep="last")
+
+
+def _inputs(n_tickers, years):
+    fln = f"/tmp/bench_combine_{n_tickers}.csv"
+    n_rows = 20 * n_tickers * years
+    export = generate_transactions(n_rows, n_tickers=n_tickers)
+    export.to_csv(fln, index=False)
+    tr = feature_engineering(read_transactions(fln))
+
+    start, end = tr.Time.min(), tr.Time.max() + pd.Timedelta(days=1)
+    frames = generate_prices(sorted(tr.Ticker.unique()), start.floor("d"), end)
+    frames["USDEUR%3DX"] = generate_forex(start.floor("d"), end)
+    provider = LocalProvider(frames)
+    tickers = tr.Ticker.unique().tolist()
+    data = provider.download(tickers, start.floor("d"), end)
+    df_forex = download_forex("USDEUR%3DX", start.floor("d"), end, provider)
+    rates = RateTable.from_provider(["USD"], start.floor("d"), end, provider)
+    return tr, data, df_forex, rates, tickers
+
+
+def _timeit(func, *args):
+    t0 = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - t0
+
+
+def main():
+    warnings.simplefilter("ignore", FutureWarning)
+    print(f"{'tickers':>8} {'rows':>9} {'panel [s]':>10} {'loop [s]':>9}")
+    for n_tickers in [50, 200, 500, 1000]:
+        tr, data, df_forex, rates, tickers = _inputs(n_tickers, years=3)
+        df_combined, t_new = _timeit(combine_histories, tr, data, rates, tickers)
+        t_old = ""
+        if n_tickers <= 500:
+            expected, t = _timeit(legacy_combine_histories, tr, data, df_forex, tickers)
+            # the legacy merge has no dividends
+            pd.testing.assert_frame_equal(df_combined.drop(columns="dividend_eur"), expected)
+            t_old = f"{t:9.3f}"
+        print(f"{n_tickers:8d} {len(df_combined):9d} {t_new:10.3f} {t_old:>9}")
+
+
+if __name__ == "__main__":
+    main()
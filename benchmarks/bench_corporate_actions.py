@@ -0,0 +1,71 @@
+"""Benchmark of the corporate actions: cost of the split adjustment of the transactions and of the
+dividends of the position panel, against bars without corporate actions
+
+Every ticker gets a split every few years and a quarterly dividend.
+
+run from the root of the repository: python -m benchmarks.bench_corporate_actions
+"""
+import io
+import time
+import warnings
+
+import numpy as np
+
+from benchmarks.suite import SIZES
+from benchmarks.synthetic import generate_portfolio
+from scr.corporate_actions import adjust_splits
+from scr.data_preparation import preprocess_transactions
+from scr.market_data import LocalProvider, _to_panel
+from scr.utility import read_transactions
+
+
+def _with_actions(frames, seed=0):
+    """the bars with random splits and quarterly dividends, the currency pairs left as they are"""
+    rng = np.random.default_rng(seed)
+    actions = {}
+    for ticker, ts in frames.items():
+        ts = ts.copy()
+        if ticker.startswith("T"):
+            n_days = len(ts)
+            splits = np.zeros(n_days)
+            splits[rng.integers(0, n_days, max(1, n_days // 750))] = rng.choice([2.0, 3.0, 4.0])
+            dividends = np.zeros(n_days)
+            dividends[rng.integers(0, 63) :: 63] = rng.uniform(0.1, 1.0)
+            ts["Stock Splits"], ts["Dividends"] = splits, dividends
+        actions[ticker] = ts
+    return actions
+
+
+def _timeit(func, *args, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    print(
+        f"{'size':>8} {'rows':>8} {'adjust [s]':>11} {'preprocess [s]':>15}"
+        f" {'with actions [s]':>17} {'dividends [EUR]':>16}"
+    )
+    for size, params in SIZES.items():
+        export, frames = generate_portfolio(**params)
+        tr = read_transactions(io.StringIO(export.to_csv(index=False)))
+        plain, actions = LocalProvider(frames), LocalProvider(_with_actions(frames))
+        data = _to_panel(actions.frames, tr.Ticker.dropna().unique())
+
+        t_adjust = _timeit(adjust_splits, tr, data)
+        t_plain = _timeit(preprocess_transactions, tr, plain)
+        t_actions = _timeit(preprocess_transactions, tr, actions)
+        positions = preprocess_transactions(tr, actions)[0]
+        print(
+            f"{size:>8} {len(tr):8d} {t_adjust:11.4f} {t_plain:15.3f} {t_actions:17.3f}"
+            f" {positions.dividend_eur.sum():16,.0f}"
+        )
+
+
+if __name__ == "__main__":
+    warnings.simplefilter("ignore")
+    main()
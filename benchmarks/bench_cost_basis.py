@@ -0,0 +1,82 @@
+"""Benchmark of the cost-basis engine against the previous per-sell implementation
+
+run from the root of the repository: python -m benchmarks.bench_cost_basis
+"""
+import time
+
+import pandas as pd
+
+from benchmarks.synthetic import generate_transactions
+from scr.cost_basis import cost_basis
+from scr.utility import read_transactions
+
+
+def _legacy_calculate_average_price(group):
+    group["cum_total_eur"] = group["invested_amount_eur"].cumsum()
+    group["ave_price_eur"] = group["cum_total_eur"] / group["cum_shares"]
+    return group
+
+
+def _legacy_calculate_return(group):
+    """the iterrows implementation, recomputing the average price after every sell"""
+    mask_buy = group["Action"] == "buy"
+    mask_sell = group["Action"] == "sell"
+    group.loc[mask_buy, "action_sign"] = 1
+    group.loc[mask_sell, "action_sign"] = -1
+    group["cum_shares"] = (group["No. of shares"] * group["action_sign"]).cumsum()
+    group["pirce_per_share_eur"] = group["Price / share"] / group["Exchange rate"].astype(
+        "float"
+    )
+    group["invested_amount_eur"] = group["No. of shares"] * group["pirce_per_share_eur"]
+    group = _legacy_calculate_average_price(group)
+    for idx, row in group[mask_sell].iterrows():
+        group.loc[idx, "invested_amount_eur"] = (
+            -group.loc[idx, "No. of shares"] * group.loc[idx - 1, "ave_price_eur"]
+        )
+        group.loc[idx, "ave_price_eur"] = group.loc[idx - 1, "ave_price_eur"]
+        group = _legacy_calculate_average_price(group)
+    group.loc[mask_sell, "profit_eur"] = (
+        group.loc[mask_sell, "pirce_per_share_eur"] * group.loc[mask_sell, "No. of shares"]
+        + group.loc[mask_sell, "invested_amount_eur"]
+    )
+    return group
+
+
+def legacy_feature_engineering(tr):
+    groups = []
+    for name, group in tr.groupby(by="Ticker"):
+        group.reset_index(inplace=True, drop=True)
+        groups.append(_legacy_calculate_return(group))
+    return pd.concat(groups).reset_index(drop=True)
+
+
+def _transactions(n_rows, n_tickers):
+    fln = f"/tmp/bench_cost_basis_{n_rows}.csv"
+    generate_transactions(n_rows, n_tickers=n_tickers).to_csv(fln, index=False)
+    return read_transactions(fln)
+
+
+def _timeit(func, tr, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func(tr.copy())
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    print(f"{'rows':>8} {'engine [s]':>11} {'us/row':>7} {'legacy [s]':>11}")
+    for n_rows in [1_000, 4_000, 16_000, 64_000, 256_000]:
+        tr = _transactions(n_rows, n_tickers=50)
+        t_new = _timeit(cost_basis, tr)
+        t_old = ""
+        if n_rows <= 4_000:
+            expected = legacy_feature_engineering(tr.copy())
+            pd.testing.assert_frame_equal(cost_basis(tr.copy()), expected)
+            t_old = f"{_timeit(legacy_feature_engineering, tr, repeat=1):11.3f}"
+        print(f"{n_rows:8d} {t_new:11.3f} {1e6 * t_new / n_rows:7.2f} {t_old:>11}")
+
+
+if __name__ == "__main__":
+    main()
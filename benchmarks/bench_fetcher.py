@@ -0,0 +1,58 @@
+"""Throughput of the concurrent chart fetcher against a local mock server
+
+run from the root of the repository: python -m benchmarks.bench_fetcher
+"""
+import time
+
+import pandas as pd
+
+from benchmarks.mock_chart_server import MockChartServer
+from benchmarks.synthetic import generate_prices
+from scr.fetcher import ChartProvider
+
+START, END = pd.Timestamp("2018-01-01"), pd.Timestamp("2021-01-01")
+
+
+def check_failures(frames):
+    """retried tickers come through, unknown ones are reported"""
+    tickers = list(frames)[:10]
+    flaky = {ticker: 2 for ticker in tickers[:5]}
+    server = MockChartServer(frames, flaky=flaky)
+    provider = ChartProvider(server.url, max_workers=4, backoff=0.01)
+    failures = {}
+    data = provider.download(tickers + ["UNKNOWN1", "UNKNOWN2"], START, END, failures)
+    server.shutdown()
+
+    for ticker in tickers:
+        expected = frames[ticker].loc[START:END - pd.Timedelta(days=1)]
+        pd.testing.assert_frame_equal(
+            data.xs(ticker, axis=1, level=1).loc[expected.index, expected.columns], expected, check_freq=False,
+            check_names=False,
+        )
+    assert sorted(failures) == ["UNKNOWN1", "UNKNOWN2"]
+    print("failures:", [err.to_dict() for err in failures.values()])
+
+
+def main():
+    tickers = [f"T{i:04d}" for i in range(200)]
+    frames = generate_prices(tickers, START, END)
+    check_failures(frames)
+
+    latency = 0.02
+    print(f"200 tickers, 3 years of daily bars, {1000 * latency:.0f} ms latency per request")
+    print(f"{'workers':>8} {'time [s]':>9} {'tickers/s':>10} {'connections':>12}")
+    for max_workers in [1, 2, 4, 8, 16, 32]:
+        server = MockChartServer(frames, latency=latency)
+        provider = ChartProvider(server.url, max_workers=max_workers)
+        t0 = time.perf_counter()
+        provider.download(tickers, START, END)
+        elapsed = time.perf_counter() - t0
+        stats = server.shutdown()
+        print(
+            f"{max_workers:8d} {elapsed:9.2f} {len(tickers) / elapsed:10.1f}"
+            f" {stats['connections']:12d}"
+        )
+
+
+if __name__ == "__main__":
+    main()
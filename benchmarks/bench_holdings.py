@@ -0,0 +1,48 @@
+"""Holdings as of a date, from the holdings index against slicing the daily positions
+
+run from the root of the repository: python -m benchmarks.bench_holdings
+"""
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.bench_rendering import _dashboard
+from benchmarks.suite import SIZES
+
+
+def _sliced(positions, day):
+    df = positions.slice(day, day + pd.Timedelta(days=1)).to_frame()
+    return df.loc[df["cum_shares"] > 0.25]
+
+
+def main(n_queries=50):
+    print(f"{'size':>8} {'build [ms]':>11} {'slice [ms]':>11} {'index [ms]':>11}")
+    for size, params in SIZES.items():
+        dash = _dashboard(params)
+        positions = dash.positions
+        days = positions.days[np.random.default_rng(0).integers(0, len(positions.days), n_queries)]
+
+        t0 = time.perf_counter()
+        holdings = dash.section("holdings")["holdings"]
+        t_build = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        for day in days:
+            _sliced(positions, day)
+        t_slice = (time.perf_counter() - t0) / n_queries
+
+        t0 = time.perf_counter()
+        for day in days:
+            holdings.composition(day)
+        t_index = (time.perf_counter() - t0) / n_queries
+
+        print(
+            f"{size:>8} {1e3 * t_build:11.2f} {1e3 * t_slice:11.2f} {1e3 * t_index:11.2f}"
+        )
+
+
+if __name__ == "__main__":
+    warnings.simplefilter("ignore")
+    main()
@@ -0,0 +1,77 @@
+"""Cold start of the data engine: import time of the modules and the libraries they load
+
+Each module is imported in a fresh interpreter. The data engine must not load the plotting,
+fetching or app libraries, and may take at most BUDGET seconds on top of pandas and numpy.
+
+run from the root of the repository: python -m benchmarks.bench_import
+
+The exit code is 1 when a module loads a heavy library or exceeds the budget.
+"""
+import json
+import os
+import subprocess
+import sys
+
+# modules of the data engine, imported by the batch jobs and the workers
+MODULES = [
+    "scr.utility",
+    "scr.cost_basis",
+    "scr.data_preparation",
+    "scr.incremental",
+    "scr.dashboard",
+    "scr.batch",
+    "scr.analytics",
+    "scr.service",
+]
+
+# libraries only the charts, the app or the network providers need
+HEAVY = ["altair", "panel", "plotly", "streamlit", "yfinance", "requests"]
+
+# seconds allowed on top of importing pandas and numpy
+BUDGET = 0.25
+
+_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - t0
+print(json.dumps({{"seconds": seconds, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def import_time(module, repeat=3):
+    """best import time of a module in a fresh interpreter, and the heavy libraries it loaded"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=root)
+    best = None
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY)],
+            capture_output=True, text=True, check=True, cwd=root, env=env,
+        )
+        result = json.loads(out.stdout.splitlines()[-1])
+        if best is None or result["seconds"] < best["seconds"]:
+            best = result
+    return best
+
+
+def main():
+    baseline = import_time("pandas, numpy")["seconds"]
+    print(f"pandas and numpy: {baseline:.3f} s, budget {BUDGET:.2f} s on top\n")
+    print(f"{'module':<22} {'seconds':>8} {'extra':>7}  result")
+    ok = True
+    for module in MODULES:
+        result = import_time(module)
+        extra = result["seconds"] - baseline
+        status = "ok"
+        if result["loaded"]:
+            status = "loads " + ", ".join(result["loaded"])
+        elif extra > BUDGET:
+            status = "over budget"
+        ok = ok and status == "ok"
+        print(f"{module:<22} {result['seconds']:8.3f} {extra:7.3f}  {status}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
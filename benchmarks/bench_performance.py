@@ -0,0 +1,90 @@
+"""Benchmark of the returns engine: TWR and XIRR of the portfolio and of every ticker over rolling
+windows, batched against a Newton loop per window and ticker
+
+The windows are the standard ones and a year ending on every month end of the history.
+
+run from the root of the repository: python -m benchmarks.bench_performance
+"""
+import io
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.suite import SIZES
+from benchmarks.synthetic import generate_portfolio
+from scr.data_preparation import preprocess_transactions
+from scr.market_data import LocalProvider
+from scr.performance import ReturnsEngine, standard_windows
+from scr.utility import read_transactions
+
+
+def _windows(days):
+    windows = standard_windows(days)
+    for end in pd.date_range(days[0], days[-1], freq="M"):
+        windows[f"1Y to {end:%Y-%m}"] = (end - pd.DateOffset(years=1) + pd.Timedelta(days=1), end)
+    return windows
+
+
+def scalar_xirr(engine, windows, tol=1e-10, max_iter=50):
+    """XIRR solved one window and name at a time, the cash flows selected per pair"""
+    first, last = engine._bounds(list(windows.values()))
+    days = engine._day(np.arange(len(engine.days) + 1))
+    years = (days - days[0]) / np.timedelta64(1, "D") / 365.0
+    rates = np.full((len(first), len(engine.names)), np.nan)
+    for w, (f, l) in enumerate(zip(first, last)):
+        for j in range(len(engine.names)):
+            cols = f + 1 + np.flatnonzero(engine.flows[j, f + 1 : l + 1])
+            tau = np.concatenate([[0.0], years[cols] - years[f], [years[l] - years[f]]])
+            amount = np.concatenate([[-engine.value[j, f]], -engine.flows[j, cols], [engine.value[j, l]]])
+            if not ((amount > 0).any() and (amount < 0).any()):
+                continue
+            x = 0.0
+            for _ in range(max_iter):
+                discounted = amount * np.exp(-x * tau)
+                slope = -(tau * discounted).sum()
+                if slope == 0:
+                    break
+                step = min(max(discounted.sum() / slope, -1.0), 1.0)
+                x -= step
+                if abs(step) < tol:
+                    rates[w, j] = np.expm1(x)
+                    break
+    return rates
+
+
+def _timeit(func, *args, repeat=3):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def main():
+    print(
+        f"{'size':>8} {'names':>6} {'windows':>8} {'engine [s]':>11} {'twr [s]':>8}"
+        f" {'xirr [s]':>9} {'scalar xirr [s]':>16} {'max diff':>9}"
+    )
+    for size, params in SIZES.items():
+        export, frames = generate_portfolio(**params)
+        tr = read_transactions(io.StringIO(export.to_csv(index=False)))
+        positions, tr = preprocess_transactions(tr, LocalProvider(frames))[:2]
+
+        t_engine, engine = _timeit(ReturnsEngine.from_positions, positions, tr)
+        windows = _windows(engine.days)
+        bounds = list(windows.values())
+        t_twr, _ = _timeit(engine.twr, bounds)
+        t_xirr, xirr = _timeit(engine.xirr, bounds)
+        t_scalar, scalar = _timeit(scalar_xirr, engine, windows, repeat=1)
+        print(
+            f"{size:>8} {len(engine.names):6d} {len(windows):8d} {t_engine:11.3f} {t_twr:8.4f}"
+            f" {t_xirr:9.3f} {t_scalar:16.3f} {np.nanmax(np.abs(xirr - scalar)):9.1e}"
+        )
+
+
+if __name__ == "__main__":
+    warnings.simplefilter("ignore")
+    main()
@@ -0,0 +1,67 @@
+"""Memory and slicing of the position panel against the long format of combine_histories
+
+run from the root of the repository: python -m benchmarks.bench_position_panel
+"""
+import os
+import tempfile
+import time
+import warnings
+
+import pandas as pd
+
+from benchmarks.suite import SIZES
+from benchmarks.synthetic import generate_portfolio
+from scr.data_preparation import data_preprocessing
+from scr.market_data import LocalProvider
+
+
+def _positions(params):
+    export, frames = generate_portfolio(**params)
+    with tempfile.TemporaryDirectory() as directory:
+        fln = os.path.join(directory, "transactions.csv")
+        export.to_csv(fln, index=False)
+        return data_preprocessing(fln, LocalProvider(frames))[0]
+
+
+def _timeit(func, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    print(
+        f"{'size':>8} {'rows':>9} {'long [MB]':>10} {'panel [MB]':>11} {'ratio':>6}"
+        f" {'filter [ms]':>12} {'slice [ms]':>11}"
+    )
+    for size, params in SIZES.items():
+        positions = _positions(params)
+        df_combined = positions.to_frame()
+        long_bytes = df_combined.memory_usage(deep=True).sum()
+
+        # one year of a tenth of the tickers
+        start = positions.days[len(positions.days) // 2]
+        end = start + pd.DateOffset(years=1)
+        tickers = list(positions.tickers.categories[::10])
+
+        def _filter():
+            return df_combined.loc[
+                (df_combined["time_ts"] >= start)
+                & (df_combined["time_ts"] < end)
+                & df_combined["ticker"].isin(tickers)
+            ]
+
+        t_filter = _timeit(_filter)
+        t_slice = _timeit(lambda: positions.slice(start, end, tickers))
+        print(
+            f"{size:>8} {len(positions):9d} {long_bytes / 1e6:10.1f} {positions.nbytes / 1e6:11.1f}"
+            f" {long_bytes / positions.nbytes:6.1f} {1e3 * t_filter:12.2f} {1e3 * t_slice:11.2f}"
+        )
+
+
+if __name__ == "__main__":
+    warnings.simplefilter("ignore")
+    main()
@@ -0,0 +1,56 @@
+"""Throughput and peak memory of read_transactions on large synthetic exports
+
+run from the root of the repository: python -m benchmarks.bench_read_transactions
+"""
+import os
+import time
+import tracemalloc
+
+import pandas as pd
+
+from benchmarks.synthetic import write_transactions
+from scr.utility import read_transactions
+
+
+def legacy_read_transactions(fln):
+    """read all the columns at once, then trim and classify the actions"""
+    tr = pd.read_csv(fln, parse_dates=["Time"])
+    tr = tr[
+        ["Action", "Time", "Ticker", "No. of shares", "Price / share", "Exchange rate", "Result (EUR)"]
+    ]
+    tr.loc[tr["Action"].str.contains("buy"), "Action"] = "buy"
+    tr.loc[tr["Action"].str.contains("sell"), "Action"] = "sell"
+    return tr.loc[tr["Action"].isin(["buy", "sell"])]
+
+
+def _measure(func, fln):
+    """run time, peak of the memory allocated while reading and size of the result"""
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    tr = func(fln)
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, tr.memory_usage(deep=True).sum()
+
+
+def main():
+    print(
+        f"{'rows':>9} {'file [MB]':>10} {'reader':>8} {'time [s]':>9} {'rows/s':>10}"
+        f" {'peak [MB]':>10} {'result [MB]':>12}"
+    )
+    for n_rows in [100_000, 1_000_000, 2_000_000]:
+        fln = f"/tmp/bench_read_{n_rows}.csv"
+        if not os.path.exists(fln):
+            write_transactions(fln, n_rows, n_tickers=500)
+        size = os.path.getsize(fln) / 1e6
+        for name, func in [("chunked", read_transactions), ("legacy", legacy_read_transactions)]:
+            elapsed, peak, result = _measure(func, fln)
+            print(
+                f"{n_rows:9d} {size:10.0f} {name:>8} {elapsed:9.2f} {n_rows / elapsed:10.0f}"
+                f" {peak / 1e6:10.0f} {result / 1e6:12.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
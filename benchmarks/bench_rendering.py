@@ -0,0 +1,92 @@
+"""Payload and serialization time of the charts, raw against downsampled and pre-binned
+
+The payload is the json of the figure sent to the browser, the time covers building and
+serializing the figure on the server; the drawing time in the browser is not measured.
+
+run from the root of the repository: python -m benchmarks.bench_rendering
+"""
+import os
+import tempfile
+import time
+import warnings
+
+import plotly.express as px
+import plotly.graph_objs as go
+
+from benchmarks.suite import SIZES
+from benchmarks.synthetic import generate_portfolio
+from scr.dashboard import PNL_SERIES, Dashboard
+from scr.data_preparation import data_preprocessing
+from scr.downsampling import render_mode
+from scr.market_data import LocalProvider
+
+
+def _dashboard(params):
+    export, frames = generate_portfolio(**params)
+    with tempfile.TemporaryDirectory() as directory:
+        fln = os.path.join(directory, "transactions.csv")
+        export.to_csv(fln, index=False)
+        positions, tr, start, end, data = data_preprocessing(fln, LocalProvider(frames))
+    return Dashboard(positions, tr, data, end)
+
+
+def _pnl_raw(dash):
+    df_agg = dash.section("pnl")["df_agg"]
+    return px.line(df_agg, x="time", y=PNL_SERIES)
+
+
+def _pnl_fast(dash):
+    df_plot = dash.section("pnl")["df_agg_plot"]
+    return px.line(
+        df_plot, x="time", y=PNL_SERIES, render_mode=render_mode(len(df_plot) * len(PNL_SERIES))
+    )
+
+
+def _times_raw(dash):
+    # one value per transaction, binned by the browser
+    tr = dash.tr
+    fig = go.Figure()
+    fig.add_trace(go.Histogram(x=sorted(tr.Time.dt.day_name())))
+    fig.add_trace(go.Histogram(x=sorted(tr.Time.round("1h").dt.time)))
+    return fig
+
+
+def _times_fast(dash):
+    trading_times = dash.section("trading_times")
+    fig = go.Figure()
+    for counts in [trading_times["day_counts"], trading_times["hour_counts"]]:
+        fig.add_trace(go.Bar(x=counts.index, y=counts.values))
+    return fig
+
+
+def _measure(build, dash, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        payload = build(dash).to_json()
+        best = min(best, time.perf_counter() - t0)
+    return len(payload), best
+
+
+def main():
+    print(
+        f"{'size':>8} {'chart':>14} {'raw [kB]':>9} {'fast [kB]':>10}"
+        f" {'raw [ms]':>9} {'fast [ms]':>10}"
+    )
+    for size, params in SIZES.items():
+        dash = _dashboard(params)
+        for chart, raw, fast in [
+            ("pnl", _pnl_raw, _pnl_fast),
+            ("trading times", _times_raw, _times_fast),
+        ]:
+            raw_bytes, raw_seconds = _measure(raw, dash)
+            fast_bytes, fast_seconds = _measure(fast, dash)
+            print(
+                f"{size:>8} {chart:>14} {raw_bytes / 1e3:9.1f} {fast_bytes / 1e3:10.1f}"
+                f" {1e3 * raw_seconds:9.1f} {1e3 * fast_seconds:10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    warnings.simplefilter("ignore")
+    main()
@@ -0,0 +1,57 @@
+"""Risk engine against recomputing the correlation of the whole history on each rerun
+
+run from the root of the repository: python -m benchmarks.bench_risk
+"""
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import generate_prices
+from scr.risk import RiskEngine
+
+
+def _prices(n_tickers, years=10):
+    tickers = [f"T{i:04d}" for i in range(n_tickers)]
+    start = pd.Timestamp("2010-01-04")
+    frames = generate_prices(tickers, start, start + pd.DateOffset(years=years))
+    return pd.DataFrame({ticker: frames[ticker]["Adj Close"] for ticker in tickers})
+
+
+def _full(prices):
+    returns = prices.pct_change()
+    return returns.corr(), returns.mean(), returns.std()
+
+
+def main():
+    print(
+        f"{'tickers':>8} {'days':>6} {'pandas [s]':>11} {'engine [s]':>11}"
+        f" {'new bar [ms]':>13} {'max diff':>9}"
+    )
+    for n_tickers in [50, 100, 200, 500]:
+        prices = _prices(n_tickers)
+
+        t0 = time.perf_counter()
+        corr, _, _ = _full(prices)
+        t_pandas = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        engine = RiskEngine().update(prices.iloc[:-1])
+        t_engine = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        engine = engine.update(prices)
+        engine.correlation()
+        t_bar = time.perf_counter() - t0
+
+        diff = np.nanmax(np.abs(engine.correlation().to_numpy() - corr.to_numpy()))
+        print(
+            f"{n_tickers:8d} {len(prices):6d} {t_pandas:11.3f} {t_engine:11.3f}"
+            f" {1e3 * t_bar:13.2f} {diff:9.1e}"
+        )
+
+
+if __name__ == "__main__":
+    warnings.simplefilter("ignore")
+    main()
@@ -0,0 +1,106 @@
+"""Local load generator of the HTTP service of scr.service
+
+Clients post synthetic exports concurrently, over kept-alive connections, to a service running
+in this process with the prices of a LocalProvider. Three loads are measured:
+
+    distinct    every request a different export, each one preprocessed
+    identical   all the clients post the same export at once, coalesced into one computation
+    repeated    the exports of the distinct load again, answered from the kept responses
+
+run from the root of the repository: python -m benchmarks.bench_service [--clients 16]
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmarks.synthetic import generate_portfolio
+from scr.analytics import Analytics
+from scr.market_data import LocalProvider
+from scr.service import AnalyticsService
+
+
+def _start(service):
+    """run the service on a free port, in a thread of its own"""
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+    ports = []
+
+    async def _serve():
+        server = await service.start("127.0.0.1", 0)
+        ports.append(server.sockets[0].getsockname()[1])
+        started.set()
+        await server.serve_forever()
+
+    threading.Thread(target=loop.run_until_complete, args=(_serve(),), daemon=True).start()
+    started.wait()
+    return ports[0]
+
+
+def _client(port, bodies, query):
+    """post the bodies one after the other, the latency of each request"""
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    latencies = []
+    for body in bodies:
+        t0 = time.perf_counter()
+        conn.request("POST", f"/analyze?{query}", body, {"Content-Type": "text/csv"})
+        response = conn.getresponse()
+        payload = response.read()
+        if response.status != 200:
+            raise RuntimeError(payload.decode())
+        latencies.append(time.perf_counter() - t0)
+    conn.close()
+    return latencies
+
+
+def _load(port, name, per_client, query):
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(len(per_client)) as pool:
+        latencies = sum(pool.map(lambda bodies: _client(port, bodies, query), per_client), [])
+    seconds = time.perf_counter() - t0
+    print(
+        f"{name:<10} {len(latencies):9d} {len(latencies) / seconds:8.1f}"
+        f" {1e3 * np.percentile(latencies, 50):9.1f} {1e3 * np.percentile(latencies, 95):9.1f}"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--exports", type=int, default=32, help="exports of the distinct load")
+    parser.add_argument("--sections", default="pnl,holdings,monthly,trading_times")
+    args = parser.parse_args(argv)
+
+    bodies = []
+    for seed in range(args.exports):
+        export, prices = generate_portfolio(
+            n_tickers=20, years=3, trades_per_month=40, seed=seed
+        )
+        bodies.append(export.to_csv(index=False).encode())
+        # the same tickers in all the exports, served at the prices of the first one
+        frames = prices if seed == 0 else frames
+    service = AnalyticsService(
+        Analytics(provider=LocalProvider(frames), maxsize=args.exports), args.exports
+    )
+    port = _start(service)
+    query = f"sections={args.sections}"
+
+    print(f"{'load':<10} {'requests':>9} {'req/s':>8} {'p50 [ms]':>9} {'p95 [ms]':>9}")
+    _load(port, "distinct", [bodies[i :: args.clients] for i in range(args.clients)], query)
+    _load(port, "identical", [[bodies[0]]] * args.clients, query + "&as_of=2019-06-28")
+    _load(port, "repeated", [bodies[i :: args.clients] for i in range(args.clients)], query)
+
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    conn.request("GET", "/stats")
+    print(json.loads(conn.getresponse().read()))
+
+
+if __name__ == "__main__":
+    warnings.simplefilter("ignore")
+    main()
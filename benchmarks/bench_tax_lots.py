@@ -0,0 +1,50 @@
+"""Benchmark of the lot matching (FIFO, LIFO) against the average price of cost_basis and the
+previous per-sell implementation
+
+The matching runs on the output of cost_basis, its time is on top of it. The time per row stays
+flat as the number of transactions grows, the matching being linear.
+
+run from the root of the repository: python -m benchmarks.bench_tax_lots
+"""
+import time
+import warnings
+
+from benchmarks.bench_cost_basis import _transactions, legacy_feature_engineering
+from scr.cost_basis import cost_basis
+from scr.tax_lots import realized_pnl
+
+
+def _timeit(func, *args, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    print(
+        f"{'rows':>8} {'legacy [s]':>11} {'average [s]':>12} {'fifo [s]':>9} {'lifo [s]':>9}"
+        f" {'fifo us/row':>12} {'lots':>8}"
+    )
+    for n_rows in [4_000, 16_000, 64_000, 256_000]:
+        tr = _transactions(n_rows, n_tickers=50)
+        t_old = ""
+        if n_rows <= 16_000:
+            t_old = f"{_timeit(legacy_feature_engineering, tr.copy(), repeat=1):11.3f}"
+        t_average = _timeit(cost_basis, tr.copy())
+
+        tr = cost_basis(tr)
+        t_fifo = _timeit(realized_pnl, tr, "fifo")
+        t_lifo = _timeit(realized_pnl, tr, "lifo")
+        _, lots = realized_pnl(tr, "fifo")
+        print(
+            f"{n_rows:8d} {t_old:>11} {t_average:12.3f} {t_fifo:9.3f} {t_lifo:9.3f}"
+            f" {1e6 * t_fifo / n_rows:12.2f} {len(lots):8d}"
+        )
+
+
+if __name__ == "__main__":
+    warnings.simplefilter("ignore")
+    main()
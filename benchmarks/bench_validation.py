@@ -0,0 +1,109 @@
+"""Overhead of the data-quality checks of scr.validation on large synthetic exports, against
+reading the export
+
+The clean exports pass all the checks, the dirty ones have one row in a hundred with a number
+that cannot be read, a missing exchange rate or a sell of more shares than held. The sells
+flagged by check_positions are first checked against a loop over the transactions.
+
+run from the root of the repository: python -m benchmarks.bench_validation
+"""
+import io
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import write_transactions
+from scr.utility import read_transactions
+from scr.validation import SHARES_TOLERANCE, check_positions, validate_transactions
+
+
+def _dirty(fln, seed=0):
+    """the export with one row in a hundred spoilt"""
+    export = pd.read_csv(fln, dtype="object")
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(export), len(export) // 100, replace=False)
+    kind = rows % 3
+    export.loc[rows[kind == 0], "Price / share"] = "n/a"
+    export.loc[rows[kind == 1], "Exchange rate"] = None
+    export.loc[rows[kind == 2], "Action"] = "Market sell"
+    export.loc[rows[kind == 2], "No. of shares"] = "1000000"
+    buffer = io.StringIO()
+    export.to_csv(buffer, index=False)
+    buffer.seek(0)
+    return buffer
+
+
+def _loop_positions(tr):
+    """sells of more shares than held, one transaction at a time, the position clipped at 0
+    after a sell flagged"""
+    held, bad = {}, []
+    for action, ticker, shares in tr[["Action", "Ticker", "No. of shares"]].itertuples(index=False):
+        position = held.get(ticker, 0.0) + (-shares if action == "sell" else shares)
+        flagged = action == "sell" and position < -SHARES_TOLERANCE
+        bad.append(flagged)
+        held[ticker] = 0.0 if flagged else position
+    return np.array(bad)
+
+
+def check_oversells(n_cases=200, seed=0):
+    """the sells flagged by check_positions against _loop_positions"""
+    # a sell after an oversell, of shares bought since, passes
+    tr = pd.DataFrame(
+        {"Action": ["buy", "sell", "buy", "sell"], "Ticker": "A", "No. of shares": [10, 15, 5, 5]}
+    )
+    _, report = check_positions(tr, policy="quarantine")
+    assert report.quarantined.index.tolist() == [1], report.quarantined
+
+    rng = np.random.default_rng(seed)
+    for _ in range(n_cases):
+        n = rng.integers(1, 40)
+        tr = pd.DataFrame(
+            {
+                "Action": np.where(rng.random(n) < 0.5, "sell", "buy"),
+                "Ticker": rng.choice(["A", "B", "C"], n),
+                "No. of shares": rng.integers(1, 10, n).astype("float"),
+            }
+        )
+        _, report = check_positions(tr, policy="quarantine")
+        bad = np.zeros(n, dtype="bool")
+        bad[report.quarantined.index] = True
+        assert (bad == _loop_positions(tr)).all(), tr
+    print(f"check_positions flags the same sells as a loop, {n_cases} random histories")
+
+
+def _timeit(func, *args, repeat=3):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        if isinstance(args[0], io.StringIO):
+            args[0].seek(0)
+        t0 = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def main():
+    check_oversells()
+    print(
+        f"{'rows':>9} {'export':>7} {'read [s]':>9} {'validate [s]':>13} {'positions [s]':>14}"
+        f" {'overhead':>9} {'quarantined':>12}"
+    )
+    for n_rows in [100_000, 1_000_000, 2_000_000]:
+        fln = f"/tmp/bench_read_{n_rows}.csv"
+        if not os.path.exists(fln):
+            write_transactions(fln, n_rows, n_tickers=500)
+        for name, source in [("clean", fln), ("dirty", _dirty(fln))]:
+            t_read, tr = _timeit(read_transactions, source)
+            t_validate, (tr, report) = _timeit(validate_transactions, tr, "quarantine")
+            t_positions, (tr, positions) = _timeit(check_positions, tr, None, "quarantine")
+            quarantined = len(report.quarantined) + len(positions.quarantined)
+            print(
+                f"{n_rows:9d} {name:>7} {t_read:9.2f} {t_validate:13.3f} {t_positions:14.3f}"
+                f" {(t_validate + t_positions) / t_read:9.1%} {quarantined:12d}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Local stand-in for the chart API of yahoo finance, serving synthetic daily bars"""
+import bisect
+import json
+import multiprocessing
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+import numpy as np
+
+
+def _columns(ts):
+    """timestamps and values of the daily bars, as lists ready to be serialised"""
+    epoch = ts.index.values.astype("datetime64[s]").astype("int64").tolist()
+    values = {
+        column: [None if np.isnan(v) else float(v) for v in ts[column]]
+        for column in ["Open", "High", "Low", "Close", "Volume", "Adj Close"]
+    }
+    return epoch, values
+
+
+def chart_payload(columns, start, end):
+    """response of the chart API for the daily bars between the timestamps start and end"""
+    epoch, values = columns
+    i, j = bisect.bisect_left(epoch, start), bisect.bisect_left(epoch, end)
+    return {
+        "chart": {
+            "result": [
+                {
+                    "meta": {"gmtoffset": 0},
+                    "timestamp": epoch[i:j],
+                    "indicators": {
+                        "quote": [
+                            {
+                                "open": values["Open"][i:j],
+                                "high": values["High"][i:j],
+                                "low": values["Low"][i:j],
+                                "close": values["Close"][i:j],
+                                "volume": values["Volume"][i:j],
+                            }
+                        ],
+                        "adjclose": [{"adjclose": values["Adj Close"][i:j]}],
+                    },
+                }
+            ],
+            "error": None,
+        }
+    }
+
+
+class ChartHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep the connections alive
+    wbufsize = -1  # headers and body in one write
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        ticker = unquote(url.path.rsplit("/", 1)[-1])
+        query = parse_qs(url.query)
+        time.sleep(server.latency)
+
+        with server.lock:
+            server.requests += 1
+            server.connections.add(self.client_address)
+            flaky = server.flaky.get(ticker, 0)
+            if flaky:
+                server.flaky[ticker] = flaky - 1
+
+        if flaky:
+            self._reply(503, {"chart": {"result": None, "error": None}})
+        elif ticker not in server.frames:
+            error = {"code": "Not Found", "description": "No data found, symbol may be delisted"}
+            self._reply(404, {"chart": {"result": None, "error": error}})
+        else:
+            start, end = int(query["period1"][0]), int(query["period2"][0])
+            self._reply(200, chart_payload(server.frames[ticker], start, end))
+
+    def log_message(self, *args):
+        pass
+
+
+class MockChartServer:
+    """mock chart API running in a separate process, so that it does not compete with the
+    client for the GIL
+
+    Args:
+        frames (dict): daily bars per ticker
+        latency (float): seconds waited before answering each request
+        flaky (dict): number of 503 responses sent for a ticker before its bars
+    """
+
+    def __init__(self, frames, latency=0.0, flaky=None):
+        self._stats = multiprocessing.Queue()
+        self._stop = multiprocessing.Event()
+        ready = multiprocessing.Queue()
+        self._process = multiprocessing.Process(
+            target=_run, args=(frames, latency, flaky or {}, ready, self._stop, self._stats),
+            daemon=True,
+        )
+        self._process.start()
+        port = ready.get()
+        self.url = f"http://127.0.0.1:{port}/v8/finance/chart/{{ticker}}"
+
+    def shutdown(self):
+        """stop the server, returns the number of requests and of distinct connections"""
+        self._stop.set()
+        stats = self._stats.get()
+        self._process.join()
+        return stats
+
+
+def _run(frames, latency, flaky, ready, stop, stats):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ChartHandler)
+    server.daemon_threads = True
+    server.frames = {ticker: _columns(ts) for ticker, ts in frames.items()}
+    server.latency = latency
+    server.flaky = dict(flaky)
+    server.lock = threading.Lock()
+    server.requests = 0
+    server.connections = set()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    ready.put(server.server_address[1])
+    stop.wait()
+    server.shutdown()
+    stats.put({"requests": server.requests, "connections": len(server.connections)})
@@ -0,0 +1,177 @@
+"""Offline benchmark suite of the pipeline, on synthetic portfolios
+
+Times read_transactions, feature_engineering, data_preprocessing (prices served by a
+LocalProvider) and the aggregations of the dashboard, and compares the timings and a digest
+of the results against the baselines stored in benchmarks/baselines.json.
+
+run from the root of the repository:
+    python -m benchmarks.suite                   # compare against the baselines
+    python -m benchmarks.suite --sizes large     # a single size
+    python -m benchmarks.suite --update          # store the current results as baselines
+
+The exit code is 1 when a result changed or a stage is slower than the baseline by more than
+the tolerance.
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import generate_portfolio
+from scr.dashboard import dashboard_statistics
+from scr.data_preparation import data_preprocessing, feature_engineering
+from scr.market_data import LocalProvider
+from scr.position_panel import PositionPanel
+from scr.utility import read_transactions
+
+BASELINES = os.path.join(os.path.dirname(__file__), "baselines.json")
+
+# slowdowns below this many seconds are timer noise, not regressions
+MIN_SLOWDOWN = 0.01
+
+# parameters of generate_portfolio
+SIZES = {
+    "small": {"n_tickers": 10, "years": 2, "trades_per_month": 20},
+    "medium": {"n_tickers": 50, "years": 5, "trades_per_month": 100},
+    "large": {"n_tickers": 200, "years": 10, "trades_per_month": 400},
+}
+
+
+def _update_digest(h, obj):
+    """feed a result to the hash, floats rounded so that the digest ignores rounding noise"""
+    if isinstance(obj, PositionPanel):
+        _update_digest(h, obj.to_frame())
+    elif isinstance(obj, (pd.DataFrame, pd.Series)):
+        if isinstance(obj, pd.Series):
+            obj = obj.to_frame()
+        obj = obj.round(6)
+        h.update(repr(list(obj.columns)).encode())
+        h.update(pd.util.hash_pandas_object(obj, index=True).to_numpy().tobytes())
+    elif isinstance(obj, np.ndarray):
+        _update_digest(h, pd.Series(obj))
+    elif isinstance(obj, dict):
+        for key in sorted(obj):
+            h.update(str(key).encode())
+            _update_digest(h, obj[key])
+    elif isinstance(obj, (list, tuple)):
+        for item in obj:
+            _update_digest(h, item)
+    elif isinstance(obj, (float, np.floating)):
+        h.update(f"{obj:.6f}".encode())
+    else:
+        h.update(repr(obj).encode())
+
+
+def digest(obj):
+    """short digest of a result of the pipeline"""
+    h = hashlib.sha1()
+    _update_digest(h, obj)
+    return h.hexdigest()[:16]
+
+
+def _timeit(func, repeat):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def run_size(params, repeat=3):
+    """time the stages of the pipeline on one synthetic portfolio
+
+    Returns:
+        (dict): seconds and digest of the result, per stage
+    """
+    export, frames = generate_portfolio(**params)
+    provider = LocalProvider(frames)
+
+    with tempfile.TemporaryDirectory() as directory:
+        fln = os.path.join(directory, "transactions.csv")
+        export.to_csv(fln, index=False)
+
+        results = {}
+        seconds, tr = _timeit(lambda: read_transactions(fln), repeat)
+        results["read_transactions"] = (seconds, tr)
+        results["feature_engineering"] = _timeit(lambda: feature_engineering(tr), repeat)
+        seconds, prepared = _timeit(lambda: data_preprocessing(fln, provider), repeat)
+        results["data_preprocessing"] = (seconds, prepared)
+
+    positions, tr, start, end, data = prepared
+    results["dashboard_statistics"] = _timeit(
+        lambda: dashboard_statistics(positions, tr, data, end), repeat
+    )
+    return {
+        name: {"seconds": round(seconds, 4), "digest": digest(result)}
+        for name, (seconds, result) in results.items()
+    }
+
+
+def compare(current, baseline, tolerance):
+    """lines of the report and whether the results are within the baselines"""
+    ok = True
+    lines = [f"{'stage':<22} {'seconds':>9} {'baseline':>9} {'ratio':>6}  result"]
+    for name, stats in current.items():
+        base = baseline.get(name)
+        if base is None:
+            lines.append(f"{name:<22} {stats['seconds']:9.4f} {'':>9} {'':>6}  no baseline")
+            continue
+        ratio = stats["seconds"] / max(base["seconds"], 1e-9)
+        status = "ok" if stats["digest"] == base["digest"] else "CHANGED"
+        if ratio > tolerance and stats["seconds"] - base["seconds"] > MIN_SLOWDOWN:
+            status += ", SLOWER"
+        ok = ok and status == "ok"
+        lines.append(
+            f"{name:<22} {stats['seconds']:9.4f} {base['seconds']:9.4f} {ratio:6.2f}  {status}"
+        )
+    return lines, ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=["small", "medium"])
+    parser.add_argument("--repeat", type=int, default=3, help="best of n runs per stage")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="allowed slowdown ratio")
+    parser.add_argument("--update", action="store_true", help="store the results as baselines")
+    args = parser.parse_args(argv)
+
+    baselines = {}
+    if os.path.exists(BASELINES):
+        with open(BASELINES) as f:
+            baselines = json.load(f)
+
+    all_ok = True
+    for size in args.sizes:
+        current = run_size(SIZES[size], args.repeat)
+        print(f"\n{size}: {SIZES[size]}")
+        lines, ok = compare(current, baselines.get("sizes", {}).get(size, {}), args.tolerance)
+        print("\n".join(lines))
+        all_ok = all_ok and ok
+        baselines.setdefault("sizes", {})[size] = current
+
+    if args.update:
+        baselines["environment"] = {
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+        }
+        with open(BASELINES, "w") as f:
+            json.dump(baselines, f, indent=1)
+        print(f"\nbaselines written to {BASELINES}")
+        return 0
+    return 0 if all_ok else 1
+
+
+if __name__ == "__main__":
+    warnings.simplefilter("ignore")
+    sys.exit(main())
@@ -0,0 +1,216 @@
+"""Synthetic Trading 212 exports, used by the benchmarks"""
+import numpy as np
+import pandas as pd
+
+from scr.fx import BASE, SUBUNITS, pair
+
+EXPORT_COLUMNS = [
+    "Action",
+    "Time",
+    "ISIN",
+    "Ticker",
+    "Name",
+    "No. of shares",
+    "Price / share",
+    "Currency (Price / share)",
+    "Exchange rate",
+    "Result (EUR)",
+    "Total (EUR)",
+    "Withholding tax",
+    "Currency (Withholding tax)",
+    "Charge amount (EUR)",
+    "Deposit fee (EUR)",
+    "Stamp duty (EUR)",
+    "Transaction fee (EUR)",
+    "Finra fee (EUR)",
+    "Notes",
+    "ID",
+    "French transaction tax",
+]
+
+
+def generate_transactions(n_rows, n_tickers=50, sell_ratio=0.3, seed=0):
+    """generate a deterministic transaction history in the format of a Trading 212 export
+
+    Args:
+        n_rows (int): number of transactions
+        n_tickers (int): number of tickers traded
+        sell_ratio (float): share of the transactions that are sells
+        seed (int): seed of the random generator
+
+    Returns:
+        (pd.DataFrame): transactions, with all the columns of the export
+    """
+    rng = np.random.default_rng(seed)
+    tickers = np.array([f"T{i:04d}" for i in range(n_tickers)])
+
+    ticker = tickers[rng.integers(0, n_tickers, n_rows)]
+    time = pd.Timestamp("2018-01-02 14:30") + pd.to_timedelta(
+        np.sort(rng.integers(0, 3 * 365 * 24 * 60, n_rows)), unit="min"
+    )
+    is_sell = rng.random(n_rows) < sell_ratio
+    shares = rng.integers(1, 100, n_rows).astype("float")
+    price = np.round(rng.uniform(5, 500, n_rows), 2)
+    rate = np.round(rng.uniform(1.05, 1.25, n_rows), 5)
+
+    # never sell more than the current holding
+    tr = pd.DataFrame({"Ticker": ticker, "is_sell": is_sell, "shares": shares})
+    signed = np.where(tr["is_sell"], -tr["shares"], tr["shares"])
+    held = pd.Series(signed).groupby(tr["Ticker"]).cumsum()
+    oversold = tr["is_sell"] & (held < 0)
+    is_sell[oversold.to_numpy()] = False
+
+    action = np.where(
+        is_sell,
+        np.where(rng.random(n_rows) < 0.5, "Market sell", "Limit sell"),
+        np.where(rng.random(n_rows) < 0.5, "Market buy", "Limit buy"),
+    )
+    total = np.round(shares * price / rate, 2)
+
+    export = pd.DataFrame(columns=EXPORT_COLUMNS, index=range(n_rows))
+    export["Action"] = action
+    export["Time"] = time.strftime("%Y-%m-%d %H:%M:%S")
+    export["ISIN"] = np.char.add("US", ticker.astype("U"))
+    export["Ticker"] = ticker
+    export["Name"] = ticker
+    export["No. of shares"] = shares
+    export["Price / share"] = price
+    export["Currency (Price / share)"] = "USD"
+    export["Exchange rate"] = rate
+    export["Result (EUR)"] = np.where(is_sell, np.round(rng.normal(0, 20, n_rows), 2), np.nan)
+    export["Total (EUR)"] = total
+    export["ID"] = [f"EOF{i:09d}" for i in range(n_rows)]
+
+    return export
+
+
+def write_transactions(fln, n_rows, **kwargs):
+    """write a synthetic export to a csv file, see generate_transactions"""
+    generate_transactions(n_rows, **kwargs).to_csv(fln, index=False)
+    return fln
+
+
+def generate_prices(tickers, start, end, seed=0):
+    """generate deterministic daily bars (business days) for the tickers, as random walks
+
+    Returns:
+        (dict): daily bars per ticker, columns FIELDS of scr.market_data
+    """
+    rng = np.random.default_rng(seed)
+    days = pd.bdate_range(start, end, name="Date")
+    frames = {}
+    for ticker in tickers:
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.015, len(days))))
+        spread = close * rng.uniform(0, 0.02, len(days))
+        frames[ticker] = pd.DataFrame(
+            {
+                "Adj Close": close,
+                "Close": close,
+                "High": close + spread,
+                "Low": close - spread,
+                "Open": close + rng.uniform(-1, 1, len(days)) * spread,
+                "Volume": rng.integers(1_000, 1_000_000, len(days)).astype("float"),
+            },
+            index=days,
+        )
+    return frames
+
+
+def generate_forex(start, end, seed=0, level=0.85):
+    """generate a deterministic exchange rate to the euro, by default USD/EUR, as daily bars"""
+    rng = np.random.default_rng(seed)
+    days = pd.bdate_range(start, end, name="Date")
+    rate = level * np.exp(np.cumsum(rng.normal(0, 0.003, len(days))))
+    fields = ["Adj Close", "Close", "High", "Low", "Open"]
+    return pd.DataFrame({field: rate for field in fields}, index=days).assign(Volume=0.0)
+
+
+def generate_portfolio(
+    n_tickers=20, years=3, trades_per_month=20, sell_ratio=0.3, seed=0, currencies=("USD",)
+):
+    """generate a deterministic export together with the daily bars it was traded at
+
+    The trades are placed on business days during the US session, at the close of the day
+    and the exchange rate of the day, so the export is consistent with the price panels.
+
+    Args:
+        n_tickers (int): number of tickers traded
+        years (int): length of the history
+        trades_per_month (float): average number of trades per month, over all the tickers
+        sell_ratio (float): share of the transactions that are sells
+        seed (int): seed of the random generator
+        currencies (tuple): currencies the tickers are quoted in, in turn
+
+    Returns:
+        (pd.DataFrame, dict): transactions with all the columns of the export, and daily bars
+            per ticker including the currency pairs, eg USDEUR%3DX, to be served by a
+            LocalProvider
+    """
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp("2018-01-02")
+    end = start + pd.DateOffset(years=years)
+    tickers = [f"T{i:04d}" for i in range(n_tickers)]
+    frames = generate_prices(tickers, start, end, seed=seed)
+    days = pd.bdate_range(start, end, name="Date")
+
+    # rate to the euro of each currency per day, the pairs other than USD/EUR of their own seed
+    to_eur = {}
+    for k, currency in enumerate(currencies):
+        quote, factor = SUBUNITS.get(currency, (currency, 1.0))
+        if quote == BASE:
+            to_eur[currency] = np.full(len(days), factor)
+            continue
+        if pair(quote) not in frames:
+            level = 0.85 if quote == "USD" else 1.0 + 0.1 * k
+            sub_seed = seed if quote == "USD" else seed + 1 + k
+            frames[pair(quote)] = generate_forex(start, end, seed=sub_seed, level=level)
+        to_eur[currency] = frames[pair(quote)]["Close"].to_numpy() * factor
+    ticker_currency = np.array(currencies)[np.arange(n_tickers) % len(currencies)]
+
+    n_rows = max(1, int(round(trades_per_month * 12 * years)))
+    day_pos = np.sort(rng.integers(0, len(days), n_rows))
+    ticker_pos = rng.integers(0, n_tickers, n_rows)
+    # 14:30 to 21:00 GMT
+    time = days[day_pos] + pd.to_timedelta(rng.integers(870, 1260, n_rows), unit="min")
+    time = time + pd.to_timedelta(rng.integers(0, 60, n_rows), unit="s")
+    # in time order, as in the exports, the rows stay on their day
+    time = time.sort_values()
+
+    closes = np.column_stack([frames[ticker]["Close"].to_numpy() for ticker in tickers])
+    price = np.round(closes[day_pos, ticker_pos], 2)
+    to_eur = np.vstack([to_eur[currency] for currency in ticker_currency])
+    rate = np.round(1 / to_eur[ticker_pos, day_pos], 5)
+    shares = np.round(rng.uniform(0.1, 20, n_rows), 4)
+
+    # never sell more than the current holding
+    is_sell = rng.random(n_rows) < sell_ratio
+    held = np.zeros(n_tickers)
+    for i in range(n_rows):
+        if is_sell[i] and held[ticker_pos[i]] >= shares[i]:
+            held[ticker_pos[i]] -= shares[i]
+        else:
+            is_sell[i] = False
+            held[ticker_pos[i]] += shares[i]
+
+    action = np.where(
+        is_sell,
+        np.where(rng.random(n_rows) < 0.5, "Market sell", "Limit sell"),
+        np.where(rng.random(n_rows) < 0.5, "Market buy", "Limit buy"),
+    )
+    ticker = np.array(tickers)[ticker_pos]
+
+    export = pd.DataFrame(columns=EXPORT_COLUMNS, index=range(n_rows))
+    export["Action"] = action
+    export["Time"] = time.strftime("%Y-%m-%d %H:%M:%S")
+    export["ISIN"] = np.char.add("US", ticker.astype("U"))
+    export["Ticker"] = ticker
+    export["Name"] = ticker
+    export["No. of shares"] = shares
+    export["Price / share"] = price
+    export["Currency (Price / share)"] = ticker_currency[ticker_pos]
+    export["Exchange rate"] = rate
+    export["Result (EUR)"] = np.where(is_sell, np.round(rng.normal(0, 20, n_rows), 2), np.nan)
+    export["Total (EUR)"] = np.round(shares * price / rate, 2)
+    export["ID"] = [f"EOF{i:09d}" for i in range(n_rows)]
+
+    return export, frames
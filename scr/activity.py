@@ -0,0 +1,95 @@
+"""Trade activity: the transactions binned by weekday and hour of the day, and by month and action
+
+The times of the export are in UTC. They are converted once to the local time of the time zone,
+as int64 nanoseconds, from which the weekday, the hour and the month are integer arithmetic.
+Each table is then a single np.bincount over integer codes, one pass over the transactions
+whatever their number.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+# time zone of the activity tables, eg Europe/London, the times of the export are in UTC
+TIMEZONE = os.environ.get("PORTFOLIO_TIMEZONE", "UTC")
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+ACTIONS = ["buy", "sell"]
+
+_HOUR = 3600 * 10 ** 9
+_DAY = 24 * _HOUR
+
+
+def local_times(times, tz=TIMEZONE):
+    """wall time of the transactions in the time zone, missing times dropped
+
+    Args:
+        times (pd.Series): times of the transactions, in UTC
+        tz (str): time zone, eg Europe/Berlin
+
+    Returns:
+        (np.array, np.array): int64 nanoseconds since the epoch of the local times, and the mask
+            of the times kept
+    """
+    times = pd.DatetimeIndex(times)
+    if tz not in (None, "UTC"):
+        times = times.tz_localize("UTC").tz_convert(tz).tz_localize(None)
+    valid = ~times.isna()
+    return times.asi8[valid], valid
+
+
+def weekday_hour(times, tz=TIMEZONE):
+    """number of transactions per weekday and hour of the day
+
+    Args:
+        times (pd.Series): times of the transactions, in UTC
+        tz (str): time zone the hours are counted in
+
+    Returns:
+        (pd.DataFrame): counts, indexed by DAYS, one column per hour 0 to 23
+    """
+    ns, _ = local_times(times, tz)
+    days = ns // _DAY
+    # the epoch is a Thursday
+    codes = ((days + 3) % 7) * 24 + (ns - days * _DAY) // _HOUR
+    counts = np.bincount(codes, minlength=7 * 24).reshape(7, 24)
+    return pd.DataFrame(counts, index=pd.Index(DAYS, name="day"), columns=range(24))
+
+
+def monthly_activity(tr, tz=TIMEZONE):
+    """number of transactions and turnover per month and action, the months without transactions
+    of an action left out
+
+    Args:
+        tr (pd.DataFrame): transactions, as returned by cost_basis
+        tz (str): time zone the months are counted in
+
+    Returns:
+        (pd.DataFrame): Time (end of the month), Action, transactions and turnover_eur, sorted
+            by month and action
+    """
+    ns, valid = local_times(tr["Time"], tz)
+    months = ns.view("M8[ns]").astype("M8[M]").astype("int64")
+    actions = pd.Categorical(tr["Action"], categories=ACTIONS).codes[valid]
+    turnover = (tr["No. of shares"] * tr["pirce_per_share_eur"]).abs().to_numpy()[valid]
+
+    traded = actions >= 0
+    months, actions, turnover = months[traded], actions[traded], turnover[traded]
+    first = months.min() if len(months) else 0
+    codes = (months - first) * len(ACTIONS) + actions
+    n_bins = (months.max() - first + 1) * len(ACTIONS) if len(months) else 0
+    counts = np.bincount(codes, minlength=n_bins)
+    totals = np.bincount(codes, weights=np.nan_to_num(turnover), minlength=n_bins)
+
+    bins = np.flatnonzero(counts)
+    month_start = (first + bins // len(ACTIONS)).astype("M8[M]")
+    return pd.DataFrame(
+        {
+            "Time": pd.DatetimeIndex(month_start) + pd.offsets.MonthEnd(0),
+            "Action": pd.Categorical.from_codes(bins % len(ACTIONS), categories=ACTIONS),
+            "transactions": counts[bins],
+            "turnover_eur": totals[bins],
+        }
+    )
+
@@ -0,0 +1,251 @@
+"""Headless analytics of Trading 212 exports: the sections of the dashboard as compact, json-ready
+results, without streamlit
+
+    engine = Analytics()
+    fln_hash, dash = engine.prepare("transactions.csv")
+    engine.summary(dash, ["pnl", "monthly"])
+
+An Analytics object holds the state of a warm process: the processed exports to continue from,
+the prepared dashboards, the risk engines and, optionally, the artifact store shared with the
+other workers. The web app, scripts and the HTTP service of scr.service each keep one.
+"""
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from scr.dashboard import PNL_SERIES, Dashboard
+from scr.incremental import incremental_preprocessing
+from scr.memo import LRUCache, content_hash
+from scr.performance import standard_windows
+from scr.profiling import stage
+from scr.risk import RiskEngine
+from scr.validation import ValidationReport
+
+
+def _value(x):
+    """a scalar as a plain python value, dates as iso strings and NaN as None"""
+    if isinstance(x, np.generic):
+        x = x.item()
+    if hasattr(x, "isoformat"):
+        return None if pd.isna(x) else x.isoformat()
+    if isinstance(x, float) and not np.isfinite(x):
+        return None
+    return x
+
+
+def _columns(df):
+    """a DataFrame as lists of plain values per column"""
+    return {str(column): [_value(x) for x in df[column].tolist()] for column in df.columns}
+
+
+def _last_day(dash):
+    return (dash.end - timedelta(1)).floor("1d")
+
+
+def pnl_summary(dash):
+    """the last values of the profit and loss, and its downsampled history"""
+    pnl = dash.section("pnl")
+    last = pnl["df_agg"].iloc[-1]
+    return {
+        "end": _value(dash.end),
+        "last": {series: _value(last[series]) for series in PNL_SERIES},
+        "history": _columns(pnl["df_agg_plot"][["time"] + PNL_SERIES]),
+    }
+
+
+def holdings_summary(dash, as_of=None):
+    """open positions and their weight at a date, the last day by default"""
+    holdings = dash.section("holdings")["holdings"]
+    as_of = _last_day(dash) if as_of is None else pd.Timestamp(as_of)
+    return {
+        "as_of": _value(as_of),
+        "composition": _columns(holdings.composition(as_of).reset_index()),
+    }
+
+
+def monthly_summary(dash):
+    """transactions and turnover per month and action, and their statistics"""
+    monthly = dash.section("monthly")
+    mt = monthly["mt"].rename({"mnth_yr": "month", "Action": "action"}, axis=1)
+    return {
+        "transactions": _columns(mt[["month", "action", "transactions", "turnover_eur"]]),
+        "stats": {name: _value(x) for name, x in monthly["monthly_stats"].items()},
+    }
+
+
+def trading_times_summary(dash):
+    """transaction counts per day of the week and hour of the day, in the time zone of the
+    dashboard"""
+    trading_times = dash.section("trading_times")
+    return {
+        "tz": dash.tz,
+        "heatmap": trading_times["heatmap"].to_numpy().tolist(),
+        "day_counts": {day: int(n) for day, n in trading_times["day_counts"].items()},
+        "hour_counts": {
+            hour.strftime("%H:%M"): int(n) for hour, n in trading_times["hour_counts"].items()
+        },
+        "peak_day": trading_times["peak_day"],
+        "peak_hour": trading_times["peak_hour"].strftime("%H:%M"),
+    }
+
+
+def performance_summary(dash, as_of=None):
+    """time-weighted and money-weighted returns of the portfolio and of each ticker over the
+    standard windows, ending on a date, the last day by default"""
+    if as_of is None:
+        performance = dash.section("performance")["performance"]
+    else:
+        engine = dash.section("flows")["returns_engine"]
+        performance = engine.returns(standard_windows(engine.days, as_of))
+    return {
+        "as_of": _value(performance["end"].max()),
+        "returns": _columns(performance),
+    }
+
+
+def validation_summary(dash):
+    """issues found in the export and the rows set aside, None for an export prepared by
+    another worker"""
+    return None if dash.validation is None else dash.validation.to_dict()
+
+
+def correlation_summary(dash):
+    """correlation of the daily returns of the current portfolio"""
+    correlation = dash.section("correlation")
+    corr = correlation["corr"].to_numpy()
+    most_correlated = correlation["most_correlated"]
+    return {
+        "tickers": [str(ticker) for ticker in correlation["cols"]],
+        "matrix": [[_value(x) for x in row] for row in corr.tolist()],
+        "most_correlated": None
+        if most_correlated is None
+        else [str(ticker) for ticker in most_correlated],
+    }
+
+
+def risk_return_summary(dash):
+    """return and risk of the stocks of the current portfolio"""
+    risk_return = dash.section("risk_return")
+    max_ratio = risk_return["max_ratio"]
+    return {
+        "tickers": [str(ticker) for ticker in risk_return["ret_mean"].index],
+        "mean": [_value(x) for x in risk_return["ret_mean"].tolist()],
+        "std": [_value(x) for x in risk_return["ret_std"].tolist()],
+        "max_ratio": None if max_ratio is None else str(max_ratio),
+        "metrics": _columns(risk_return["risk_metrics"].rename_axis("ticker").reset_index()),
+    }
+
+
+SUMMARIES = {
+    "pnl": pnl_summary,
+    "holdings": holdings_summary,
+    "monthly": monthly_summary,
+    "trading_times": trading_times_summary,
+    "performance": performance_summary,
+    "validation": validation_summary,
+    "correlation": correlation_summary,
+    "risk_return": risk_return_summary,
+}
+
+# summaries of a request that names none, the correlation and the risk need the returns of
+# every ticker and are left to be asked for, as are the windowed returns
+DEFAULT_SUMMARIES = ["pnl", "holdings", "monthly", "trading_times"]
+
+# summaries taking the as_of date of the request
+DATED_SUMMARIES = ["holdings", "performance"]
+
+
+class Analytics:
+    """dashboards of the exports seen by a process, prepared once per content"""
+
+    def __init__(self, store=None, provider=None, maxsize=8, policy=None):
+        """
+        Args:
+            store (ArtifactStore, optional): processed exports shared with the other workers
+            provider (optional): source of the daily bars, see scr.market_data
+            maxsize (int): number of dashboards and risk engines kept in memory
+            policy (str, optional): validation of the exports, see scr.validation.POLICIES
+        """
+        self.store = store
+        self.provider = provider
+        self.policy = policy
+        # processed exports, continued when a re-uploaded export appends transactions
+        self.states = []
+        self.dashboards = LRUCache(maxsize)
+        self.risk_engines = LRUCache(maxsize)
+
+    @staticmethod
+    def _risk_key(data):
+        # keyed by the tickers and the first day, the bars of a longer export continue the engine
+        return (tuple(data["Adj Close"].columns), data.index[0])
+
+    def _dashboard(self, result, sections=None, validation=None):
+        positions, tr, start, end, data = result
+        risk = self.risk_engines.get(self._risk_key(data))
+        if risk is None:
+            risk = RiskEngine()
+        return Dashboard(positions, tr, data, end, risk, sections, validation=validation)
+
+    def dashboard(self, fln_hash):
+        """dashboard of an export prepared before, by this process or another worker
+
+        Returns:
+            (Dashboard): None when the export is unknown
+        """
+        dash = self.dashboards.get(fln_hash)
+        if dash is None and self.store is not None:
+            stored = self.store.get(fln_hash, self.policy)
+            if stored is not None:
+                dash = self._dashboard(*stored)
+                self.dashboards.put(fln_hash, dash)
+        return dash
+
+    def prepare(self, fln, fln_hash=None):
+        """dashboard of an export, preprocessed unless seen before. The sections are calculated
+        when first requested
+
+        Args:
+            fln (str or file-like): the csv export
+            fln_hash (str, optional): content hash of the export, see scr.memo.content_hash
+
+        Returns:
+            (str, Dashboard): the content hash and the dashboard of the export
+        """
+        fln_hash = fln_hash or content_hash(fln)
+        dash = self.dashboard(fln_hash)
+        if dash is None:
+            validation = ValidationReport(self.policy)
+            with stage("prepare_dashboard") as s:
+                result = incremental_preprocessing(fln, self.states, self.provider, validation)
+                dash = self._dashboard(result, validation=validation)
+                s.rows = len(dash.positions)
+            if self.store is not None:
+                self.store.put(fln_hash, result, {"pnl": dash.section("pnl")}, validation)
+            self.dashboards.put(fln_hash, dash)
+        return fln_hash, dash
+
+    def summary(self, dash, names=None, as_of=None):
+        """compact results of the sections of a dashboard
+
+        Args:
+            dash (Dashboard): as returned by prepare
+            names (list, optional): keys of SUMMARIES, DEFAULT_SUMMARIES by default
+            as_of (str or date, optional): date of the holdings and end of the windows of the
+                performance, the last day by default
+
+        Returns:
+            (dict): json-ready results, per section
+        """
+        names = DEFAULT_SUMMARIES if names is None else names
+        unknown = [name for name in names if name not in SUMMARIES]
+        if unknown:
+            raise ValueError(f"unknown sections {unknown}, expected some of {list(SUMMARIES)}")
+        summary = {
+            name: SUMMARIES[name](dash, as_of) if name in DATED_SUMMARIES else SUMMARIES[name](dash)
+            for name in names
+        }
+        # the engine updated by the dashboard is continued by the next export with the same
+        # tickers, the engines are not changed by an update so the other dashboards keep theirs
+        self.risk_engines.put(self._risk_key(dash.data), dash.risk)
+        return summary
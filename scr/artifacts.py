@@ -0,0 +1,259 @@
+"""Processed exports stored on disk, so that any worker serves a known export without
+preprocessing it again, also after a restart
+
+Each export is stored in one directory, keyed by the content hash of the export, the validation
+policy and the version of the pipeline: the arrays of the position panel as .npy files,
+memory-mapped when read back, and the transactions, the daily bars, the aggregates and the rows
+set aside by the validation as Arrow IPC files, next to the validation report. A SQLite manifest
+records the size and the last use of each export, the least recently used ones are evicted when
+the store exceeds max_bytes.
+"""
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from scr.market_data import CACHE_DIR
+from scr.position_panel import VALUES, PositionPanel
+from scr.validation import POLICY, ValidationReport
+
+ARTIFACT_DIR = os.environ.get("PORTFOLIO_ARTIFACT_DIR", os.path.join(CACHE_DIR, "artifacts"))
+
+# modules whose code determines the stored results, a change in any of them is a new version
+PIPELINE_MODULES = [
+    "activity",
+    "corporate_actions",
+    "cost_basis",
+    "dashboard",
+    "data_preparation",
+    "downsampling",
+    "fetcher",
+    "fx",
+    "holdings",
+    "incremental",
+    "market_data",
+    "performance",
+    "position_panel",
+    "risk",
+    "utility",
+    "validation",
+]
+
+
+def pipeline_version():
+    """hash of the code of the pipeline"""
+    digest = hashlib.sha1()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for name in PIPELINE_MODULES:
+        with open(os.path.join(directory, name + ".py"), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
+def _write_frame(df, path):
+    table = pa.Table.from_pandas(df)
+    with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+
+
+def _read_frame(path):
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).read_all().to_pandas()
+
+
+def _save_panel(panel, directory):
+    os.makedirs(directory)
+    arrays = {name: getattr(panel, name) for name in VALUES}
+    arrays.update(days=panel.days.to_numpy(), rate=panel.rate, row_offset=panel.row_offset)
+    for name, array in arrays.items():
+        np.save(os.path.join(directory, name + ".npy"), np.ascontiguousarray(array))
+    tickers = pd.DataFrame(
+        {
+            "ticker": panel.tickers.categories.to_numpy(dtype="object"),
+            "currency": panel.currency.codes,
+        }
+    )
+    _write_frame(tickers, os.path.join(directory, "tickers.arrow"))
+    _write_frame(panel.events, os.path.join(directory, "events.arrow"))
+    with open(os.path.join(directory, "currencies.json"), "w") as f:
+        json.dump(list(panel.currency.categories), f)
+
+
+def _load_panel(directory):
+    def _load(name):
+        return np.load(os.path.join(directory, name + ".npy"), mmap_mode="r")
+
+    tickers = _read_frame(os.path.join(directory, "tickers.arrow"))
+    with open(os.path.join(directory, "currencies.json")) as f:
+        currencies = json.load(f)
+    names = tickers["ticker"].to_numpy(dtype="object")
+    return PositionPanel(
+        pd.DatetimeIndex(_load("days")),
+        pd.CategoricalIndex(names, categories=names),
+        pd.Categorical.from_codes(tickers["currency"].to_numpy(), categories=currencies),
+        _load("rate"),
+        {name: _load(name) for name in VALUES},
+        _read_frame(os.path.join(directory, "events.arrow")),
+        np.asarray(_load("row_offset")),
+    )
+
+
+def _size(directory):
+    return sum(
+        os.path.getsize(os.path.join(root, fln))
+        for root, _, files in os.walk(directory)
+        for fln in files
+    )
+
+
+class ArtifactStore:
+    """processed exports on disk, see the module documentation"""
+
+    def __init__(self, directory=ARTIFACT_DIR, max_bytes=1024 ** 3, version=None):
+        """
+        Args:
+            directory (str): directory of the store, shared by the workers
+            max_bytes (int): size of the store above which exports are evicted
+            version (str, optional): version of the pipeline, by default the hash of its code
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.version = version or pipeline_version()
+        os.makedirs(directory, exist_ok=True)
+        self._manifest_path = os.path.join(directory, "manifest.sqlite")
+        self._execute(
+            "CREATE TABLE IF NOT EXISTS artifacts "
+            "(key TEXT PRIMARY KEY, version TEXT, bytes INTEGER, created_at REAL, used_at REAL)"
+        )
+
+    def _execute(self, sql, params=()):
+        db = sqlite3.connect(self._manifest_path, timeout=30)
+        try:
+            with db:
+                return db.execute(sql, params).fetchall()
+        finally:
+            db.close()
+
+    def _key(self, fln_hash, policy=None):
+        # the rows set aside depend on the policy, the same export is stored once per policy
+        return f"{fln_hash}-{POLICY if policy is None else policy}-{self.version}"
+
+    def __contains__(self, fln_hash):
+        return self.contains(fln_hash)
+
+    def contains(self, fln_hash, policy=None):
+        """whether the export is stored, processed with the validation policy"""
+        key = self._key(fln_hash, policy)
+        return bool(self._execute("SELECT 1 FROM artifacts WHERE key = ?", (key,)))
+
+    def get(self, fln_hash, policy=None):
+        """the processed export, None when not in the store
+
+        Args:
+            fln_hash (str): content hash of the export, see scr.memo.content_hash
+            policy (str, optional): validation policy, see scr.validation.POLICIES
+
+        Returns:
+            (tuple, dict, ValidationReport): the result of data_preprocessing, with the panel
+                memory-mapped, the frames of the sections stored along with it and the
+                validation report, None when stored without one
+        """
+        if not self.contains(fln_hash, policy):
+            return None
+        key = self._key(fln_hash, policy)
+        path = os.path.join(self.directory, key)
+        try:
+            positions = _load_panel(os.path.join(path, "panel"))
+            tr = _read_frame(os.path.join(path, "tr.arrow"))
+            data = _read_frame(os.path.join(path, "data.arrow"))
+            with open(os.path.join(path, "meta.json")) as f:
+                meta = json.load(f)
+            sections = {
+                section: {
+                    name: _read_frame(os.path.join(path, "sections", f"{section}.{name}.arrow"))
+                    for name in names
+                }
+                for section, names in meta["sections"].items()
+            }
+            validation = None
+            if meta.get("validation") is not None:
+                quarantined = _read_frame(os.path.join(path, "quarantined.arrow"))
+                validation = ValidationReport.from_dict(meta["validation"], quarantined)
+        except OSError:
+            # evicted by another worker since the manifest was read, a miss
+            return None
+        self._execute("UPDATE artifacts SET used_at = ? WHERE key = ?", (time.time(), key))
+        start, end = pd.Timestamp(meta["start"]), pd.Timestamp(meta["end"])
+        return (positions, tr, start, end, data), sections, validation
+
+    def put(self, fln_hash, result, sections=None, validation=None):
+        """store a processed export, then evict the least recently used ones beyond max_bytes
+
+        Args:
+            fln_hash (str): content hash of the export, see scr.memo.content_hash
+            result (tuple): the result of data_preprocessing
+            sections (dict, optional): sections of the dashboard to store along, only their
+                DataFrames are kept
+            validation (ValidationReport, optional): report of the checks of the export, its
+                policy is part of the key, POLICY without a report
+        """
+        positions, tr, start, end, data = result
+        key = self._key(fln_hash, None if validation is None else validation.policy)
+        path = os.path.join(self.directory, key)
+
+        # written aside, then moved in place, so that readers never see a partial export
+        tmp = os.path.join(self.directory, f".{key}.{uuid.uuid4().hex}")
+        _save_panel(positions, os.path.join(tmp, "panel"))
+        _write_frame(tr, os.path.join(tmp, "tr.arrow"))
+        _write_frame(data, os.path.join(tmp, "data.arrow"))
+        stored = {}
+        os.makedirs(os.path.join(tmp, "sections"))
+        for section, frames in (sections or {}).items():
+            frames = {k: v for k, v in frames.items() if isinstance(v, pd.DataFrame)}
+            for name, df in frames.items():
+                _write_frame(df, os.path.join(tmp, "sections", f"{section}.{name}.arrow"))
+            stored[section] = list(frames)
+        meta = {"start": str(start), "end": str(end), "sections": stored, "validation": None}
+        if validation is not None:
+            _write_frame(validation.quarantined, os.path.join(tmp, "quarantined.arrow"))
+            meta["validation"] = validation.to_dict()
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+        try:
+            os.replace(tmp, path)
+        except OSError:
+            # stored meanwhile by another worker
+            shutil.rmtree(tmp)
+        now = time.time()
+        self._execute(
+            "INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?, ?, ?)",
+            (key, self.version, _size(path), now, now),
+        )
+        self._evict(keep=key)
+
+    def _evict(self, keep=None):
+        """remove the least recently used exports until the store fits in max_bytes"""
+        rows = self._execute("SELECT key, bytes FROM artifacts ORDER BY used_at")
+        total = sum(nbytes for _, nbytes in rows)
+        for key, nbytes in rows:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            self._execute("DELETE FROM artifacts WHERE key = ?", (key,))
+            shutil.rmtree(os.path.join(self.directory, key), ignore_errors=True)
+            total -= nbytes
+
+    def clear(self):
+        """remove all the stored exports"""
+        for (key,) in self._execute("SELECT key FROM artifacts"):
+            shutil.rmtree(os.path.join(self.directory, key), ignore_errors=True)
+        self._execute("DELETE FROM artifacts")
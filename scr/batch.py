@@ -0,0 +1,248 @@
+"""Reports of many Trading 212 exports at once, fanned out over a process pool
+
+    python -m scr.batch <directory of csv files> --output reports [--workers 4] [--prices DIR]
+        [--method fifo]
+
+The exports are read in parallel, the daily bars of all their tickers and currency pairs are
+then fetched once, for the union of their date ranges, and shared with the workers through a
+parquet file. Each worker writes the aggregates of one export to <output>/<name of the export>/:
+
+    pnl.parquet       profit and loss per day, as on the dashboard
+    holdings.parquet  open positions on the last day
+    monthly.parquet   transactions per month and action
+    stats.parquet     transaction statistics, one row
+    sells.parquet     realized profit of each sell, by the lot matching method
+    lots.parquet      realized profit of each lot closed by a sell, see scr.tax_lots
+
+The timing, the status and the number of rows set aside by the validation (see scr.validation)
+of each export are written to <output>/report.parquet. When the shared fetch fails, the exports
+read are reported as failed at the stage fetch_prices.
+"""
+import argparse
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from scr.dashboard import Dashboard
+from scr.data_preparation import preprocess_transactions
+from scr.fx import pairs, ticker_currencies
+from scr.market_data import LocalProvider, get_provider
+from scr.tax_lots import METHODS, realized_pnl
+from scr.utility import read_transactions
+from scr.validation import ValidationError, validate_transactions
+
+HOLDINGS_COLUMNS = ["ticker", "cum_shares", "invested amount", "open position", "close_price"]
+
+# provider of the worker, over the shared daily bars
+_provider = {}
+
+
+def _failure(fln, stage, err):
+    return {
+        "file": fln,
+        "status": "failed",
+        "stage": stage,
+        "error": "".join(traceback.format_exception_only(type(err), err)).strip(),
+    }
+
+
+def _read(fln):
+    """validated transactions of an export, with the range of days, the tickers and currency
+    pairs to fetch"""
+    t0 = time.perf_counter()
+    try:
+        tr = read_transactions(fln)
+    except ValidationError as err:
+        # columns missing from the export
+        return _failure(fln, "validate_transactions", err)
+    except Exception as err:
+        return _failure(fln, "read_transactions", err)
+    try:
+        tr, validation = validate_transactions(tr)
+    except ValueError as err:
+        return _failure(fln, "validate_transactions", err)
+    return {
+        "file": fln,
+        "status": "read",
+        "tr": tr,
+        "validation": validation,
+        "tickers": tr.Ticker.dropna().unique().tolist(),
+        "pairs": pairs(ticker_currencies(tr)),
+        "start": tr.Time.min(),
+        "end": tr.Time.max() + pd.Timedelta(days=1),
+        "read_seconds": time.perf_counter() - t0,
+    }
+
+
+def _shared_provider(prices_path):
+    if prices_path not in _provider:
+        panel = pd.read_parquet(prices_path)
+        frames = {
+            ticker: panel.xs(ticker, axis=1, level=1) for ticker in panel.columns.levels[1]
+        }
+        _provider.clear()
+        _provider[prices_path] = LocalProvider(frames)
+    return _provider[prices_path]
+
+
+def _report(fln, tr, validation, prices_path, directory, method):
+    """preprocess an export over the shared daily bars and write its aggregates"""
+    t0 = time.perf_counter()
+    try:
+        positions, tr, start, end, data = preprocess_transactions(
+            tr, _shared_provider(prices_path), validation
+        )
+        dash = Dashboard(positions, tr, data, end)
+        pnl = dash.section("pnl")["df_agg"]
+        holdings = dash.section("portfolio")["df_"]
+        monthly = dash.section("monthly")
+        sells, lots = realized_pnl(tr, method)
+    except Exception as err:
+        return _failure(fln, "preprocess", err)
+    t1 = time.perf_counter()
+
+    try:
+        os.makedirs(directory, exist_ok=True)
+        pnl.to_parquet(os.path.join(directory, "pnl.parquet"))
+        holdings = holdings[HOLDINGS_COLUMNS].reset_index(drop=True)
+        holdings.to_parquet(os.path.join(directory, "holdings.parquet"))
+        monthly["mt"].to_parquet(os.path.join(directory, "monthly.parquet"))
+        stats = pd.DataFrame([monthly["monthly_stats"]])
+        stats.to_parquet(os.path.join(directory, "stats.parquet"))
+        sells.to_parquet(os.path.join(directory, "sells.parquet"))
+        lots.to_parquet(os.path.join(directory, "lots.parquet"))
+    except Exception as err:
+        return _failure(fln, "write", err)
+
+    return {
+        "file": fln,
+        "status": "ok",
+        "transactions": len(tr),
+        "tickers": len(positions.tickers),
+        "quarantined": len(validation.quarantined),
+        "issues": len(validation.issues),
+        "preprocess_seconds": t1 - t0,
+        "write_seconds": time.perf_counter() - t1,
+    }
+
+
+def fetch_shared_prices(reads, provider, path):
+    """fetch the daily bars of all the tickers and currency pairs once, and write them to a
+    parquet file
+
+    Args:
+        reads (list): results of _read, with the tickers, pairs and range of days of each export
+        provider: source of the daily bars, see scr.market_data
+        path (str): parquet file written
+
+    Returns:
+        (dict): tickers the provider failed to fetch, with the reason
+    """
+    tickers = sorted({ticker for read in reads for ticker in read["tickers"]})
+    forex = sorted({name for read in reads for name in read["pairs"]})
+    start = min(read["start"] for read in reads)
+    end = max(read["end"] for read in reads)
+
+    failures = {}
+    panel = provider.download(tickers + forex, start, end, failures)
+    panel.to_parquet(path)
+    return {ticker: err.reason for ticker, err in failures.items()}
+
+
+def run_batch(directory, output, workers=None, provider=None, method="fifo"):
+    """write the reports of all the csv files of a directory
+
+    Args:
+        directory (str): directory of the Trading 212 exports
+        output (str): directory of the reports
+        workers (int, optional): number of processes, by default the number of cpus
+        provider (optional): source of the daily bars, see scr.market_data
+        method (str): matching of the sells with the lots, one of scr.tax_lots.METHODS
+
+    Returns:
+        (pd.DataFrame, dict): one row per export with the status, timing and failure, and the
+            duration and the failed tickers of the shared fetch
+    """
+    files = sorted(
+        os.path.join(directory, fln) for fln in os.listdir(directory) if fln.endswith(".csv")
+    )
+    os.makedirs(output, exist_ok=True)
+    prices_path = os.path.join(output, "prices.parquet")
+    provider = provider or get_provider()
+
+    with ProcessPoolExecutor(workers) as pool:
+        reads = list(pool.map(_read, files))
+        ok = [read for read in reads if read["status"] == "read"]
+
+        t0 = time.perf_counter()
+        failed_tickers = {}
+        try:
+            if ok:
+                failed_tickers = fetch_shared_prices(ok, provider, prices_path)
+        except Exception as err:
+            # no prices to share, every export read fails at the fetch
+            reads = [
+                _failure(read["file"], "fetch_prices", err) if read["status"] == "read" else read
+                for read in reads
+            ]
+            ok = []
+        fetch_seconds = time.perf_counter() - t0
+
+        futures = [
+            pool.submit(
+                _report,
+                read["file"],
+                read["tr"],
+                read["validation"],
+                prices_path,
+                os.path.join(output, os.path.splitext(os.path.basename(read["file"]))[0]),
+                method,
+            )
+            for read in ok
+        ]
+        reports = {future.result()["file"]: future.result() for future in futures}
+
+    rows = []
+    for read in reads:
+        row = {key: read[key] for key in ("file", "status", "stage", "error", "read_seconds")
+               if key in read}
+        row.update(reports.get(read["file"], {}))
+        rows.append(row)
+    report = pd.DataFrame(rows)
+    report["file"] = report["file"].map(os.path.basename)
+    report.to_parquet(os.path.join(output, "report.parquet"))
+    return report, {"seconds": fetch_seconds, "failed_tickers": failed_tickers}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="reports of many Trading 212 exports")
+    parser.add_argument("directory", help="directory of the csv exports")
+    parser.add_argument("--output", default="reports", help="directory of the reports")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes")
+    parser.add_argument(
+        "--prices", default=None, help="directory of daily bars per ticker, to work offline"
+    )
+    parser.add_argument(
+        "--method", default="fifo", choices=METHODS, help="matching of the sells with the lots"
+    )
+    args = parser.parse_args(argv)
+
+    provider = LocalProvider.from_directory(args.prices) if args.prices else None
+    t0 = time.perf_counter()
+    report, fetch = run_batch(args.directory, args.output, args.workers, provider, args.method)
+
+    print(report.to_string(index=False))
+    print(f"\nprices fetched once in {fetch['seconds']:.2f} s")
+    for ticker, reason in fetch["failed_tickers"].items():
+        print(f"{ticker} not in the database ({reason})")
+    failed = (report["status"] != "ok").sum()
+    print(f"{len(report) - failed} of {len(report)} exports in {time.perf_counter() - t0:.2f} s")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""Corporate actions of the daily bars: the splits applied to the share counts and the dividends
+paid on the shares held, for all the tickers at once
+
+The splits and the dividends are fields of the daily bars (SPLITS and DIVIDENDS), 0 or missing
+on the days without one, so that they are downloaded and cached along with the prices. As on
+yahoo finance, Close and the dividends are adjusted for the splits: the values of the days
+before a split are divided by its ratio. The export records the shares as traded, adjust_splits
+brings them to the basis of the bars, so that Close times the shares is the value of the
+position on any day, before and after a split. The splits after the last day of the bars are
+not known, Close should not be adjusted for them.
+"""
+import numpy as np
+
+SPLITS = "Stock Splits"
+DIVIDENDS = "Dividends"
+
+
+def _field(data, field, tickers):
+    """values of an event field, shape (n_tickers, n_days of data), 0 without event"""
+    if field not in data.columns.get_level_values(0):
+        return np.zeros((len(tickers), len(data)))
+    values = data[field].reindex(columns=tickers).to_numpy(dtype="float").T
+    return np.where(values > 0, values, 0.0)
+
+
+def split_factors(data, tickers):
+    """product of the ratios of the splits from each day on, per ticker
+
+    Returns:
+        (np.array): shape (n_tickers, n_days of data + 1), the last column 1 for the days after
+            the bars
+    """
+    ratios = _field(data, SPLITS, tickers)
+    ratios = np.where(ratios > 0, ratios, 1.0)
+    after = np.cumprod(ratios[:, ::-1], axis=1)[:, ::-1]
+    return np.hstack([after, np.ones((len(tickers), 1))])
+
+
+def splits_since(data, day):
+    """whether any ticker of the bars splits on the day or later"""
+    if SPLITS not in data.columns.get_level_values(0):
+        return False
+    return bool((data[SPLITS].loc[data.index >= day] > 0).to_numpy().any())
+
+
+def adjust_splits(tr, data):
+    """shares and prices of the transactions in the basis of the daily bars: a transaction before
+    a split of ratio r has r times the shares, at a r-th of the price. The amounts are unchanged
+
+    Args:
+        tr (pd.DataFrame): transactions, as returned by read_transactions
+        data (pd.DataFrame): daily bars, columns (field, ticker)
+
+    Returns:
+        (pd.DataFrame): the transactions with the adjusted No. of shares and Price / share, and
+            split_factor, the ratio applied
+    """
+    tickers = data.columns.get_level_values(1).unique()
+    factors = split_factors(data, tickers)
+    rows = tickers.get_indexer(tr["Ticker"].astype("object"))
+    # the splits after the day of the transaction, a split applies from its day on
+    days = data.index.searchsorted(tr["Time"].dt.floor("d"), side="right")
+    factor = np.where(rows >= 0, factors[np.maximum(rows, 0), days], 1.0)
+    return tr.assign(
+        **{
+            "No. of shares": tr["No. of shares"] * factor,
+            "Price / share": tr["Price / share"] / factor,
+            "split_factor": factor,
+        }
+    )
+
+
+def dividend_cash(data, tickers, days, held):
+    """cash paid by the dividends, per ticker and day, in the currency of the ticker
+
+    A dividend is paid on the shares held at the end of the day before its ex-date, on the first
+    day of the panel from the ex-date on.
+
+    Args:
+        data (pd.DataFrame): daily bars, columns (field, ticker)
+        tickers (pd.Index): tickers, the rows of held
+        days (pd.DatetimeIndex): days of the panel, the columns of held
+        held (np.array): shares held at the end of the day before, shape (n_tickers, n_days)
+
+    Returns:
+        (np.array): shape (n_tickers, n_days)
+    """
+    cash = np.zeros((len(tickers), len(days)))
+    if not len(days):
+        return cash
+    per_share = _field(data, DIVIDENDS, tickers)
+    rows, cols = np.nonzero(per_share)
+    dates = data.index[cols]
+    keep = (dates >= days[0]) & (dates <= days[-1])
+    rows, cols, dates = rows[keep], cols[keep], dates[keep]
+
+    np.add.at(cash, (rows, days.searchsorted(dates)), per_share[rows, cols])
+    return cash * np.nan_to_num(held)
@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+
+# running values carried from one transaction to the next, per ticker
+STATE_COLUMNS = ["cum_shares", "cum_total_eur", "ave_price_eur"]
+
+
+def _running_cost(codes, is_sell, signed_shares, shares, invested, init):
+    """single pass over the transactions, sorted by ticker, to determine the accumulated shares,
+    the invested amount and the cumulative total in euro. A sell is booked at the average price
+    of the previous transaction, so the average price does not change after selling.
+
+    Args:
+        codes (np.array): integer code of the ticker, rows of one ticker are contiguous
+        is_sell (np.array): True for sell events
+        signed_shares (np.array): number of shares, negative for sell events
+        shares (np.array): number of shares
+        invested (np.array): invested amount in euro, treating all actions as buy
+        init (np.array): running values (STATE_COLUMNS) per ticker code, before the first row
+
+    Returns:
+        (np.array, np.array, np.array): accumulated shares, invested amount and cumulative total
+    """
+    invested = invested.copy()
+    cum_shares = np.full(len(invested), np.nan)
+    cum_total = np.full(len(invested), np.nan)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for i in range(len(invested)):
+            if i == 0 or codes[i] != codes[i - 1]:
+                held, total, ave_price = init[codes[i]]
+            # skip missing values, as pd.Series.cumsum does
+            if not np.isnan(signed_shares[i]):
+                held += signed_shares[i]
+                cum_shares[i] = held
+            if is_sell[i]:
+                invested[i] = -shares[i] * ave_price
+            if not np.isnan(invested[i]):
+                total += invested[i]
+                cum_total[i] = total
+            ave_price = cum_total[i] / cum_shares[i]
+
+    return cum_shares, invested, cum_total
+
+
+def running_state(tr):
+    """running values of each ticker after its last transaction, to continue with cost_basis
+
+    Args:
+        tr (pd.DataFrame): transactions, as returned by cost_basis
+
+    Returns:
+        state (pd.DataFrame): STATE_COLUMNS, indexed by ticker
+    """
+    groups = tr.groupby(by="Ticker", observed=True)
+    state = groups[["cum_shares", "cum_total_eur"]].last().fillna(0.0)
+    last = tr.drop_duplicates(subset="Ticker", keep="last").set_index("Ticker")
+    state["ave_price_eur"] = last["ave_price_eur"]
+    return state
+
+
+def cost_basis(tr, state=None):
+    """calculate accumulated shares, average price, invested amount and profit for all the tickers
+    at once, based on the running average price
+
+    Args:
+        tr (pd.DataFrame): transactions, as returned by read_transactions
+        state (pd.DataFrame, optional): running values before the first transaction, see running_state
+
+    Returns:
+        tr (pd.DataFrame): transactions grouped by ticker, in the original order within a ticker
+    """
+    tr = tr.loc[tr["Ticker"].notna()]
+    tr = tr.sort_values(by="Ticker", kind="mergesort").reset_index(drop=True)
+
+    mask_buy = tr["Action"] == "buy"
+    mask_sell = tr["Action"] == "sell"
+
+    tr.loc[mask_buy, "action_sign"] = 1
+    tr.loc[mask_sell, "action_sign"] = -1
+
+    # average price, treating all actions as buy
+    tr["pirce_per_share_eur"] = tr["Price / share"] / tr["Exchange rate"].astype(
+        "float"
+    )  # price per share in eur
+
+    codes, tickers = pd.factorize(tr["Ticker"])
+    init = pd.DataFrame(
+        {"cum_shares": 0.0, "cum_total_eur": 0.0, "ave_price_eur": np.nan}, index=tickers
+    )
+    if state is not None:
+        init.update(state)
+    cum_shares, invested, cum_total = _running_cost(
+        codes,
+        mask_sell.to_numpy(),
+        (tr["No. of shares"] * tr["action_sign"]).to_numpy(dtype="float"),
+        tr["No. of shares"].to_numpy(dtype="float"),
+        (tr["No. of shares"] * tr["pirce_per_share_eur"]).to_numpy(dtype="float"),
+        init[STATE_COLUMNS].to_numpy(dtype="float"),
+    )
+    # the accumulated number of shares goes next to action_sign
+    tr.insert(tr.columns.get_loc("action_sign") + 1, "cum_shares", cum_shares)
+    tr["invested_amount_eur"] = invested
+    tr["cum_total_eur"] = cum_total
+    tr["ave_price_eur"] = tr["cum_total_eur"] / tr["cum_shares"]
+
+    # determine the return for each sell event
+    tr.loc[mask_sell, "profit_eur"] = (
+        tr.loc[mask_sell, "pirce_per_share_eur"] * tr.loc[mask_sell, "No. of shares"]
+        + tr.loc[mask_sell, "invested_amount_eur"]
+    )
+
+    return tr
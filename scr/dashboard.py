@@ -0,0 +1,219 @@
+"""Aggregations and statistics shown on the dashboard, independent of streamlit
+
+The dashboard is split in sections, calculated lazily by Dashboard.section, so that a section
+not displayed costs nothing.
+"""
+from datetime import time, timedelta
+
+from scr.activity import TIMEZONE, monthly_activity, weekday_hour
+from scr.downsampling import downsample
+from scr.holdings import HoldingsIndex
+from scr.performance import PORTFOLIO, ReturnsEngine, standard_windows
+from scr.profiling import stage
+from scr.risk import RiskEngine
+
+
+def diff_month(d1, d2):
+    return (d1.year - d2.year) * 12 + d1.month - d2.month
+
+
+# series of the profit and loss chart
+PNL_SERIES = ["open position", "invested amount", "floating profit", "realized profit", "dividends"]
+
+def pnl_section(dash):
+    """profit and loss of the portfolio, per day"""
+    df_agg = dash.positions.totals()
+    df_agg["realized profit"] = df_agg["profit_eur"].cumsum()
+    df_agg["dividends"] = df_agg["dividend_eur"].cumsum()
+    df_agg["floating profit"] = df_agg["open position"] - df_agg["invested amount"]
+    # the points drawn, long histories are downsampled
+    df_plot = downsample(df_agg, "time", PNL_SERIES)
+    return {"df_agg": df_agg, "df_agg_plot": df_plot}
+
+
+def portfolio_section(dash):
+    """open positions on the last day"""
+    last_day = (dash.end - timedelta(1)).floor("1d")
+    df_ = dash.positions.slice(last_day, last_day + timedelta(1)).to_frame()
+    df_ = df_.rename(
+        {"time_ts": "time", "value": "open position",
+            "cum_total_eur": "invested amount", },
+        axis=1,
+    )
+    df_ = df_.loc[df_["cum_shares"] > 0.25]
+    tickers_sorted = df_.sort_values(
+        by="open position", ascending=False).ticker.values
+    return {"df_": df_, "tickers_sorted": tickers_sorted}
+
+
+def holdings_section(dash):
+    """holdings of the portfolio as of any date, see HoldingsIndex"""
+    return {"holdings": HoldingsIndex.from_positions(dash.tr, dash.positions)}
+
+
+def monthly_section(dash):
+    """monthly transactions and turnover"""
+    tr = dash.tr
+    mt = monthly_activity(tr, dash.tz)
+    # formatted once per month rather than once per row
+    labels = mt["Time"].dt.strftime("%b-%Y")
+    mt["mnth_yr"] = labels.to_numpy()
+    total_orders = mt.transactions.sum()
+    monthly = mt.groupby(by="mnth_yr")["transactions"].sum()
+    monthly_stats = {
+        "start_date": tr.Time.min().strftime("%b %d, %Y"),
+        "end_date": tr.Time.max().strftime("%b %d, %Y"),
+        "total_orders": total_orders,
+        "buy_orders": mt.loc[mt["Action"] == "buy"].transactions.sum(),
+        "sell_orders": mt.loc[mt["Action"] == "sell"].transactions.sum(),
+        "most_frequent_month": monthly.idxmax(),
+        "most_frequent_count": monthly.max(),
+        "monthly_orders": total_orders / (diff_month(tr.Time.max(), tr.Time.min()) + 1),
+    }
+    return {"mt": mt, "monthly_stats": monthly_stats}
+
+
+def trading_times_section(dash):
+    """distribution of the transactions over the week and the day, from the counts per weekday
+    and hour"""
+    heatmap = weekday_hour(dash.tr.Time, dash.tz)
+    day_counts = heatmap.sum(axis=1)
+    hour_counts = heatmap.sum(axis=0)
+    hour_counts.index = [time(hour) for hour in hour_counts.index]
+    day_counts, hour_counts = day_counts[day_counts > 0], hour_counts[hour_counts > 0]
+    return {
+        "heatmap": heatmap,
+        "day_counts": day_counts,
+        "hour_counts": hour_counts,
+        "peak_day": day_counts.idxmax(),
+        "peak_hour": hour_counts.idxmax(),
+    }
+
+
+def returns_section(dash):
+    """daily returns of all the tickers, processed by the risk engine, and the tickers in the
+    current portfolio"""
+    cols = dash.section("portfolio")["df_"].ticker.dropna().unique()
+    # the engine of the dashboard, the one it was given is left to the other dashboards
+    dash.risk = dash.risk.update(dash.data["Adj Close"])
+    return {"cols": cols, "risk": dash.risk}
+
+
+def flows_section(dash):
+    """daily returns and cash flows of the portfolio and of each ticker, processed by the returns
+    engine"""
+    return {"returns_engine": ReturnsEngine.from_positions(dash.positions, dash.tr)}
+
+
+def performance_section(dash):
+    """time-weighted and money-weighted returns over the standard windows, see
+    scr.performance.WINDOWS"""
+    engine = dash.section("flows")["returns_engine"]
+    performance = engine.returns(standard_windows(engine.days))
+    return {
+        "performance": performance,
+        "portfolio_performance": performance[performance.ticker == PORTFOLIO].set_index("window"),
+    }
+
+
+def correlation_section(dash):
+    """stock correlation of the current portfolio, no pair is the most correlated below two
+    stocks"""
+    returns = dash.section("returns")
+    corr = returns["risk"].correlation(returns["cols"])
+    most_correlated = None
+    if len(returns["cols"]) >= 2:
+        most_correlated = corr.unstack().sort_values(
+            ascending=False).drop_duplicates().index[1]
+    return {
+        "cols": returns["cols"],
+        "corr": corr,
+        "most_correlated": most_correlated,
+    }
+
+
+def risk_return_section(dash):
+    """return and risk of the current portfolio"""
+    returns = dash.section("returns")
+    ret_mean, ret_std = returns["risk"].mean_std(returns["cols"])
+    return {
+        "ret_mean": ret_mean,
+        "ret_std": ret_std,
+        "max_ratio": (ret_mean/ret_std).index[0] if len(ret_mean) else None,
+        "risk_metrics": returns["risk"].metrics(returns["cols"]),
+    }
+
+
+SECTIONS = {
+    "pnl": pnl_section,
+    "portfolio": portfolio_section,
+    "holdings": holdings_section,
+    "monthly": monthly_section,
+    "trading_times": trading_times_section,
+    "returns": returns_section,
+    "flows": flows_section,
+    "performance": performance_section,
+    "correlation": correlation_section,
+    "risk_return": risk_return_section,
+}
+
+
+class Dashboard:
+    """sections of the dashboard, each calculated once, when first requested"""
+
+    def __init__(
+        self, positions, tr, data, end, risk=None, sections=None, tz=TIMEZONE, validation=None
+    ):
+        """
+        Args:
+            positions (PositionPanel): daily positions, as returned by data_preprocessing
+            tr (pd.DataFrame): transactions, as returned by data_preprocessing
+            data (pd.DataFrame): daily bars, as returned by data_preprocessing
+            end (pd.Timestamp): day after the last transaction
+            risk (RiskEngine, optional): engine continued with the bars of data, eg the one
+                of the previous version of the export
+            sections (dict, optional): sections already calculated, eg read from an
+                ArtifactStore
+            tz (str): time zone of the trade activity, the times of the export are in UTC
+            validation (ValidationReport, optional): checks of the export, see scr.validation
+        """
+        self.positions = positions
+        self.tr = tr
+        self.data = data
+        self.end = end
+        self.risk = RiskEngine() if risk is None else risk
+        self.tz = tz
+        self.validation = validation
+        self._sections = dict(sections or {})
+
+    def section(self, name):
+        """frames and statistics of a section, see SECTIONS"""
+        if name not in self._sections:
+            with stage(name):
+                self._sections[name] = SECTIONS[name](self)
+        return self._sections[name]
+
+    def computed(self):
+        """names of the sections calculated so far"""
+        return list(self._sections)
+
+
+def dashboard_statistics(positions, tr, data, end):
+    """calculate everything shown on the dashboard at once
+
+    Args:
+        positions (PositionPanel): daily positions, as returned by data_preprocessing
+        tr (pd.DataFrame): transactions, as returned by data_preprocessing
+        data (pd.DataFrame): daily bars, as returned by data_preprocessing
+        end (pd.Timestamp): day after the last transaction
+
+    Returns:
+        (dict): frames and statistics used by the rows of the dashboard
+    """
+    dash = Dashboard(positions, tr, data, end)
+    statistics = {"positions": positions, "tr": tr, "data": data, "end": end}
+    for name in SECTIONS:
+        # the engines behind the other sections
+        if name not in ("returns", "holdings", "flows"):
+            statistics.update(dash.section(name))
+    return statistics
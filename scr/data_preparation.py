@@ -1,157 +1,144 @@
-from datetime import date, datetime, timedelta
+from datetime import timedelta
+
+from scr.corporate_actions import adjust_splits
+from scr.cost_basis import cost_basis
+from scr.fx import rate_table, ticker_currencies
+from scr.market_data import get_provider
+from scr.position_panel import PositionPanel
+from scr.profiling import ENABLED as PROFILING
+from scr.profiling import report_json, stage
+from scr.utility import read_transactions
+from scr.validation import (
+    ValidationReport,
+    check_not_empty,
+    check_positions,
+    check_tickers,
+    validate_transactions,
+)
 
-import altair as alt
-import numpy as np
-import pandas as pd
-import panel as pn
-import plotly.express as px
-import plotly.graph_objs as go
-import yfinance as yf
-from altair import datum
-
-from scr.utility import read_ticker_ts, read_transactions
-
-def ticker_price_history(data, ticker):
-    """filter time history of the specifed ticker, history of ticker close price """
-    tts_sub = data[[("Close", ticker)]]  # ticker time series
-    tts_sub = tts_sub.reset_index()
-    tts_sub.columns = tts_sub.columns.droplevel()
-    tts_sub.columns = ["time_ts", "close_price"]
+def calculate_return(group):
+    """Update transaction time history, include calculation of average price
+    """
+    return cost_basis(group)
 
-    return tts_sub
+def feature_engineering(tr): 
+    # feature engineering, calcuate return for each ticker
+    tr = cost_basis(tr)
+    
+    return tr
 
+def combine_histories(tr, data, rates, tickers):
+    """merge the transactions with the price history and the exchange rate of their currency,
+    for all the tickers at once. Each ticker gets one row per day with a close price and an
+    exchange rate, the transactions are matched to the day they took place, the last one of the
+    day is kept.
 
-def merge_histories(tr_sub, tts_sub, ticker, df_forex):
-    """merge dataframe based on date and time
+    see PositionPanel for the compact representation used by the pipeline
 
-    note: invested amount is determined based on the market price at close, rather than the transaction record
+    Returns:
+        df_combined (pd.DataFrame): daily position of each ticker, indexed by the row number
+            within the history of the ticker, counting the transactions of the same day
     """
-    merged = tts_sub.merge(
-        right=tr_sub, left_on="time_ts", right_on="Time", how="outer"
-    )
-    merged = merged.merge(df_forex, left_on="time_ts", right_on="date")
-    merged["cum_shares"] = merged["cum_shares"].fillna(method="ffill")
-    merged["value"] = merged["close_price"] * merged["cum_shares"] * merged["rate"]
-    merged["ticker"] = ticker
-    merged["cum_total_eur"] = merged["cum_total_eur"].fillna(method="ffill")
-    merged["value"] = merged["value"].fillna(method="ffill")
-    return merged
+    return PositionPanel.from_transactions(tr, data, rates, tickers).to_frame()
 
+def _report_missing(missing, failures, report):
+    if report is not None:
+        check_tickers(missing, failures, report)
+    else:
+        for issue in check_tickers(missing, failures).issues:
+            print(issue["message"])
 
-def calculate_average_price(group):
-    """calculate the average price based on the invested amount and number of shares"""
 
-    # cumulative total in euro (buy price*share - average_price*sell)
-    group["cum_total_eur"] = group["invested_amount_eur"].cumsum()
-    group["ave_price_eur"] = group["cum_total_eur"] / group["cum_shares"]
+def available_tickers(data, tickers, failures=None, report=None):
+    """tickers with a price history, the others are reported along with the reason, when the
+    download knows it (failures, see YahooProvider.download), to the validation report or printed
+    """
+    #  identify tickers not downloaded
+    mask = data["Adj Close"].isna().mean() == 1.0
+    missing = [ticker for ticker in tickers if mask[ticker]]
+    _report_missing(missing, failures, report)
+
+    return [ticker for ticker in tickers if not mask[ticker]]
 
-    return group
 
+def available_rates(rates, report=None):
+    """currency pairs with a rate, the others are reported as the tickers without prices, the
+    tickers quoted in their currency are not valued
 
-def calculate_return(group):
-    """Update transaction time history, include calculation of average price
+    Args:
+        rates (RateTable): exchange rates of the currencies of the tickers
+        report (ValidationReport, optional): report of the checks, printed otherwise
     """
+    _report_missing(rates.missing, rates.failures, report)
+    return rates.rates.columns.tolist()
 
-    mask_buy = group["Action"] == "buy"
-    mask_sell = group["Action"] == "sell"
-
-    # determine the accumulated number of shares
-    group.loc[mask_buy, "action_sign"] = 1
-    group.loc[mask_sell, "action_sign"] = -1
-    group["cum_shares"] = (group["No. of shares"] * group["action_sign"]).cumsum()
-
-    # average price, treating all actions as buy
-    group["pirce_per_share_eur"] = group["Price / share"] / group["Exchange rate"].astype(
-        "float"
-    )  # price per share in eur
-    group["invested_amount_eur"] = group["No. of shares"] * group["pirce_per_share_eur"]
-    group = calculate_average_price(group)
-
-    # update the ave_price whenever a sell event occurs
-    for idx, row in group[mask_sell].iterrows():
-        group.loc[idx, "invested_amount_eur"] = (
-            -group.loc[idx, "No. of shares"] * group.loc[idx - 1, "ave_price_eur"]
-        )
-        group.loc[idx, "ave_price_eur"] = group.loc[idx - 1, "ave_price_eur"]
-        group = calculate_average_price(group)
-
-    # determine the return for each sell event
-    group.loc[mask_sell, "profit_eur"] = (
-        group.loc[mask_sell, "pirce_per_share_eur"] * group.loc[mask_sell, "No. of shares"]
-        + group.loc[mask_sell, "invested_amount_eur"]
-    )
-
-    return group
-
-def feature_engineering(tr): 
-    # feature engineering, calcuate return for each ticker
-    tr_grouped = tr.groupby(by="Ticker")
-    groups = []
 
-    for name, group in tr_grouped:
-        group.reset_index(inplace=True, drop=True)
-        group = calculate_return(group)
-        groups.append(group)
+def data_preprocessing(fln, provider=None, report=None):
+    """read, validate and preprocess an export
 
-    tr = pd.concat(groups).reset_index(drop=True)
-    
-    return tr
+    Args:
+        fln (str): csv file name
+        provider (optional): source of the daily bars, see scr.market_data
+        report (ValidationReport, optional): report of the checks of scr.validation, a new one
+            with the default policy otherwise
 
-def data_preprocessing(fln):
+    Returns:
+        (PositionPanel, pd.DataFrame, pd.Timestamp, pd.Timestamp, pd.DataFrame): daily
+            positions, transactions, first day, day after the last transaction and daily bars
+    """
+    report = ValidationReport() if report is None else report
     # import and clean transaction data
-    tr = read_transactions(fln)
-    tr = feature_engineering(tr)
-    # download the ts for the tickers from yahoo finance
+    with stage("read_transactions") as s:
+        tr = read_transactions(fln)
+        s.rows = len(tr)
+    with stage("validate_transactions") as s:
+        tr, _ = validate_transactions(tr, report=report)
+        s.rows = len(tr)
+    return preprocess_transactions(tr, provider, report)
+
+def preprocess_transactions(tr, provider=None, report=None):
+    """feature engineering and merge with the price history, for transactions already read and
+    validated"""
+    report = ValidationReport() if report is None else report
+    # download the ts for the tickers from yahoo finance, the splits are needed by the cost basis
+    traded = tr.loc[tr["Ticker"].notna()]
+    start = traded.Time.min()
+    end = traded.Time.max() + timedelta(1)
+    provider = provider or get_provider()
+    failures = {}
+    with stage("download_prices") as s:
+        data = provider.download(traded.Ticker.unique().tolist(), start, end, failures)
+        s.rows = len(data)
+
+    # the positions are checked in the basis of the splits, before the cost basis
+    with stage("check_positions") as s:
+        tr, _ = check_positions(adjust_splits(tr, data), report=report)
+        s.rows = len(tr)
+    check_not_empty(tr, report)
+    with stage("feature_engineering") as s:
+        tr = feature_engineering(tr)
+        s.rows = len(tr)
     tickers = tr.Ticker.dropna().unique()
     tickers = tickers.tolist()
-    start = tr.Time.min()
-    end = tr.Time.max() + timedelta(1)
-    data = yf.download(tickers, start, end)
 
-    # download forex data
-    df_forex = yf.download(["USDEUR%3DX"], start, end)[["Adj Close"]]
-    df_forex = df_forex.reset_index()
-    df_forex.rename({"Date": "date", "Adj Close": "rate"}, axis=1, inplace=1)
+    # download the exchange rates of the currencies the tickers are quoted in
+    with stage("download_forex") as s:
+        rates = rate_table(ticker_currencies(tr), start, end, provider)
+        s.rows = len(rates.rates)
+    available_rates(rates, report)
 
-    #  identify tickers not downloaded
-    ts_tickers = data.columns.droplevel(0).values
-    mask = data["Adj Close"].isna().mean() == 1.0
-    tickers_to_drop = mask.loc[mask].keys().values
-
-    # loop through all the tickers:
-    dfs = []
-    groups = tr.groupby(by="Ticker")
-    ts_tickers = data.columns.droplevel(0).values
-
-    for ticker in tickers:
-        if ticker not in tickers_to_drop:
-            # share_no_history(tr_pivoted,ticker)
-            tr_sub = groups.get_group(ticker).copy()[
-                [
-                    "Time",
-                    "Ticker",
-                    "Action",
-                    "No. of shares",
-                    "cum_shares",
-                    "cum_total_eur",
-                    "profit_eur",
-                ]
-            ]
-            tr_sub["Time"] = tr_sub["Time"].dt.floor("d")
-            tts_sub = ticker_price_history(data, ticker)
-            df = merge_histories(tr_sub, tts_sub, ticker, df_forex)
-
-            dfs.append(df)
-        else:
-            print(f"{ticker} not in the database")
-
-    df_combined = pd.concat(dfs)
-    df_combined = df_combined.drop_duplicates(
-        subset=["time_ts", "ticker"], keep="last", inplace=False, ignore_index=False
-    )
-
-    return df_combined, tr, start, end, data
+    tickers = available_tickers(data, tickers, failures, report)
+    with stage("combine_histories") as s:
+        positions = PositionPanel.from_transactions(tr, data, rates, tickers)
+        s.rows = len(positions)
+
+    return positions, tr, start, end, data
 
 if __name__ =='__main__':
-    data_preprocessing("./data/dummy_transactions.csv")
+    report = ValidationReport()
+    with stage("data_preprocessing"):
+        data_preprocessing("./data/dummy_transactions.csv", report=report)
+    print(report)
+    if PROFILING:
+        print(report_json())
     print('voila')
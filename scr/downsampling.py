@@ -0,0 +1,87 @@
+"""Reduce the points of the charts sent to the browser
+
+Long series are downsampled with largest triangle three buckets (LTTB), which keeps the peaks
+and the shape of the series. Charts with more points than WEBGL_THRESHOLD are drawn with WebGL.
+"""
+import numpy as np
+import pandas as pd
+
+# points of a chart after downsampling, shared by its series
+MAX_POINTS = 1000
+
+# points above which the traces are drawn with WebGL rather than SVG
+WEBGL_THRESHOLD = 2000
+
+
+def lttb(x, y, n_out):
+    """positions of the points kept by largest triangle three buckets
+
+    The first and last points are kept. The other points are split in n_out - 2 buckets, and
+    the point of each bucket forming the largest triangle with the point kept in the previous
+    bucket and the average of the next bucket is kept.
+
+    Args:
+        x (np.array): increasing x values
+        y (np.array): y values, missing values are never kept unless a whole bucket is missing
+        n_out (int): number of points to keep
+
+    Returns:
+        (np.array): sorted positions of the points kept
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype="float")
+    y = np.asarray(y, dtype="float")
+    # bucket i spans edges[i]:edges[i + 1], the first and last points are buckets of their own
+    edges = np.floor(np.linspace(1, n - 1, n_out - 1)).astype("int64")
+    edges = np.append(edges, n)
+
+    kept = np.empty(n_out, dtype="int64")
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, stop = edges[i], edges[i + 1]
+        next_x = x[stop : edges[i + 2]]
+        next_y = y[stop : edges[i + 2]]
+        avg_x = next_x.mean()
+        avg_y = np.nanmean(next_y) if np.isfinite(next_y).any() else y[a]
+
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:stop] - y[a]) - (x[a] - x[start:stop]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(np.nan_to_num(area, nan=-1.0)))
+        kept[i + 1] = a
+    return kept
+
+
+def downsample(df, x, ys, max_points=MAX_POINTS):
+    """rows of a frame kept to draw the series, the union of the LTTB points of each series
+
+    Args:
+        df (pd.DataFrame): one row per point
+        x (str): column of the x values, numeric or datetime
+        ys (list): columns of the series
+        max_points (int): maximum number of rows kept
+
+    Returns:
+        (pd.DataFrame): rows of df, in the original order
+    """
+    if len(df) <= max_points:
+        return df
+    x_values = df[x]
+    if pd.api.types.is_datetime64_any_dtype(x_values):
+        x_values = x_values.astype("int64")
+    x_values = x_values.to_numpy(dtype="float")
+
+    n_out = max(3, max_points // len(ys))
+    kept = np.unique(
+        np.concatenate([lttb(x_values, df[y].to_numpy(dtype="float"), n_out) for y in ys])
+    )
+    return df.iloc[kept]
+
+
+def render_mode(n_points):
+    """render mode of plotly express for a chart of n_points points"""
+    return "webgl" if n_points > WEBGL_THRESHOLD else "svg"
@@ -0,0 +1,185 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+from scr.market_data import _to_panel
+
+CHART_URL = "https://query1.finance.yahoo.com/v8/finance/chart/{ticker}"
+
+# status codes worth another attempt, the others are reported right away
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class FetchError(Exception):
+    """a ticker that could not be fetched, after all the attempts"""
+
+    def __init__(self, ticker, reason, status=None, attempts=1):
+        super().__init__(f"{ticker}: {reason}")
+        self.ticker = ticker
+        self.reason = reason
+        self.status = status
+        self.attempts = attempts
+
+    def to_dict(self):
+        return {
+            "ticker": self.ticker,
+            "reason": self.reason,
+            "status": self.status,
+            "attempts": self.attempts,
+        }
+
+
+def parse_chart(payload):
+    """daily bars from a response of the chart API
+
+    Args:
+        payload (dict): decoded json response
+
+    Returns:
+        (pd.DataFrame): daily bars, columns FIELDS of scr.market_data, indexed by date
+    """
+    result = payload["chart"]["result"][0]
+    timestamps = np.asarray(result.get("timestamp", []), dtype="int64")
+    offset = result["meta"].get("gmtoffset", 0)
+    bars = result["indicators"]["quote"][0]
+    adjclose = result["indicators"].get("adjclose", [{}])[0].get("adjclose", bars.get("close"))
+
+    def _column(values):
+        # missing bars are null in the response
+        return np.array(values or [], dtype="float")
+
+    index = pd.to_datetime(timestamps + offset, unit="s").floor("d")
+
+    def _events(events, value):
+        # one entry per event, keyed by its timestamp, 0 on the other days
+        column = pd.Series(0.0, index=index)
+        for event in events.values():
+            day = pd.to_datetime(event["date"] + offset, unit="s").floor("d")
+            if day in column.index:
+                column[day] = value(event)
+        return column.to_numpy()
+
+    events = result.get("events", {})
+    ts = pd.DataFrame(
+        {
+            "Adj Close": _column(adjclose),
+            "Close": _column(bars.get("close")),
+            "Dividends": _events(events.get("dividends", {}), lambda e: e["amount"]),
+            "High": _column(bars.get("high")),
+            "Low": _column(bars.get("low")),
+            "Open": _column(bars.get("open")),
+            "Stock Splits": _events(
+                events.get("splits", {}), lambda e: e["numerator"] / e["denominator"]
+            ),
+            "Volume": _column(bars.get("volume")),
+        },
+        index=pd.DatetimeIndex(index, name="Date"),
+    )
+    # the bar of the current day may be repeated
+    return ts[~ts.index.duplicated(keep="last")]
+
+
+class ChartProvider:
+    """daily bars from the chart API of yahoo finance, one request per ticker
+
+    The tickers are split in batches, fetched concurrently on a pool of max_workers threads.
+    Each thread keeps its own HTTP session, so connections are reused from one request and one
+    download to the next. Connection errors and the RETRY_STATUS responses are retried with
+    exponential backoff; the tickers still failing are reported in the failures of the download.
+    """
+
+    def __init__(
+        self, url=CHART_URL, max_workers=8, batch_size=4, retries=3, backoff=0.5, timeout=10
+    ):
+        self.url = url
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self._local = threading.local()
+        self._executor = None
+
+    def _session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers["User-Agent"] = "Mozilla/5.0"
+            self._local.session = session
+        return session
+
+    def _fetch_one(self, ticker, start, end):
+        params = {
+            "period1": int(start.timestamp()),
+            "period2": int(end.timestamp()),
+            "interval": "1d",
+            "events": "div,splits",
+        }
+        url = self.url.format(ticker=quote(ticker, safe=""))
+
+        for attempt in range(1, self.retries + 2):
+            status = None
+            try:
+                response = self._session().get(url, params=params, timeout=self.timeout)
+                status = response.status_code
+                if status == 200:
+                    return parse_chart(response.json())
+                try:
+                    reason = response.json()["chart"]["error"]["description"]
+                except (ValueError, KeyError, TypeError):
+                    reason = response.reason
+            except requests.RequestException as err:
+                reason = str(err)
+            except (ValueError, KeyError, IndexError, TypeError) as err:
+                raise FetchError(ticker, f"unexpected response ({err!r})", status, attempt)
+
+            if status is not None and status not in RETRY_STATUS:
+                raise FetchError(ticker, reason, status, attempt)
+            if attempt <= self.retries:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+
+        raise FetchError(ticker, reason, status, attempt)
+
+    def _fetch_batch(self, batch, start, end):
+        results = []
+        for ticker in batch:
+            try:
+                results.append((ticker, self._fetch_one(ticker, start, end)))
+            except FetchError as err:
+                results.append((ticker, err))
+        return results
+
+    def download(self, tickers, start, end, failures=None):
+        """see scr.market_data.YahooProvider.download, the failed tickers are kept as columns
+        full of NaN and reported in failures
+        """
+        failures = {} if failures is None else failures
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.max_workers)
+
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        tickers = list(dict.fromkeys(tickers))
+        batches = [
+            tickers[i : i + self.batch_size] for i in range(0, len(tickers), self.batch_size)
+        ]
+
+        frames = {}
+        for results in self._executor.map(
+            lambda batch: self._fetch_batch(batch, start, end), batches
+        ):
+            for ticker, result in results:
+                if isinstance(result, FetchError):
+                    failures[ticker] = result
+                else:
+                    frames[ticker] = result.loc[(result.index >= start) & (result.index < end)]
+
+        return _to_panel(frames, tickers)
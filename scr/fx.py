@@ -0,0 +1,140 @@
+"""Exchange rates to the euro of the currencies the tickers are quoted in
+
+The currency of each ticker is read from the export (Currency (Price / share)). The pairs of all
+the currencies are fetched at once and kept in a RateTable, one column per currency, so that the
+prices of all the tickers are converted in one broadcast operation over the (ticker, day) panel.
+"""
+import numpy as np
+import pandas as pd
+
+from scr.market_data import get_provider
+from scr.memo import LRUCache
+
+BASE = "EUR"
+
+# column of the export with the currency of the price
+CURRENCY = "Currency (Price / share)"
+
+# currency assumed for the tickers without one, as before the currencies were read
+DEFAULT_CURRENCY = "USD"
+
+# sub-units some exchanges quote in, eg London in pence: currency and factor to it
+SUBUNITS = {"GBX": ("GBP", 0.01), "GBp": ("GBP", 0.01), "ZAc": ("ZAR", 0.01), "ILA": ("ILS", 0.01)}
+
+# rate tables fetched by this process, see rate_table
+_tables = LRUCache(maxsize=8)
+
+
+def pair(currency):
+    """currency pair to the euro on yahoo finance, eg USDEUR%3DX"""
+    return f"{currency}{BASE}%3DX"
+
+
+def _quote(currency):
+    """currency of the pair and factor of a sub-unit"""
+    return SUBUNITS.get(currency, (currency, 1.0))
+
+
+def pairs(currencies):
+    """currency pairs to fetch for the currencies, none for the euro"""
+    quotes = {_quote(currency)[0] for currency in currencies}
+    return sorted(pair(currency) for currency in quotes if currency != BASE)
+
+
+def ticker_currencies(tr, tickers=None):
+    """currency each ticker is quoted in, the one of its last transaction
+
+    Args:
+        tr (pd.DataFrame): transactions, as returned by read_transactions
+        tickers (list, optional): tickers, all the tickers of the transactions by default
+
+    Returns:
+        (pd.Series): currency per ticker, DEFAULT_CURRENCY when not in the export
+    """
+    tickers = tr["Ticker"].dropna().unique().tolist() if tickers is None else list(tickers)
+    if CURRENCY not in tr:
+        return pd.Series(DEFAULT_CURRENCY, index=tickers, dtype="object")
+    currency = tr.loc[tr[CURRENCY].notna(), ["Ticker", CURRENCY]].astype("object")
+    currency = currency.groupby("Ticker")[CURRENCY].last()
+    return currency.reindex(tickers).fillna(DEFAULT_CURRENCY)
+
+
+class RateTable:
+    """exchange rate to the euro per day, one column per currency pair, on the days any pair has
+    a rate. A pair without a rate on a day takes the last rate before, or the first one for the
+    days before its first rate. The tickers quoted in a currency without any rate are not valued
+
+    Attributes:
+        rates (pd.DataFrame): rate per day of the pairs with a rate
+        missing (list): pairs without any rate, see scr.data_preparation.available_rates
+        failures (dict): failed downloads of the pairs, per pair, see scr.fetcher.FetchError
+    """
+
+    def __init__(self, rates, failures=None):
+        """
+        Args:
+            rates (pd.DataFrame): rate per day of each pair, one column per pair
+            failures (dict, optional): failed downloads of the pairs, per pair
+        """
+        missing = rates.columns[rates.isna().all()]
+        self.missing = missing.tolist()
+        self.failures = failures or {}
+        # filled per pair, a day without the rate of one pair is kept for the other currencies
+        self.rates = rates.drop(columns=missing).dropna(how="all").ffill().bfill()
+
+    @classmethod
+    def from_provider(cls, currencies, start, end, provider=None):
+        """fetch the pairs of the currencies at once
+
+        Args:
+            currencies (list): currencies the tickers are quoted in
+            start, end (pd.Timestamp): range of days, end is exclusive
+            provider (optional): source of the daily bars, see scr.market_data
+        """
+        names = pairs(currencies)
+        if not names:
+            return cls(pd.DataFrame(index=pd.DatetimeIndex([], name="date")))
+        provider = provider or get_provider()
+        failures = {}
+        data = provider.download(names, start, end, failures)
+        return cls(data["Adj Close"][names].rename_axis("date"), failures)
+
+    def align(self, days):
+        """days with a rate, all the days when no pair is needed"""
+        if self.rates.columns.empty:
+            return days
+        return days[days.isin(self.rates.index)]
+
+    def convert(self, days, currencies):
+        """rates of the currencies on days with a rate
+
+        Args:
+            days (pd.DatetimeIndex): days, see align
+            currencies (list): currencies, eg USD, GBX or EUR
+
+        Returns:
+            (np.array): shape (n_currencies, n_days)
+        """
+        rates = np.empty((len(currencies), len(days)))
+        for row, currency in enumerate(currencies):
+            quote, factor = _quote(currency)
+            if quote == BASE:
+                rates[row] = factor
+            elif pair(quote) in self.rates:
+                rates[row] = self.rates[pair(quote)].reindex(days).to_numpy(dtype="float") * factor
+            else:
+                rates[row] = np.nan
+        return rates
+
+
+def rate_table(currencies, start, end, provider=None):
+    """RateTable of the currencies, fetched once per process and range of days. A table with
+    failed downloads is not kept, the pairs are fetched again by the next call"""
+    provider = provider or get_provider()
+    key = (provider, tuple(pairs(currencies)), pd.Timestamp(start), pd.Timestamp(end))
+    table = _tables.get(key)
+    if table is None:
+        table = RateTable.from_provider(currencies, start, end, provider)
+        if not table.failures:
+            _tables.put(key, table)
+    return table
@@ -0,0 +1,121 @@
+"""Holdings of the portfolio at any date, by binary search over their change points
+
+The running values of each ticker only change with its transactions. They are stored once per
+ticker and day with transactions, sorted by ticker and day. The holdings at a date are the last
+change point of each ticker up to that date, found by one binary search for all the tickers at
+once, instead of a scan of the daily positions.
+"""
+import numpy as np
+import pandas as pd
+
+
+class HoldingsIndex:
+    """holdings, valuation and composition of the portfolio as of any date"""
+
+    def __init__(self, tickers, keys, cum_shares, cum_total, days, close, currency, rate, value):
+        """
+        Args:
+            tickers (pd.Index): tickers, in the order of their codes
+            keys (np.array): change points, code of the ticker * number of days + day, sorted
+            cum_shares, cum_total (np.array): running values at the change points
+            days (pd.DatetimeIndex): days of the prices
+            close (np.array): close per ticker and day, shape (n_tickers, n_days)
+            currency (np.array): row of rate of each ticker
+            rate (np.array): exchange rate per currency and day
+            value (np.array): open position per ticker and day, forward filled over the days
+                without a price
+        """
+        self.tickers = tickers
+        self.keys = keys
+        self.cum_shares = cum_shares
+        self.cum_total = cum_total
+        self.days = days
+        self.close = close
+        self.currency = currency
+        self.rate = rate
+        self.value = value
+        self._first = np.searchsorted(keys, np.arange(len(tickers)) * len(days))
+
+    @classmethod
+    def from_positions(cls, tr, positions):
+        """change points of the transactions, prices and values of the position panel, shared
+        with the panel
+
+        As in the panel, only the transactions on a day with a price count, the last one of the
+        day in the order of the export.
+
+        Args:
+            tr (pd.DataFrame): transactions, as returned by feature_engineering
+            positions (PositionPanel): daily positions, for the tickers and their prices
+        """
+        tickers = pd.Index(positions.tickers.categories)
+        n_days = len(positions.days)
+        codes = tickers.get_indexer(tr["Ticker"])
+        day_pos = positions.days.get_indexer(tr["Time"].dt.floor("d"))
+        # transactions without a number of shares do not change the holdings
+        mask = (codes >= 0) & (day_pos >= 0) & tr["cum_shares"].notna().to_numpy()
+
+        running = tr.loc[mask, ["cum_shares", "cum_total_eur"]]
+        running = running.groupby(codes[mask].astype("int64") * n_days + day_pos[mask]).last()
+        return cls(
+            tickers,
+            running.index.to_numpy(),
+            running["cum_shares"].to_numpy(dtype="float"),
+            running["cum_total_eur"].to_numpy(dtype="float"),
+            positions.days,
+            positions.close_price,
+            positions.currency.codes,
+            positions.rate,
+            positions.value,
+        )
+
+    def _day(self, date):
+        """position of the last day with a price up to the date, -1 before the first day"""
+        return self.days.searchsorted(pd.Timestamp(date).floor("d"), side="right") - 1
+
+    def holdings(self, date):
+        """shares and invested amount of each ticker at the end of the date
+
+        Returns:
+            (pd.DataFrame): cum_shares and invested amount, indexed by ticker, only the tickers
+                traded up to the date
+        """
+        day = self._day(date)
+        keys = np.arange(len(self.tickers), dtype="int64") * len(self.days) + day
+        last = np.searchsorted(self.keys, keys, side="right") - 1
+        traded = (last >= self._first) & (day >= 0)
+        last = last[traded]
+        return pd.DataFrame(
+            {"cum_shares": self.cum_shares[last], "invested amount": self.cum_total[last]},
+            index=pd.Index(self.tickers[traded], name="ticker"),
+        )
+
+    def valuation(self, date):
+        """holdings valued at the close and exchange rate of the last day up to the date, as
+        the daily positions
+
+        Returns:
+            (pd.DataFrame): cum_shares, invested amount, close_price, rate and open position,
+                indexed by ticker
+        """
+        df = self.holdings(date)
+        day = self._day(date)
+        rows = self.tickers.get_indexer(df.index)
+        df["close_price"] = self.close[rows, day]
+        df["rate"] = self.rate[self.currency[rows], day]
+        df["open position"] = self.value[rows, day]
+        return df
+
+    def composition(self, date, min_shares=0.25):
+        """open positions at the date and their weight, the largest first
+
+        Args:
+            min_shares (float): positions with fewer shares are considered closed
+
+        Returns:
+            (pd.DataFrame): columns of valuation and weight, indexed by ticker
+        """
+        df = self.valuation(date)
+        df = df.loc[df["cum_shares"] > min_shares].copy()
+        df["weight"] = df["open position"] / df["open position"].sum()
+        return df.sort_values(by="open position", ascending=False)
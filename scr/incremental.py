@@ -0,0 +1,151 @@
+import hashlib
+from datetime import timedelta
+
+import pandas as pd
+
+from scr.corporate_actions import adjust_splits, splits_since
+from scr.cost_basis import cost_basis, running_state
+from scr.data_preparation import available_rates, available_tickers, preprocess_transactions
+from scr.fx import rate_table, ticker_currencies
+from scr.market_data import get_provider
+from scr.position_panel import PositionPanel
+from scr.profiling import stage
+from scr.utility import read_transactions
+from scr.validation import ValidationReport, check_positions, validate_transactions
+
+# number of processed exports kept to continue from
+MAX_STATES = 4
+
+_states = []
+
+
+def fingerprint(tr):
+    """hash of each transaction, the rows of an export appended with new transactions start with
+    the same hashes
+
+    Args:
+        tr (pd.DataFrame): transactions, as returned by read_transactions
+
+    Returns:
+        (np.array): one uint64 hash per row
+    """
+    return pd.util.hash_pandas_object(tr, index=False).to_numpy()
+
+
+def _digest(row_hashes):
+    return hashlib.sha1(row_hashes.tobytes()).hexdigest()
+
+
+def _find_state(states, row_hashes):
+    """state of the longest processed export the transactions start with"""
+    for state in sorted(states, key=lambda state: -state["n_rows"]):
+        n_rows = state["n_rows"]
+        if n_rows <= len(row_hashes) and _digest(row_hashes[:n_rows]) == state["fingerprint"]:
+            return state
+    return None
+
+
+def _update(state, tr_new, provider, report):
+    """continue the processed export in state with the appended transactions"""
+    positions, tr, start, end, data = state["result"]
+    if tr_new["Time"].min() < start:
+        return None
+
+    traded = tr_new.loc[tr_new["Ticker"].notna()]
+    tickers = set(tr.Ticker.dropna()) | set(traded.Ticker)
+    end_new = end if traded.empty else max(end, traded.Time.max() + timedelta(1))
+    failures = {}
+    with stage("download_prices") as s:
+        data = provider.download(sorted(tickers), start, end_new, failures)
+        s.rows = len(data)
+    # a new split changes the basis of the shares of the processed transactions
+    if splits_since(data, end):
+        return None
+
+    with stage("check_positions") as s:
+        tr_new, _ = check_positions(
+            adjust_splits(tr_new, data), state["running"]["cum_shares"], report=report
+        )
+        s.rows = len(tr_new)
+    with stage("feature_engineering") as s:
+        tr_new = cost_basis(tr_new, state["running"])
+        tr = pd.concat([tr, tr_new]).sort_values(by="Ticker", kind="mergesort")
+        tr = tr.reset_index(drop=True)
+        s.rows = len(tr_new)
+    end = tr.Time.max() + timedelta(1)
+
+    tickers = tr.Ticker.dropna().unique().tolist()
+    with stage("download_forex") as s:
+        rates = rate_table(ticker_currencies(tr), start, end, provider)
+        s.rows = len(rates.rates)
+    # a new currency, or new rates of a pair, change the days of the processed positions
+    days = rates.align(data.index)
+    if not days[days <= positions.days[-1]].equals(positions.days):
+        return None
+    available_rates(rates, report)
+    tickers = available_tickers(data, tickers, failures, report)
+
+    affected = [ticker for ticker in tickers if ticker in set(tr_new["Ticker"])]
+    unaffected = [ticker for ticker in tickers if ticker not in set(affected)]
+
+    # the tickers without new transactions carry their last position over the new days
+    with stage("combine_histories") as s:
+        panels = []
+        if affected:
+            panels.append(PositionPanel.from_transactions(tr, data, rates, affected))
+        if unaffected:
+            panels.append(positions.slice(tickers=unaffected).extend(data, rates))
+        positions = PositionPanel.concat(panels)
+        s.rows = len(positions)
+
+    return positions, tr, start, end, data
+
+
+def incremental_preprocessing(fln, states=None, provider=None, report=None):
+    """same as data_preprocessing, but continues from a previously processed export when the
+    transactions in fln only append rows to it: the cost basis is calculated for the new rows
+    only, and the daily positions are merged again only for the tickers traded in the new rows.
+
+    Args:
+        fln (str): csv file name
+        states (list, optional): processed exports, updated in place. Defaults to a module level list
+        provider (optional): source of the daily bars, see scr.market_data
+        report (ValidationReport, optional): report of the checks of scr.validation
+
+    Returns:
+        same as data_preprocessing
+    """
+    states = _states if states is None else states
+    provider = provider or get_provider()
+
+    report = ValidationReport() if report is None else report
+
+    with stage("read_transactions") as s:
+        tr_raw = read_transactions(fln)
+        s.rows = len(tr_raw)
+    with stage("validate_transactions") as s:
+        tr_raw, _ = validate_transactions(tr_raw, report=report)
+        s.rows = len(tr_raw)
+    with stage("fingerprint"):
+        row_hashes = fingerprint(tr_raw)
+        state = _find_state(states, row_hashes)
+
+    if state is not None and state["n_rows"] == len(tr_raw):
+        return state["result"]
+
+    result = None
+    if state is not None:
+        result = _update(state, tr_raw.iloc[state["n_rows"] :], provider, report)
+    if result is None:
+        result = preprocess_transactions(tr_raw, provider, report)
+
+    states.append(
+        {
+            "fingerprint": _digest(row_hashes),
+            "n_rows": len(tr_raw),
+            "running": running_state(result[1]),
+            "result": result,
+        }
+    )
+    del states[:-MAX_STATES]
+    return result
@@ -0,0 +1,364 @@
+import contextlib
+import json
+import os
+import uuid
+from datetime import datetime, timedelta
+from urllib.parse import quote
+
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # windows
+    fcntl = None
+    import msvcrt
+
+# columns of the daily bars, in the order returned by yf.download with the corporate actions,
+# see scr.corporate_actions
+FIELDS = ["Adj Close", "Close", "Dividends", "High", "Low", "Open", "Stock Splits", "Volume"]
+
+CACHE_DIR = os.environ.get(
+    "PORTFOLIO_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "portfolio-dashboard")
+)
+
+
+def _day_range(start, end):
+    """normalise a date range to whole days, end is exclusive"""
+    return pd.Timestamp(start).floor("d"), pd.Timestamp(end).ceil("d")
+
+
+def _to_panel(frames, tickers):
+    """combine daily bars per ticker into one frame with columns (field, ticker), as yf.download
+
+    tickers without data are kept as columns full of NaN
+    """
+    frames = {
+        ticker: frames.get(ticker, pd.DataFrame(columns=FIELDS)).reindex(columns=FIELDS)
+        for ticker in sorted(set(tickers))
+    }
+    panel = pd.concat(frames, axis=1).swaplevel(axis=1).sort_index(axis=1)
+    panel.index = pd.DatetimeIndex(panel.index, name="Date")
+    return panel.astype("float")
+
+
+class YahooProvider:
+    """daily bars downloaded from yahoo finance"""
+
+    def download(self, tickers, start, end, failures=None):
+        """download the daily bars for the tickers
+
+        Args:
+            tickers (list): name of the stocks, eg apple: AAPL
+            start (pd.Timestamp): first day
+            end (pd.Timestamp): last day, exclusive
+            failures (dict, optional): filled with the tickers that could not be fetched, with
+                a FetchError, by the providers that know the reason. Kept per call, as the
+                provider is shared by the threads and the requests
+
+        Returns:
+            (pd.DataFrame): daily bars, columns (field, ticker)
+        """
+        import yfinance as yf
+
+        data = yf.download(
+            list(tickers),
+            start,
+            end,
+            auto_adjust=False,
+            actions=True,
+            group_by="column",
+            progress=False,
+        )
+        if not isinstance(data.columns, pd.MultiIndex):
+            data.columns = pd.MultiIndex.from_product([data.columns, list(tickers)])
+        data.index = data.index.tz_localize(None) if data.index.tz else data.index
+        return _to_panel({t: data.xs(t, axis=1, level=1) for t in tickers}, tickers)
+
+
+class LocalProvider:
+    """daily bars from local frames, a stand-in for yahoo finance when working offline"""
+
+    def __init__(self, frames):
+        """
+        Args:
+            frames (dict): daily bars (columns FIELDS, indexed by date) per ticker
+        """
+        self.frames = frames
+
+    @classmethod
+    def from_directory(cls, directory):
+        """read the daily bars of <ticker>.csv or <ticker>.parquet files in the directory"""
+        frames = {}
+        for fln in sorted(os.listdir(directory)):
+            ticker, ext = os.path.splitext(fln)
+            path = os.path.join(directory, fln)
+            if ext == ".csv":
+                frames[ticker] = pd.read_csv(path, index_col=0, parse_dates=True)
+            elif ext == ".parquet":
+                frames[ticker] = pd.read_parquet(path)
+        return cls(frames)
+
+    def download(self, tickers, start, end, failures=None):
+        """see YahooProvider.download"""
+        start, end = _day_range(start, end)
+        frames = {}
+        for ticker in tickers:
+            if ticker in self.frames:
+                ts = self.frames[ticker]
+                frames[ticker] = ts.loc[(ts.index >= start) & (ts.index < end)]
+        return _to_panel(frames, tickers)
+
+
+def _new_split(cached, fetched):
+    """whether the fetched bars have a split unknown to the cached bars and after some of them"""
+    known = set(cached.index[cached["Stock Splits"] > 0])
+    days = [
+        day for _, _, ts in fetched for day in ts.index[ts["Stock Splits"] > 0] if day not in known
+    ]
+    return bool(days) and cached.index.min() < max(days)
+
+
+class PriceCache:
+    """on-disk cache of daily bars in front of a provider
+
+    The bars of each ticker are stored in one parquet file, the covered date range in a
+    manifest. Only the date ranges missing from the cache are requested from the provider.
+    Bars of the last `settle_days` days may still change, they are refetched once older
+    than `ttl`. A split fetched after the cached bars changes the basis of their prices, the
+    bars of the ticker are then fetched again whole. The least recently used tickers are evicted when the cache exceeds `max_bytes`.
+    Several processes may share the directory: the files are written whole and replaced at once,
+    and the manifest is updated under a file lock.
+    The tickers the provider failed to fetch are reported in the failures of each download.
+    """
+
+    def __init__(
+        self,
+        provider,
+        directory=CACHE_DIR,
+        ttl=timedelta(hours=1),
+        settle_days=3,
+        max_bytes=512 * 1024 ** 2,
+    ):
+        self.provider = provider
+        self.directory = directory
+        self.ttl = ttl
+        self.settle_days = settle_days
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._manifest_path = os.path.join(directory, "manifest.json")
+
+    def _path(self, ticker):
+        return os.path.join(self.directory, quote(ticker, safe="") + ".parquet")
+
+    def _read_manifest(self):
+        if not os.path.exists(self._manifest_path):
+            return {}
+        with open(self._manifest_path) as f:
+            return json.load(f)
+
+    def _write_manifest(self, manifest):
+        # a file of its own per writer, replaced at once, a reader never sees half a manifest
+        tmp = f"{self._manifest_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(tmp, self._manifest_path)
+
+    def _write_bars(self, ticker, ts):
+        tmp = f"{self._path(ticker)}.{uuid.uuid4().hex}.tmp"
+        ts.to_parquet(tmp)
+        os.replace(tmp, self._path(ticker))
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """exclusive access to the manifest, across the processes sharing the directory"""
+        with open(self._manifest_path + ".lock", "a+") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _update_manifest(self, changed, used, now):
+        """merge the entries of a download into the manifest as it is on disk, other processes
+        may have written it since it was read
+
+        Args:
+            changed (dict): new entry per ticker, None to remove the ticker
+            used (list): tickers read from the cache
+        """
+        with self._locked():
+            manifest = self._read_manifest()
+            for ticker, entry in changed.items():
+                if entry is None:
+                    manifest.pop(ticker, None)
+                else:
+                    manifest[ticker] = entry
+            for ticker in used:
+                if ticker in manifest:
+                    manifest[ticker]["used_at"] = str(now)
+            self._evict(manifest)
+            self._write_manifest(manifest)
+
+    def _missing_ranges(self, entry, start, end, now):
+        """date ranges not covered by the cache entry, extended so that the entry stays contiguous"""
+        if entry is None:
+            return [(start, end)]
+
+        ranges = []
+        cached_start = pd.Timestamp(entry["start"])
+        if start < cached_start:
+            ranges.append((start, cached_start))
+
+        # recent bars are only trusted until the ttl expires
+        cached_end = pd.Timestamp(entry["end"])
+        if now - pd.Timestamp(entry["fetched_at"]) > self.ttl:
+            cached_end = pd.Timestamp(entry["final_end"])
+        if end > cached_end:
+            ranges.append((cached_end, end))
+        return ranges
+
+    def download(self, tickers, start, end, failures=None):
+        """see YahooProvider.download, the bars are read from the cache where possible"""
+        start, end = _day_range(start, end)
+        now = pd.Timestamp(datetime.now())
+        # the manifest is read without the lock, the fetch does not block the other processes,
+        # the entries changed are merged back under the lock
+        manifest = self._read_manifest()
+        changed, used = {}, []
+        # the tickers the provider failed to fetch keep their entry, the range is fetched again
+        # by the next download
+        failed = {}
+        # bars cached without the corporate actions are fetched again
+        for ticker in set(tickers):
+            if ticker in manifest and manifest[ticker].get("fields") != FIELDS:
+                del manifest[ticker]
+                changed[ticker] = None
+
+        # collect the missing ranges, tickers sharing a range are fetched together
+        to_fetch = {}
+        for ticker in set(tickers):
+            for rng in self._missing_ranges(manifest.get(ticker), start, end, now):
+                to_fetch.setdefault(rng, []).append(ticker)
+
+        fetched = {}
+        for (fetch_start, fetch_end), group in to_fetch.items():
+            panel = self.provider.download(sorted(group), fetch_start, fetch_end, failed)
+            for ticker in group:
+                ts = panel.xs(ticker, axis=1, level=1).dropna(how="all")
+                fetched.setdefault(ticker, []).append((fetch_start, fetch_end, ts))
+
+        frames = {}
+        for ticker in set(tickers):
+            entry = manifest.get(ticker)
+            cached = None
+            if entry:
+                try:
+                    cached = pd.read_parquet(self._path(ticker))
+                except FileNotFoundError:
+                    # evicted by another process since the manifest was read
+                    entry = None
+                    panel = self.provider.download([ticker], start, end, failed)
+                    ts = panel.xs(ticker, axis=1, level=1).dropna(how="all")
+                    fetched[ticker] = [(start, end, ts)]
+
+            refetch = ticker in fetched and ticker not in failed and cached is not None
+            if refetch and _new_split(cached, fetched[ticker]):
+                fetch_start = min(pd.Timestamp(entry["start"]), start)
+                fetch_end = max(e for _, e, _ in fetched[ticker])
+                panel = self.provider.download([ticker], fetch_start, fetch_end, failed)
+                ts = panel.xs(ticker, axis=1, level=1).dropna(how="all")
+                fetched[ticker] = [(fetch_start, fetch_end, ts)]
+                if ticker not in failed:
+                    cached = None
+
+            if ticker in fetched and ticker not in failed:
+                new = [ts for _, _, ts in fetched[ticker]]
+                if cached is None and all(ts.empty for ts in new):
+                    continue  # unknown to the provider, nothing to cache
+                ts = pd.concat(([cached] if cached is not None else []) + new)
+                ts = ts[~ts.index.duplicated(keep="last")].sort_index()
+                self._write_bars(ticker, ts)
+
+                fetch_start = min(s for s, _, _ in fetched[ticker])
+                fetch_end = max(e for _, e, _ in fetched[ticker])
+                entry = entry or {"start": str(fetch_start), "end": str(fetch_end)}
+                entry["start"] = str(min(pd.Timestamp(entry["start"]), fetch_start))
+                if fetch_end >= pd.Timestamp(entry["end"]):
+                    entry["end"] = str(fetch_end)
+                    entry["final_end"] = str(min(fetch_end, now.floor("d") - timedelta(self.settle_days)))
+                    entry["fetched_at"] = str(now)
+                entry["bytes"] = os.path.getsize(self._path(ticker))
+                entry["fields"] = FIELDS
+                entry["used_at"] = str(now)
+                changed[ticker] = entry
+            else:
+                ts = cached
+                used.append(ticker)
+
+            if ts is not None:
+                frames[ticker] = ts.loc[(ts.index >= start) & (ts.index < end)]
+
+        self._update_manifest(changed, used, now)
+        if failures is not None:
+            failures.update(failed)
+        return _to_panel(frames, tickers)
+
+    def _evict(self, manifest):
+        """remove the least recently used tickers until the cache fits in max_bytes"""
+        total = sum(entry["bytes"] for entry in manifest.values())
+        for ticker in sorted(manifest, key=lambda t: manifest[t]["used_at"]):
+            if total <= self.max_bytes:
+                break
+            total -= manifest.pop(ticker)["bytes"]
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self._path(ticker))
+
+    def clear(self):
+        """remove all the cached bars"""
+        with self._locked():
+            for ticker in self._read_manifest():
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(self._path(ticker))
+            self._write_manifest({})
+
+
+_default_provider = None
+
+
+def get_provider():
+    """the provider used when none is specified: yahoo finance behind the on-disk cache"""
+    global _default_provider
+    if _default_provider is None:
+        from scr.fetcher import ChartProvider
+
+        _default_provider = PriceCache(ChartProvider())
+    return _default_provider
+
+
+def set_provider(provider):
+    """replace the default provider, eg by a LocalProvider to work offline"""
+    global _default_provider
+    _default_provider = provider
+
+
+def download_forex(pair, start, end, provider=None):
+    """download the exchange rate at close
+
+    Args:
+        pair (str): currency pair on yahoo finance, eg USDEUR%3DX
+
+    Returns:
+        df_forex (pd.DataFrame): columns date and rate
+    """
+    provider = provider or get_provider()
+    data = provider.download([pair], start, end)
+    df_forex = data[("Adj Close", pair)].dropna().rename("rate").rename_axis("date")
+    return df_forex.reset_index()
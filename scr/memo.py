@@ -0,0 +1,52 @@
+import hashlib
+from collections import OrderedDict
+
+
+def content_hash(fln, blocksize=1 << 20):
+    """sha256 of the content of a file, to recognise an upload seen before
+
+    Args:
+        fln (str or file-like): file name, or an uploaded file
+
+    Returns:
+        (str): hex digest
+    """
+    digest = hashlib.sha256()
+    if hasattr(fln, "getvalue"):
+        digest.update(fln.getvalue())
+    elif hasattr(fln, "read"):
+        pos = fln.tell()
+        for block in iter(lambda: fln.read(blocksize), b""):
+            digest.update(block)
+        fln.seek(pos)
+    else:
+        with open(fln, "rb") as f:
+            for block in iter(lambda: f.read(blocksize), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+class LRUCache:
+    """mapping holding at most maxsize entries, the least recently used one is evicted first"""
+
+    def __init__(self, maxsize=8):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        if key not in self._entries:
+            return default
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    def put(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
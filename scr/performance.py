@@ -0,0 +1,271 @@
+"""Time-weighted (TWR) and money-weighted (XIRR) returns of the portfolio and of each ticker, over
+any number of windows at once
+
+The daily values come from the position panel, the cash flows from the transactions (the amount
+bought, less the amount sold) and the dividends of the panel, all in euro. The return of a day
+counts the money added that day as invested from the start of the day and the money withdrawn as
+withdrawn at its end:
+
+    r_t = (V_t - V_{t-1} - F_t) / (V_{t-1} + max(F_t, 0))
+
+The TWR of a window links the daily returns, read from the cumulative sum of log(1 + r_t): two
+lookups per window and ticker. The XIRR of a window is the rate that values the value at its
+start, the cash flows during it and the value at its end to 0. It is solved by Newton's method
+for all the windows and tickers together, the cash flows of all the pairs in flat arrays.
+"""
+import numpy as np
+import pandas as pd
+
+# name of the whole portfolio in the results, next to the tickers
+PORTFOLIO = "portfolio"
+
+# windows ending on the last day, see standard_windows
+WINDOWS = {
+    "1M": pd.DateOffset(months=1),
+    "3M": pd.DateOffset(months=3),
+    "YTD": None,
+    "1Y": pd.DateOffset(years=1),
+    "3Y": pd.DateOffset(years=3),
+    "5Y": pd.DateOffset(years=5),
+    "all": None,
+}
+
+RESULT_COLUMNS = [
+    "window",
+    "ticker",
+    "start",
+    "end",
+    "start_value",
+    "end_value",
+    "net_flows",
+    "twr",
+    "twr_annualized",
+    "xirr",
+]
+
+
+def _newton(pair, tau, amount, n_pairs, tol=1e-10, max_iter=50):
+    """annual rate zeroing the present value of the cash flows of each pair
+
+    Args:
+        pair (np.array): pair of each cash flow
+        tau (np.array): time of each cash flow from the start of its window, in years
+        amount (np.array): amount of each cash flow, the money received positive
+
+    Returns:
+        (np.array): rate of each pair, NaN where Newton's method did not converge
+    """
+    # in log(1 + rate), the present value is then a sum of exponentials
+    x = np.zeros(n_pairs)
+    converged = np.zeros(n_pairs, dtype="bool")
+    failed = np.zeros(n_pairs, dtype="bool")
+    for _ in range(max_iter):
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            discounted = amount * np.exp(-x[pair] * tau)
+            npv = np.bincount(pair, weights=discounted, minlength=n_pairs)
+            slope = -np.bincount(pair, weights=tau * discounted, minlength=n_pairs)
+            step = np.clip(npv / slope, -1.0, 1.0)
+        failed |= ~(converged | np.isfinite(step))
+        step = np.where(converged | failed, 0.0, step)
+        x -= step
+        converged |= ~failed & (np.abs(step) < tol)
+        if (converged | failed).all():
+            break
+        # only the cash flows of the pairs left are iterated on
+        active = ~(converged | failed)[pair]
+        pair, tau, amount = pair[active], tau[active], amount[active]
+    return np.where(converged, np.expm1(x), np.nan)
+
+
+class ReturnsEngine:
+    """daily returns and cash flows of the portfolio and of each ticker, see the module
+    documentation
+
+    Attributes:
+        days (pd.DatetimeIndex): days of the panel
+        names (pd.Index): PORTFOLIO, then the tickers, the rows of the arrays
+        value, flows (np.array): value at close and cash flows in euro, shape
+            (n_names, n_days + 1), the first column a day before the panel with nothing held
+        log_growth (np.array): cumulative sum of log(1 + r_t), same shape, 0 on the first column
+        held_days (np.array): cumulative number of days with money invested, same shape
+    """
+
+    def __init__(self, days, names, value, flows):
+        self.days = days
+        self.names = names
+        self.value = value
+        self.flows = flows
+
+        previous = value[:, :-1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            r = (value[:, 1:] - previous - flows[:, 1:]) / (previous + np.maximum(flows[:, 1:], 0))
+        invested = previous + np.maximum(flows[:, 1:], 0) > 0
+        r = np.where(invested & np.isfinite(r), r, 0.0)
+        # a total loss would end the history, the log is kept finite
+        growth = np.log(np.maximum(1.0 + r, 1e-12))
+        pad = np.zeros((len(names), 1))
+        self.log_growth = np.hstack([pad, np.cumsum(growth, axis=1)])
+        self.held_days = np.hstack([pad, np.cumsum(invested, axis=1)])
+
+    @classmethod
+    def from_positions(cls, positions, tr):
+        """returns of the tickers of the panel
+
+        Args:
+            positions (PositionPanel): daily positions, as returned by data_preprocessing
+            tr (pd.DataFrame): transactions, as returned by feature_engineering
+        """
+        days, tickers = positions.days, positions.tickers.categories
+        n_tickers, n_days = len(tickers), len(days)
+
+        # amount bought less amount sold, on the first day of the panel from the transaction on
+        sign = tr["Action"].map({"buy": 1.0, "sell": -1.0}).to_numpy(dtype="float")
+        amount = sign * (tr["No. of shares"] * tr["pirce_per_share_eur"]).to_numpy(dtype="float")
+        rows = tickers.get_indexer(tr["Ticker"].astype("object"))
+        cols = days.searchsorted(tr["Time"].dt.floor("d"))
+        keep = (rows >= 0) & (cols < n_days) & np.isfinite(amount)
+        flows = np.zeros((n_tickers, n_days))
+        np.add.at(flows, (rows[keep], cols[keep]), amount[keep])
+        # the dividends are paid out of the position
+        flows -= positions.dividend_eur
+
+        # a position held without a close keeps its last value, plus the money added since
+        value = np.where(positions.cum_shares > 0, positions.value, 0.0)
+        moved = np.cumsum(flows, axis=1)
+        value = pd.DataFrame(value - moved).ffill(axis=1).fillna(0).to_numpy() + moved
+        value = np.vstack([value.sum(axis=0), value])
+        flows = np.vstack([flows.sum(axis=0), flows])
+        pad = np.zeros((n_tickers + 1, 1))
+        names = pd.Index([PORTFOLIO]).append(pd.Index(tickers.astype("object")))
+        return cls(days, names, np.hstack([pad, value]), np.hstack([pad, flows]))
+
+    def _bounds(self, windows):
+        """columns of the value before the first day and of the last day of each window"""
+        starts = pd.DatetimeIndex([pd.Timestamp(start) for start, _ in windows])
+        ends = pd.DatetimeIndex([pd.Timestamp(end) for _, end in windows])
+        first = self.days.searchsorted(starts, side="left")
+        last = self.days.searchsorted(ends, side="right")
+        return first, np.maximum(last, first)
+
+    def _day(self, col):
+        """date of a column, the padding column a day before the panel"""
+        return np.where(
+            col > 0,
+            self.days.to_numpy()[np.maximum(col - 1, 0)],
+            (self.days[0] - pd.Timedelta(days=1)).to_datetime64(),
+        )
+
+    def twr(self, windows):
+        """time-weighted return of each name over each window
+
+        Args:
+            windows (list): (start, end) dates, both included
+
+        Returns:
+            (np.array): shape (n_windows, n_names), NaN when nothing was invested
+        """
+        first, last = self._bounds(windows)
+        twr = np.expm1(self.log_growth[:, last] - self.log_growth[:, first])
+        held = self.held_days[:, last] > self.held_days[:, first]
+        return np.where(held, twr, np.nan).T
+
+    def xirr(self, windows):
+        """money-weighted return, annual, of each name over each window: the value at the close
+        before the window counts as invested, the value at its last close as withdrawn
+
+        Returns:
+            (np.array): shape (n_windows, n_names), NaN without a solution
+        """
+        first, last = self._bounds(windows)
+        n_names, n_windows = len(self.names), len(first)
+        days = self._day(np.arange(len(self.days) + 1))
+        years = (days - days[0]) / np.timedelta64(1, "D") / 365.0
+
+        # the flows sorted by day, those of a window are a slice
+        rows, cols = np.nonzero(self.flows.T)[::-1]
+        lo = np.searchsorted(cols, first, side="right")
+        counts = np.searchsorted(cols, last, side="right") - lo
+        window = np.repeat(np.arange(n_windows), counts)
+        flow = np.repeat(lo - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        rows, cols = rows[flow], cols[flow]
+
+        # the start and end values of each pair, then the flows within the windows
+        pair_window = np.repeat(np.arange(n_windows), n_names)
+        names = np.tile(np.arange(n_names), n_windows)
+        pair = np.concatenate([np.arange(n_windows * n_names)] * 2 + [window * n_names + rows])
+        tau = np.concatenate(
+            [
+                np.zeros(n_windows * n_names),
+                years[last[pair_window]] - years[first[pair_window]],
+                years[cols] - years[first[window]],
+            ]
+        )
+        amount = np.concatenate(
+            [
+                -self.value[names, first[pair_window]],
+                self.value[names, last[pair_window]],
+                -self.flows[rows, cols],
+            ]
+        )
+        rate = _newton(pair, tau, amount, n_windows * n_names)
+
+        # a rate needs money in and money out
+        received = np.bincount(pair, weights=amount > 0, minlength=n_windows * n_names)
+        paid = np.bincount(pair, weights=amount < 0, minlength=n_windows * n_names)
+        rate[(received == 0) | (paid == 0)] = np.nan
+        return rate.reshape(n_windows, n_names)
+
+    def returns(self, windows):
+        """TWR and XIRR of each name over each window
+
+        Args:
+            windows (dict): (start, end) dates, both included, per name of the window
+
+        Returns:
+            (pd.DataFrame): RESULT_COLUMNS, one row per window and name, the windows without
+                a day of the panel left out
+        """
+        bounds = list(windows.values())
+        first, last = self._bounds(bounds)
+        n_names, n_windows = len(self.names), len(bounds)
+        twr, xirr = self.twr(bounds), self.xirr(bounds)
+        span = (self._day(last) - self._day(first)) / np.timedelta64(1, "D")
+
+        net_flows = np.cumsum(self.flows, axis=1)
+        df = pd.DataFrame(
+            {
+                "window": np.repeat(list(windows), n_names),
+                "ticker": np.tile(self.names.to_numpy(), n_windows),
+                "start": np.repeat(self._day(np.minimum(first + 1, len(self.days))), n_names),
+                "end": np.repeat(self._day(last), n_names),
+                "start_value": self.value[:, first].T.ravel(),
+                "end_value": self.value[:, last].T.ravel(),
+                "net_flows": (net_flows[:, last] - net_flows[:, first]).T.ravel(),
+                "twr": twr.ravel(),
+                "twr_annualized": (
+                    (1 + twr) ** (365.0 / np.maximum(span, 1)[:, None]) - 1
+                ).ravel(),
+                "xirr": xirr.ravel(),
+            }
+        )
+        return df.loc[np.repeat(last > first, n_names)].reset_index(drop=True)
+
+
+def standard_windows(days, end=None):
+    """the WINDOWS ending on the last day, or on end, that start after the first day
+
+    Returns:
+        (dict): (start, end) dates per name of the window
+    """
+    end = days[-1] if end is None else pd.Timestamp(end)
+    windows = {}
+    for name, offset in WINDOWS.items():
+        if name == "all":
+            start = days[0]
+        elif name == "YTD":
+            start = pd.Timestamp(year=end.year, month=1, day=1)
+        else:
+            start = end - offset + pd.Timedelta(days=1)
+        if start >= days[0] or name == "all":
+            windows[name] = (start, end)
+    return windows
@@ -0,0 +1,242 @@
+"""Altair charts of the transactions of a ticker over its daily bars
+
+Imported on first use only, the data path does not depend on altair.
+
+The daily bars and the transactions are each the data of one layer chart, with only the
+columns drawn, shared by the charts layered in it instead of embedded in each of them: they are
+converted once and end up as a single named dataset of the spec. Long histories can be
+resampled to weekly or monthly bars before drawing.
+"""
+import altair as alt
+import pandas as pd
+
+# resampling of the daily bars, the first one with at most max_bars bars is used by "auto"
+OHLC_FREQUENCIES = ["D", "W", "M"]
+MAX_BARS = 500
+
+
+def resample_ohlc(ts, freq):
+    """daily bars aggregated to weekly or monthly bars
+
+    Args:
+        ts (pd.DataFrame): daily bars, as returned by read_ticker_ts
+        freq (str): pandas frequency, eg W or M, D keeps the daily bars
+
+    Returns:
+        (pd.DataFrame): first open, highest high, lowest low and last close of each period, the
+            period labelled by its last day with a bar
+    """
+    if freq == "D":
+        return ts
+    agg = {"open": "first", "high": "max", "low": "min", "close": "last", "volume": "sum"}
+    agg = {column: how for column, how in agg.items() if column in ts}
+    bars = (
+        ts.assign(period=ts["date"])
+        .groupby(pd.Grouper(key="period", freq=freq))
+        .agg({"date": "max", **agg})
+    )
+    return bars.dropna(subset=["close"]).reset_index(drop=True)
+
+
+def ohlc_frequency(ts, max_bars=MAX_BARS):
+    """the finest of OHLC_FREQUENCIES drawing at most max_bars bars"""
+    days = pd.DatetimeIndex(ts["date"])
+    for freq in OHLC_FREQUENCIES:
+        if freq == "D":
+            n_bars = len(days)
+        else:
+            n_bars = days.to_period(freq).nunique()
+        if n_bars <= max_bars:
+            return freq
+    return OHLC_FREQUENCIES[-1]
+
+
+def _shared_data(subset, subset_columns, ts, ts_columns, freq):
+    """transactions and bars shared by the layers, with the columns drawn only"""
+    if freq == "auto":
+        freq = ohlc_frequency(ts)
+    if freq is not None:
+        ts = resample_ohlc(ts, freq)
+
+    def _trim(df, columns):
+        return df[[column for column in columns if column in df]]
+
+    return _trim(subset, subset_columns), _trim(ts, ts_columns)
+
+
+def plot_transactions(subset, ts, freq=None):
+    """candlesticks of the daily bars, annotated with the transactions
+
+    Args:
+        subset (pd.DataFrame): transactions of the ticker, columns Time, Price / share,
+            action, No. of shares and textof
+        ts (pd.DataFrame): daily bars, as returned by read_ticker_ts
+        freq (str, optional): W or M to draw weekly or monthly bars, auto to pick the finest
+            one with at most MAX_BARS bars, the daily bars by default
+    """
+    transactions, prices = _shared_data(
+        subset,
+        ["Time", "Price / share", "action", "No. of shares", "textof"],
+        ts,
+        ["date", "open", "high", "low", "close"],
+        freq,
+    )
+    open_close_color = alt.condition(
+        "datum.open <= datum.close", alt.value("#06982d"), alt.value("#ae1325")
+    )
+
+    base = (
+        alt.Chart().encode(
+            alt.X(
+                "date:T", axis=alt.Axis(format="%y/%m/%d", labelAngle=-45, title="Date")
+            ),
+            color=open_close_color,
+        ).properties(width=400, height=300)
+    )
+
+    rule = base.mark_rule().encode(
+        alt.Y("low:Q", title="Price", scale=alt.Scale(zero=False),), alt.Y2("high:Q")
+    )
+
+    bar = base.mark_bar(size=2).encode(alt.Y("open:Q"), alt.Y2("close:Q")).interactive()
+
+    # add annotation for action undertook
+    annotation = (
+        alt.Chart()
+        .mark_text(align="left", baseline="middle", fontSize=10, dx=7)
+        .encode(
+            x=alt.X(
+                "Time:T",
+                axis=alt.Axis(
+                    format="%y/%m/%d",
+                    labelAngle=0,
+                    #               title='Date'
+                ),
+            ),
+            y="Price / share:Q",
+            text="label:N",
+            color="action:N",
+        )
+        .transform_calculate(label='datum.action + " " + datum["No. of shares"]')
+    )
+
+    # add the markers
+    text = (
+        alt.Chart()
+        .mark_text(dx=0, dy=0, angle=90, fontSize=14)
+        .encode(
+            x=alt.X(
+                "Time:T",
+                axis=alt.Axis(
+                    format="%y/%m/%d",
+                    labelAngle=-45,
+                    #               title='Date'
+                ),
+            ),
+            y="Price / share:Q",
+            text="textof:N",
+            color="action:N",
+        )
+    )
+
+    return alt.layer(rule, bar, alt.layer(annotation, text, data=transactions), data=prices)
+
+
+def plot_transactions_2(subset, ts, freq=None):
+    """close price, with the value under the cursor, and the transactions
+
+    Args:
+        subset (pd.DataFrame): transactions of the ticker, columns Time, Price / share,
+            action and No. of shares
+        ts (pd.DataFrame): daily bars, as returned by read_ticker_ts
+        freq (str, optional): see plot_transactions
+    """
+    transactions, prices = _shared_data(
+        subset, ["Time", "Price / share", "action", "No. of shares"], ts, ["date", "close"], freq
+    )
+
+    # Add selection bar
+    nearest = alt.selection(
+        type="single", nearest=True, on="mouseover", fields=["date"], empty="none"
+    )
+
+    # The basic line
+    line = (
+        alt.Chart()
+        .mark_line(interpolate="basis")
+        .encode(
+            x=alt.X(
+                "date:T",
+                axis=alt.Axis(
+                    format="%y/%m/%d",
+                    labelAngle=0,
+                    #               title='Date'
+                ),
+            ),
+            y="close:Q",
+        ).properties(width=400, height=300)
+    )
+
+    # Transparent selectors across the chart. This is what tells us
+    # the x-value of the cursor
+    selectors = (
+        alt.Chart()
+        .mark_point()
+        .encode(x="date:T", opacity=alt.value(0),)
+        .add_selection(nearest)
+    )
+
+    # Draw points on the line, and highlight based on selection
+    points = line.mark_point().encode(
+        opacity=alt.condition(nearest, alt.value(1), alt.value(0))
+    )
+
+    # Draw text labels near the points, and highlight based on selection
+    text_close = line.mark_text(align="left", dx=5, dy=-5).encode(
+        text=alt.condition(nearest, "close:Q", alt.value(""), format=",.2f")
+    )
+
+    # Draw a rule at the location of the selection
+    rules = (
+        alt.Chart()
+        .mark_rule(color="gray")
+        .encode(x="date:T",)
+        .transform_filter(nearest)
+    )
+
+    # add marker for the actions undertook
+    markers = (
+        alt.Chart()
+        .mark_circle(color="action", filled=True)
+        .encode(x="Time:T", y="Price / share:Q")
+    )
+
+    # add annotation for action undertook
+    annotation = (
+        alt.Chart()
+        .mark_text(align="left", baseline="middle", fontSize=10, dx=7)
+        .encode(
+            x=alt.X(
+                "Time:T",
+                axis=alt.Axis(
+                    format="%y/%m/%d",
+                    labelAngle=-45,
+                    #               title='Date'
+                ),
+            ),
+            y="Price / share:Q",
+            text="label:N",
+            color="action:N",
+        )
+        .transform_calculate(label='datum["No. of shares"]')
+    )
+
+    return alt.layer(
+        line,
+        selectors,
+        points,
+        text_close,
+        rules,
+        alt.layer(annotation, markers, data=transactions),
+        data=prices,
+    )
@@ -0,0 +1,330 @@
+"""Compact store of the daily position of each ticker
+
+The positions are kept as dense float arrays of shape (n_tickers, n_days), the ticker names
+once in a categorical dictionary, the exchange rates once per currency, and the transactions as
+sparse events. to_frame expands the
+panel to the long format of combine_histories, one row per ticker and day.
+"""
+import numpy as np
+import pandas as pd
+
+from scr.corporate_actions import dividend_cash
+from scr.fx import ticker_currencies
+
+# dense values, one per ticker and day
+VALUES = ["close_price", "cum_shares", "cum_total_eur", "value", "dividend_eur"]
+
+
+def _ffill(values):
+    """forward fill the missing values along the last axis"""
+    idx = np.where(np.isnan(values), 0, np.arange(values.shape[-1]))
+    idx = np.maximum.accumulate(idx, axis=-1)
+    return np.take_along_axis(values, idx, axis=-1)
+
+
+class PositionPanel:
+    """daily position of each ticker, for the days with a price and an exchange rate
+
+    Attributes:
+        days (pd.DatetimeIndex): days of the panel
+        tickers (pd.CategoricalIndex): tickers of the panel, the codes are the rows of the arrays
+        currency (pd.Categorical): currency of each ticker, the codes are the rows of rate
+        rate (np.array): exchange rate to the euro per currency and day, shape
+            (n_currencies, n_days)
+        close_price, cum_shares, cum_total_eur, value (np.array): shape (n_tickers, n_days),
+            the shares and the prices in the basis of the daily bars, see adjust_splits
+        dividend_eur (np.array): cash paid by the dividends of each ticker and day, shape
+            (n_tickers, n_days)
+        events (pd.DataFrame): last transaction of each ticker and day with transactions: ticker
+            and day (positions in the panel), count (transactions that day), Action,
+            No. of shares and profit_eur
+        row_offset (np.array): rows of each ticker before the first day, in the long format
+    """
+
+    def __init__(self, days, tickers, currency, rate, values, events, row_offset=None):
+        self.days = days
+        self.tickers = tickers
+        self.currency = currency
+        self.rate = rate
+        for name in VALUES:
+            setattr(self, name, values[name])
+        self.events = events
+        if row_offset is None:
+            row_offset = np.zeros(len(tickers), dtype="int64")
+        self.row_offset = row_offset
+
+    @classmethod
+    def from_transactions(cls, tr, data, rates, tickers):
+        """merge the transactions with the price history and the exchange rate of their
+        currency, for all the tickers at once. The running values of the transactions are
+        forward filled, the last transaction of the day is kept as event.
+
+        note: invested amount is determined based on the market price at close, rather than the
+        transaction record
+
+        Args:
+            tr (pd.DataFrame): transactions, as returned by feature_engineering
+            data (pd.DataFrame): daily bars, columns (field, ticker)
+            rates (RateTable): exchange rates of the currencies of the tickers
+            tickers (list): tickers to merge, all of them available in data
+        """
+        days = rates.align(data.index)
+        tickers = pd.CategoricalIndex(tickers, categories=tickers)
+        n_days, n_tickers = len(days), len(tickers)
+
+        close = data["Close"].reindex(index=days, columns=tickers.categories)
+        close = close.to_numpy(dtype="float").T.copy()
+        currency = pd.Categorical(ticker_currencies(tr, tickers.categories).to_numpy())
+        rate = rates.convert(days, currency.categories)
+
+        # transactions on a day with a price, position in the (ticker, day) panel
+        tr_sub = tr[
+            ["Time", "Ticker", "Action", "No. of shares", "cum_shares", "cum_total_eur", "profit_eur"]
+        ]
+        ticker_pos = tickers.categories.get_indexer(tr_sub["Ticker"])
+        day_pos = days.get_indexer(tr_sub["Time"].dt.floor("d"))
+        mask = (ticker_pos >= 0) & (day_pos >= 0)
+        tr_sub = tr_sub.loc[mask]
+        pos = pd.Index(ticker_pos[mask] * n_days + day_pos[mask])
+
+        # the running values are forward filled, the others are kept only for the transaction day
+        running = tr_sub.groupby(pos)[["cum_shares", "cum_total_eur"]].last()
+
+        def _dense(column):
+            panel = np.full(n_tickers * n_days, np.nan)
+            panel[running.index] = running[column].to_numpy()
+            return _ffill(panel.reshape(n_tickers, n_days))
+
+        cum_shares = _dense("cum_shares")
+        cum_total = _dense("cum_total_eur")
+        value = _ffill(close * cum_shares * rate[currency.codes])
+        held = np.hstack([np.zeros((n_tickers, 1)), cum_shares[:, :-1]])
+        dividend = dividend_cash(data, tickers.categories, days, held) * rate[currency.codes]
+
+        last_of_day = ~pos.duplicated(keep="last")
+        last = tr_sub.loc[last_of_day]
+        last_pos = pos[last_of_day].to_numpy()
+        events = pd.DataFrame(
+            {
+                "ticker": (last_pos // n_days).astype("int32"),
+                "day": (last_pos % n_days).astype("int32"),
+                "count": np.bincount(pos, minlength=n_tickers * n_days)[last_pos].astype("int32"),
+                "Action": pd.Categorical(last["Action"].to_numpy(dtype="object")),
+                "No. of shares": last["No. of shares"].to_numpy(dtype="float"),
+                "profit_eur": last["profit_eur"].to_numpy(dtype="float"),
+            }
+        )
+        events = events.sort_values(by=["ticker", "day"], kind="mergesort").reset_index(drop=True)
+
+        values = {
+            "close_price": close,
+            "cum_shares": cum_shares,
+            "cum_total_eur": cum_total,
+            "value": value,
+            "dividend_eur": np.nan_to_num(dividend),
+        }
+        return cls(days, tickers, currency, rate, values, events)
+
+    def __len__(self):
+        """number of rows in the long format"""
+        return len(self.tickers) * len(self.days)
+
+    @property
+    def nbytes(self):
+        """memory used by the panel, in bytes"""
+        arrays = [self.rate, self.row_offset, self.tickers.codes, self.currency.codes]
+        arrays += [getattr(self, name) for name in VALUES]
+        return (
+            sum(array.nbytes for array in arrays)
+            + self.days.nbytes
+            + self.tickers.categories.memory_usage(deep=True)
+            + int(self.events.memory_usage(deep=True).sum())
+        )
+
+    def slice(self, start=None, end=None, tickers=None):
+        """the days from start (included) to end (excluded) of some tickers
+
+        Args:
+            start, end (pd.Timestamp, optional): range of days, all the days by default
+            tickers (list, optional): tickers to keep, all the tickers by default
+
+        Returns:
+            (PositionPanel): the day range shares the arrays of this panel
+        """
+        i0 = 0 if start is None else self.days.searchsorted(pd.Timestamp(start))
+        i1 = len(self.days) if end is None else self.days.searchsorted(pd.Timestamp(end))
+        rows = np.arange(len(self.tickers))
+        if tickers is not None:
+            rows = self.tickers.categories.get_indexer(tickers)
+            rows = np.sort(rows[rows >= 0])
+
+        events = self.events
+        # rows of the long format before i0: one per day, plus the extra transactions of the day
+        before = events.loc[events["day"] < i0]
+        extra = np.bincount(
+            before["ticker"], weights=before["count"] - 1, minlength=len(self.tickers)
+        )
+        row_offset = self.row_offset + i0 + extra.astype("int64")
+
+        mask = (events["day"] >= i0) & (events["day"] < i1) & events["ticker"].isin(rows)
+        events = events.loc[mask]
+        new_code = np.full(len(self.tickers), -1, dtype="int32")
+        new_code[rows] = np.arange(len(rows), dtype="int32")
+        events = events.assign(ticker=new_code[events["ticker"]], day=events["day"] - i0)
+        names = self.tickers.categories[rows]
+
+        def _take(array):
+            array = array[:, i0:i1]
+            return array if tickers is None else array[rows]
+
+        return PositionPanel(
+            self.days[i0:i1],
+            pd.CategoricalIndex(names, categories=names),
+            self.currency[rows],
+            self.rate[:, i0:i1],
+            {name: _take(getattr(self, name)) for name in VALUES},
+            events.reset_index(drop=True),
+            row_offset[rows],
+        )
+
+    def extend(self, data, rates):
+        """extend the panel to the days of new daily bars, for tickers without new transactions:
+        the running values of the last day are carried over
+        """
+        days = rates.align(data.index)
+        new_days = days[days > self.days[-1]]
+        close = data["Close"].reindex(index=new_days, columns=self.tickers.categories)
+        close = close.to_numpy(dtype="float").T
+        rate = rates.convert(new_days, self.currency.categories)
+
+        n_new = len(new_days)
+        cum_shares = np.repeat(self.cum_shares[:, -1:], n_new, axis=1)
+        cum_total = np.repeat(self.cum_total_eur[:, -1:], n_new, axis=1)
+        # the value is forward filled from the last day
+        value = close * cum_shares * rate[self.currency.codes]
+        value = _ffill(np.hstack([self.value[:, -1:], value]))[:, 1:]
+        dividend = dividend_cash(data, self.tickers.categories, new_days, cum_shares)
+        dividend = np.nan_to_num(dividend * rate[self.currency.codes])
+
+        values = {
+            "close_price": np.hstack([self.close_price, close]),
+            "cum_shares": np.hstack([self.cum_shares, cum_shares]),
+            "cum_total_eur": np.hstack([self.cum_total_eur, cum_total]),
+            "value": np.hstack([self.value, value]),
+            "dividend_eur": np.hstack([self.dividend_eur, dividend]),
+        }
+        return PositionPanel(
+            self.days.append(new_days),
+            self.tickers,
+            self.currency,
+            np.hstack([self.rate, rate]),
+            values,
+            self.events,
+            self.row_offset,
+        )
+
+    @classmethod
+    def concat(cls, panels):
+        """combine panels of the same days and different tickers, sorted by ticker"""
+        days = panels[0].days
+        if any(not panel.days.equals(days) for panel in panels[1:]):
+            raise ValueError("the panels do not have the same days")
+        names = np.concatenate(
+            [panel.tickers.categories.to_numpy(dtype="object") for panel in panels]
+        )
+        order = np.argsort(names, kind="mergesort")
+        # new code of each ticker, in the order of the panels
+        new_code = np.empty(len(names), dtype="int32")
+        new_code[order] = np.arange(len(names), dtype="int32")
+
+        events, start = [], 0
+        for panel in panels:
+            codes = new_code[start : start + len(panel.tickers)]
+            events.append(panel.events.assign(ticker=codes[panel.events["ticker"]]))
+            start += len(panel.tickers)
+        events = pd.concat(events).sort_values(by=["ticker", "day"], kind="mergesort")
+        events["Action"] = events["Action"].astype("object").astype("category")
+
+        values = {
+            name: np.vstack([getattr(panel, name) for panel in panels])[order] for name in VALUES
+        }
+        tickers = pd.CategoricalIndex(names[order], categories=names[order])
+
+        # the rates of the same days, once per currency of any of the panels
+        rate = {}
+        for panel in panels:
+            for row, name in enumerate(panel.currency.categories):
+                rate.setdefault(name, panel.rate[row])
+        currency = np.concatenate(
+            [panel.currency.to_numpy(dtype="object") for panel in panels]
+        )[order]
+        currency = pd.Categorical(currency, categories=sorted(rate))
+        return cls(
+            days,
+            tickers,
+            currency,
+            np.vstack([rate[name] for name in currency.categories]),
+            values,
+            events.reset_index(drop=True),
+            np.concatenate([panel.row_offset for panel in panels])[order],
+        )
+
+    def totals(self):
+        """open position, invested amount, profit and dividends summed over the tickers, per day
+
+        Returns:
+            (pd.DataFrame): columns time, invested amount, open position, profit_eur and
+                dividend_eur
+        """
+        profit = np.bincount(
+            self.events["day"],
+            weights=self.events["profit_eur"].fillna(0.0),
+            minlength=len(self.days),
+        )
+        return pd.DataFrame(
+            {
+                "time": self.days,
+                "invested amount": np.nansum(self.cum_total_eur, axis=0),
+                "open position": np.nansum(self.value, axis=0),
+                "profit_eur": profit,
+                "dividend_eur": self.dividend_eur.sum(axis=0),
+            }
+        )
+
+    def to_frame(self):
+        """the long format of combine_histories, one row per ticker and day, indexed by the row
+        number within the history of the ticker, counting the transactions of the same day
+        """
+        n_tickers, n_days = len(self.tickers), len(self.days)
+        pos = self.events["ticker"].to_numpy() * n_days + self.events["day"].to_numpy()
+
+        def _sparse(values, fill, dtype):
+            panel = np.full(n_tickers * n_days, fill, dtype=dtype)
+            panel[pos] = values
+            return panel
+
+        rows_per_day = _sparse(self.events["count"].to_numpy(), 1, "int64")
+        rows_per_day = rows_per_day.reshape(n_tickers, n_days)
+        index = (rows_per_day.cumsum(axis=1) - 1 + self.row_offset[:, None]).ravel()
+
+        names = self.tickers.categories.to_numpy(dtype="object")
+        time_ts = np.tile(self.days.to_numpy(), n_tickers)
+        return pd.DataFrame(
+            {
+                "time_ts": time_ts,
+                "close_price": self.close_price.ravel(),
+                "Time": _sparse(time_ts[pos], np.datetime64("NaT"), "datetime64[ns]"),
+                "Ticker": _sparse(names[self.events["ticker"].to_numpy()], np.nan, "object"),
+                "Action": _sparse(self.events["Action"].to_numpy(dtype="object"), np.nan, "object"),
+                "No. of shares": _sparse(self.events["No. of shares"].to_numpy(), np.nan, "float"),
+                "cum_shares": self.cum_shares.ravel(),
+                "cum_total_eur": self.cum_total_eur.ravel(),
+                "profit_eur": _sparse(self.events["profit_eur"].to_numpy(), np.nan, "float"),
+                "date": time_ts,
+                "rate": self.rate[self.currency.codes].ravel(),
+                "value": self.value.ravel(),
+                "dividend_eur": self.dividend_eur.ravel(),
+                "ticker": np.repeat(names, n_days),
+            },
+            index=index,
+        )
@@ -0,0 +1,102 @@
+"""Per-stage timers, row counts and memory of the pipeline, enabled with PORTFOLIO_PROFILE=1
+
+    with stage("feature_engineering") as s:
+        tr = feature_engineering(tr)
+        s.rows = len(tr)
+
+When profiling is off, stage returns a shared object that does nothing.
+"""
+import json
+import os
+import time
+import tracemalloc
+
+ENABLED = os.environ.get("PORTFOLIO_PROFILE", "0") not in ("", "0")
+
+_records = []
+_stack = []
+
+
+class _Stage:
+    def __init__(self, name):
+        self.name = name
+        self.rows = None
+
+    def __enter__(self):
+        self._path = f"{_stack[-1]._path}/{self.name}" if _stack else self.name
+        self._record = {"stage": self._path}
+        _records.append(self._record)
+        _stack.append(self)
+
+        # peak of the children, since they reset the peak of tracemalloc
+        self._child_peak = 0
+        self._memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self._t0
+        current, peak = tracemalloc.get_traced_memory()
+        peak = max(peak, self._child_peak)
+        _stack.pop()
+        if _stack:
+            _stack[-1]._child_peak = max(_stack[-1]._child_peak, peak)
+
+        self._record.update(
+            {
+                "seconds": seconds,
+                "rows": self.rows,
+                "memory_delta_mb": (current - self._memory) / 1e6,
+                "peak_delta_mb": (peak - self._memory) / 1e6,
+                "failed": exc_type is not None,
+            }
+        )
+        return False
+
+
+class _NullStage:
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(name):
+    """context manager measuring a stage of the pipeline, nested stages are named parent/child
+
+    Args:
+        name (str): name of the stage
+
+    Returns:
+        context manager, set its rows attribute to report the number of rows produced
+    """
+    return _Stage(name) if ENABLED else _NULL_STAGE
+
+
+def report():
+    """measured stages, in the order they started
+
+    Returns:
+        (list): one dict per stage: stage, seconds, rows, memory_delta_mb, peak_delta_mb, failed
+    """
+    return [dict(record) for record in _records]
+
+
+def report_json(indent=1):
+    return json.dumps(report(), indent=indent)
+
+
+def reset():
+    """forget the stages measured so far"""
+    _records.clear()
+
+
+if ENABLED:
+    tracemalloc.start()
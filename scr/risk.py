@@ -0,0 +1,199 @@
+"""Risk analytics of the daily returns, updated incrementally as new bars arrive
+
+The correlations are derived from pairwise moments (weights, sums, sums of squares and of
+products over the days both tickers have a return). The moments are additive, so new bars
+only add their own contribution, an O(N²) update per bar instead of recomputing the whole
+O(T·N²) matrix. The expanding moments give the same correlation as
+pd.DataFrame.corr, the exponentially weighted ones decay the past days by a half-life.
+"""
+import copy
+
+import numpy as np
+import pandas as pd
+
+TRADING_DAYS = 252
+
+
+class _Moments:
+    """pairwise moments of the returns, past days weighted by decay (1 keeps all the days)"""
+
+    def __init__(self, n, decay=1.0):
+        self.decay = decay
+        self.weight = np.zeros((n, n))
+        self.sum = np.zeros((n, n))  # sum of x_i over the days x_j is valid
+        self.sum_sq = np.zeros((n, n))
+        self.sum_prod = np.zeros((n, n))
+
+    def update(self, returns):
+        """moments with a block of returns added, shape (days, tickers), in chronological order
+
+        Returns:
+            (_Moments): new moments, these are left as they are
+        """
+        valid = np.isfinite(returns).astype("float")
+        x = np.where(valid > 0, returns, 0.0)
+        # weight of each new day, the last one counts fully
+        w = self.decay ** np.arange(len(returns) - 1, -1, -1, dtype="float")[:, None]
+        scale = self.decay ** len(returns)
+
+        moments = copy.copy(self)
+        moments.weight = scale * self.weight + (valid * w).T @ valid
+        moments.sum = scale * self.sum + (x * w).T @ valid
+        moments.sum_sq = scale * self.sum_sq + (x * x * w).T @ valid
+        moments.sum_prod = scale * self.sum_prod + (x * w).T @ x
+        return moments
+
+    def subset(self, rows):
+        return [m[np.ix_(rows, rows)] for m in (self.weight, self.sum, self.sum_sq, self.sum_prod)]
+
+    def correlation(self, rows):
+        weight, total, sum_sq, sum_prod = self.subset(rows)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean_x, mean_y = total / weight, total.T / weight
+            cov = sum_prod / weight - mean_x * mean_y
+            var_x = sum_sq / weight - mean_x ** 2
+            var_y = sum_sq.T / weight - mean_y ** 2
+            corr = np.where(var_x * var_y > 0, cov / np.sqrt(var_x * var_y), np.nan)
+        corr = np.clip((corr + corr.T) / 2, -1.0, 1.0)
+        # as pd.DataFrame.corr: exactly one on the diagonal, NaN without variance
+        diagonal = np.diagonal(var_x) > 0
+        np.fill_diagonal(corr, np.where(diagonal, 1.0, np.nan))
+        return corr
+
+    def mean_std(self, rows):
+        weight, total, sum_sq, _ = (np.diagonal(m) for m in self.subset(rows))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = total / weight
+            var = (sum_sq - weight * mean ** 2) / (weight - 1)
+        return mean, np.sqrt(np.maximum(var, 0.0))
+
+
+class RiskEngine:
+    """correlation, volatility, Sharpe ratio and drawdown of the tickers of a price panel
+
+    update only processes the bars added since the previous update, as long as the bars
+    already processed did not change; otherwise the whole history is processed again. An engine
+    is not changed once updated, update returns a new one, so that the dashboards sharing an
+    engine keep their results.
+    """
+
+    def __init__(self, window=63, halflife=21):
+        """
+        Args:
+            window (int): days of the rolling volatility and Sharpe ratio
+            halflife (int): days after which a return weighs half, for the exponentially
+                weighted correlation and volatility
+        """
+        self.window = window
+        self.halflife = halflife
+        self.tickers = pd.Index([])
+        self.index = pd.DatetimeIndex([])
+
+    def _reset(self, tickers):
+        n = len(tickers)
+        self.tickers = pd.Index(tickers)
+        self.index = pd.DatetimeIndex([])
+        self._expanding = _Moments(n)
+        self._ewm = _Moments(n, decay=0.5 ** (1 / self.halflife))
+        self._last_price = np.full(n, np.nan)
+        self._recent = np.empty((0, n))  # returns of the last `window` days
+        self._peak = np.full(n, np.nan)
+        self._drawdown = np.full(n, np.nan)
+        self._max_drawdown = np.full(n, np.nan)
+
+    def _is_continued_by(self, prices):
+        n_done = len(self.index)
+        if not self.tickers.equals(prices.columns) or n_done == 0 or len(prices) < n_done:
+            return False
+        if not self.index.equals(prices.index[:n_done]):
+            return False
+        last = prices.iloc[:n_done].ffill().iloc[-1].to_numpy(dtype="float")
+        return np.array_equal(last, self._last_price, equal_nan=True)
+
+    def update(self, prices):
+        """process the bars not processed yet
+
+        Args:
+            prices (pd.DataFrame): adjusted close per day, one column per ticker
+
+        Returns:
+            (RiskEngine): the engine with the bars processed, self when there is none
+        """
+        continued = self._is_continued_by(prices)
+        new = prices.iloc[len(self.index) if continued else 0 :]
+        if continued and new.empty:
+            return self
+        engine = copy.copy(self)
+        if not continued:
+            engine._reset(prices.columns)
+        return engine._process(new)
+
+    def _process(self, new):
+        """add the bars to the state of a copy of an engine, the arrays are replaced, not changed
+        in place"""
+        # missing prices are carried forward, as pct_change does
+        values = np.vstack([self._last_price, new.to_numpy(dtype="float")])
+        values = pd.DataFrame(values).ffill().to_numpy()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            returns = values[1:] / values[:-1] - 1
+        self._last_price = values[-1]
+
+        self._expanding = self._expanding.update(returns)
+        self._ewm = self._ewm.update(returns)
+        self._recent = np.vstack([self._recent, returns])[-self.window :]
+
+        # drawdown from the running maximum of the price
+        peak = np.fmax.accumulate(np.vstack([self._peak, values[1:]]), axis=0)[1:]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            drawdown = values[1:] / peak - 1
+        self._peak = peak[-1]
+        self._drawdown = drawdown[-1]
+        self._max_drawdown = np.fmin(self._max_drawdown, np.nanmin(drawdown, axis=0, initial=0.0))
+
+        self.index = self.index.append(new.index)
+        return self
+
+    def _rows(self, tickers):
+        if tickers is None:
+            return np.arange(len(self.tickers)), self.tickers
+        tickers = pd.Index(tickers)
+        return self.tickers.get_indexer(tickers), tickers
+
+    def correlation(self, tickers=None, ewm=False):
+        """correlation of the daily returns over the whole history, or exponentially weighted"""
+        rows, tickers = self._rows(tickers)
+        moments = self._ewm if ewm else self._expanding
+        return pd.DataFrame(moments.correlation(rows), index=tickers, columns=tickers)
+
+    def mean_std(self, tickers=None):
+        """mean and standard deviation of the daily returns over the whole history"""
+        rows, tickers = self._rows(tickers)
+        mean, std = self._expanding.mean_std(rows)
+        return pd.Series(mean, index=tickers), pd.Series(std, index=tickers)
+
+    def metrics(self, tickers=None):
+        """annualised volatility and Sharpe ratio over the window, exponentially weighted
+        volatility, current and maximum drawdown
+
+        Returns:
+            (pd.DataFrame): one row per ticker
+        """
+        rows, tickers = self._rows(tickers)
+        recent = self._recent[:, rows]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = np.nanmean(recent, axis=0) if len(recent) else np.full(len(rows), np.nan)
+            std = np.full(len(rows), np.nan)
+            if len(recent) > 1:
+                std = np.nanstd(recent, axis=0, ddof=1)
+            weight, total, sum_sq, _ = (np.diagonal(m) for m in self._ewm.subset(rows))
+            ew_var = sum_sq / weight - (total / weight) ** 2
+        return pd.DataFrame(
+            {
+                "volatility": std * np.sqrt(TRADING_DAYS),
+                "sharpe": mean / std * np.sqrt(TRADING_DAYS),
+                "ew_volatility": np.sqrt(np.maximum(ew_var, 0.0) * TRADING_DAYS),
+                "drawdown": self._drawdown[rows],
+                "max_drawdown": self._max_drawdown[rows],
+            },
+            index=tickers,
+        )
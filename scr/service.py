@@ -0,0 +1,250 @@
+"""Local HTTP service around scr.analytics, so that several front-ends and scripts share one warm
+process
+
+    python -m scr.service [--host 127.0.0.1] [--port 8765] [--prices DIR] [--artifacts]
+
+    POST /analyze?sections=pnl,monthly&as_of=2021-03-01   the csv export as the body
+    GET  /analyze/<hash>?sections=pnl                      an export posted before
+    GET  /stats                                            requests served, computed, coalesced
+    GET  /health
+
+The responses are json, the results of Analytics.summary along with the content hash of the
+export. The computations run one at a time on a worker thread, while the event loop keeps
+reading requests: a request identical to one being computed, same content, sections and date,
+waits for its result instead of computing it again, and the last responses are kept to answer
+the repeated ones.
+"""
+import argparse
+import asyncio
+import io
+import json
+import logging
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+
+from scr.analytics import DEFAULT_SUMMARIES, SUMMARIES, Analytics
+from scr.artifacts import ArtifactStore
+from scr.market_data import LocalProvider
+from scr.memo import LRUCache, content_hash
+from scr.validation import ValidationError
+
+# largest export accepted, in bytes
+MAX_UPLOAD = 64 * 1024 ** 2
+
+logger = logging.getLogger(__name__)
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    422: "Unprocessable Entity",
+    500: "Internal Server Error",
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _options(query):
+    """sections and date of the holdings asked for in the query string"""
+    params = parse_qs(query)
+    names = DEFAULT_SUMMARIES
+    if "sections" in params:
+        names = [name for value in params["sections"] for name in value.split(",") if name]
+    unknown = [name for name in names if name not in SUMMARIES]
+    if unknown:
+        raise HTTPError(400, f"unknown sections {unknown}, expected some of {list(SUMMARIES)}")
+    as_of = params.get("as_of", [None])[0]
+    if as_of is not None:
+        try:
+            pd.Timestamp(as_of)
+        except ValueError:
+            raise HTTPError(400, f"as_of {as_of} is not a date")
+    return tuple(names), as_of
+
+
+class AnalyticsService:
+    """request handling of the service, see the module documentation"""
+
+    def __init__(self, analytics=None, max_responses=32):
+        """
+        Args:
+            analytics (Analytics, optional): the engine shared by the requests
+            max_responses (int): number of responses kept for the repeated requests
+        """
+        self.analytics = analytics or Analytics()
+        # the engine and the profiling are not thread-safe, one computation at a time
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="analytics")
+        self._inflight = {}
+        self._responses = LRUCache(max_responses)
+        self.stats = {"requests": 0, "computed": 0, "coalesced": 0, "cached": 0, "failed": 0}
+
+    def _summary(self, fln_hash, dash, names, as_of):
+        sections = self.analytics.summary(dash, list(names), as_of)
+        return json.dumps({"hash": fln_hash, "sections": sections}).encode()
+
+    def _analyze(self, body, fln_hash, names, as_of):
+        _, dash = self.analytics.prepare(io.BytesIO(body), fln_hash)
+        return self._summary(fln_hash, dash, names, as_of)
+
+    def _lookup(self, fln_hash, names, as_of):
+        dash = self.analytics.dashboard(fln_hash)
+        if dash is None:
+            raise HTTPError(404, f"unknown export {fln_hash}, post it to /analyze first")
+        return self._summary(fln_hash, dash, names, as_of)
+
+    async def _coalesced(self, key, func, *args):
+        """response of func, computed once for the identical requests"""
+        response = self._responses.get(key)
+        if response is not None:
+            self.stats["cached"] += 1
+            return response
+        future = self._inflight.get(key)
+        if future is None:
+            self.stats["computed"] += 1
+            future = asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+            self._inflight[key] = future
+
+            def _done(future):
+                del self._inflight[key]
+                if not future.cancelled() and future.exception() is None:
+                    self._responses.put(key, future.result())
+
+            future.add_done_callback(_done)
+        else:
+            self.stats["coalesced"] += 1
+        # a client leaving does not cancel the computation shared with the others
+        return await asyncio.shield(future)
+
+    async def handle(self, method, target, body):
+        """status and json body of the response to a request"""
+        url = urlsplit(target)
+        path = url.path.rstrip("/")
+        if path == "/health":
+            return 200, b'{"status": "ok"}'
+        if path == "/stats":
+            return 200, json.dumps(self.stats).encode()
+        if path == "/analyze":
+            if method != "POST":
+                raise HTTPError(405, "post the csv export to /analyze")
+            names, as_of = _options(url.query)
+            fln_hash = content_hash(io.BytesIO(body))
+            return 200, await self._coalesced(
+                (fln_hash, names, as_of), self._analyze, body, fln_hash, names, as_of
+            )
+        if path.startswith("/analyze/"):
+            if method != "GET":
+                raise HTTPError(405, f"get {path}")
+            names, as_of = _options(url.query)
+            fln_hash = path[len("/analyze/"):]
+            return 200, await self._coalesced(
+                (fln_hash, names, as_of), self._lookup, fln_hash, names, as_of
+            )
+        raise HTTPError(404, f"no route {path}")
+
+    async def _respond(self, method, target, body):
+        self.stats["requests"] += 1
+        try:
+            return await self.handle(method, target, body)
+        except HTTPError as err:
+            status, body = err.status, {"error": str(err)}
+        except ValidationError as err:
+            status, body = 422, {"error": "invalid export", "validation": err.report.to_dict()}
+        except Exception:
+            # a bug rather than a bad request, the details stay in the log of the server
+            logger.exception("%s %s failed", method, target)
+            status, body = 500, {"error": "internal error"}
+        self.stats["failed"] += 1
+        return status, json.dumps(body).encode()
+
+    async def serve_connection(self, reader, writer):
+        """answer the requests of a connection, kept alive until the client closes it"""
+        try:
+            while True:
+                line = await reader.readline()
+                if not line.strip():
+                    break
+                method, target, _ = line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                if length > MAX_UPLOAD:
+                    status, body = 413, json.dumps({"error": "export too large"}).encode()
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length)
+                    status, body = await self._respond(method, target, body)
+                    keep_alive = headers.get("connection", "").lower() != "close"
+
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                    "Content-Type: application/json\r\n"
+                    f"Content-Length: {len(body)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode()
+                    + body
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host="127.0.0.1", port=8765):
+        """start listening, the server is served by the running event loop
+
+        Returns:
+            (asyncio.Server): port 0 picks a free port, see its sockets
+        """
+        return await asyncio.start_server(self.serve_connection, host, port)
+
+
+async def _serve(service, host, port):
+    server = await service.start(host, port)
+    print(f"serving on http://{host}:{server.sockets[0].getsockname()[1]}")
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="analytics of Trading 212 exports over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--prices", default=None, help="directory of daily bars per ticker, to work offline"
+    )
+    parser.add_argument(
+        "--artifacts", action="store_true", help="share the processed exports with other workers"
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    store = None
+    if args.artifacts:
+        store = ArtifactStore()
+    provider = LocalProvider.from_directory(args.prices) if args.prices else None
+    service = AnalyticsService(Analytics(store, provider))
+    try:
+        asyncio.run(_serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+"""Realized profit of the sells, by matching them with the lots bought before
+
+FIFO sells the oldest open lot first, LIFO the most recent one. The open lots of each ticker are
+kept in a deque, used as a queue (FIFO) or a stack (LIFO). Each lot is closed at most once and a
+partly sold lot stays in place, so the matching is O(n) over the transactions. The average
+method is the running average price of cost_basis, it has no lots.
+"""
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+METHODS = ["average", "fifo", "lifo"]
+
+# shares left in a lot below which it is considered closed, rounding of fractional shares
+EPS = 1e-9
+
+SELL_COLUMNS = [
+    "Ticker",
+    "Time",
+    "No. of shares",
+    "proceeds_eur",
+    "cost_eur",
+    "profit_eur",
+    "unmatched_shares",
+]
+
+LOT_COLUMNS = [
+    "Ticker",
+    "buy_time",
+    "sell_time",
+    "shares",
+    "cost_eur",
+    "proceeds_eur",
+    "profit_eur",
+    "holding_days",
+    "buy_row",
+    "sell_row",
+]
+
+
+def _match(codes, is_buy, is_sell, shares, price, lifo):
+    """match the sells with the open lots, transactions sorted by ticker and time
+
+    Returns:
+        (np.array, np.array, dict): cost and unmatched shares of each sell, and the matches as
+            lists: sell row, buy row, shares and price of the lot
+    """
+    n = len(codes)
+    cost = np.full(n, np.nan)
+    unmatched = np.full(n, np.nan)
+    matches = {"sell_row": [], "buy_row": [], "shares": [], "price": []}
+
+    open_lots = deque()
+    for i in range(n):
+        if i == 0 or codes[i] != codes[i - 1]:
+            open_lots = deque()
+        if np.isnan(shares[i]):
+            continue
+        if is_buy[i]:
+            # shares left, price and row of the lot
+            open_lots.append([shares[i], price[i], i])
+        elif is_sell[i]:
+            left, total = shares[i], 0.0
+            while left > EPS and open_lots:
+                lot = open_lots[-1] if lifo else open_lots[0]
+                taken = min(left, lot[0])
+                matches["sell_row"].append(i)
+                matches["buy_row"].append(lot[2])
+                matches["shares"].append(taken)
+                matches["price"].append(lot[1])
+                total += taken * lot[1]
+                left -= taken
+                lot[0] -= taken
+                if lot[0] > EPS:
+                    continue
+                if lifo:
+                    open_lots.pop()
+                else:
+                    open_lots.popleft()
+            cost[i] = total
+            unmatched[i] = max(left, 0.0)
+    return cost, unmatched, matches
+
+
+def realized_pnl(tr, method="fifo"):
+    """realized profit in euro of each sell, and of each lot it closes
+
+    The lots are matched in the order of the transactions within a ticker, by time. Shares sold
+    without an open lot, eg bought before the start of the export, have no cost and are
+    reported as unmatched, the profit only covers the matched shares.
+
+    Args:
+        tr (pd.DataFrame): transactions, as returned by cost_basis
+        method (str): one of METHODS. average keeps the profit_eur of cost_basis
+
+    Returns:
+        (pd.DataFrame, pd.DataFrame): the sells (SELL_COLUMNS), indexed by their row in tr, and
+            the closed lots (LOT_COLUMNS), one row per lot and sell, empty for the average method
+    """
+    if method not in METHODS:
+        raise ValueError(f"method should be one of {METHODS}, not {method!r}")
+
+    is_sell = (tr["Action"] == "sell").to_numpy()
+    price = tr["pirce_per_share_eur"].to_numpy(dtype="float")
+    shares = tr["No. of shares"].to_numpy(dtype="float")
+
+    if method == "average":
+        sells = tr.loc[is_sell, ["Ticker", "Time", "No. of shares"]]
+        sells["proceeds_eur"] = price[is_sell] * shares[is_sell]
+        sells["cost_eur"] = -tr.loc[is_sell, "invested_amount_eur"]
+        sells["profit_eur"] = tr.loc[is_sell, "profit_eur"]
+        sells["unmatched_shares"] = 0.0
+        return sells[SELL_COLUMNS], pd.DataFrame(columns=LOT_COLUMNS)
+
+    # by ticker, then by time, the transactions of the same time in their original order
+    codes, _ = pd.factorize(tr["Ticker"])
+    order = np.lexsort((tr["Time"].to_numpy(), codes))
+    cost, unmatched, matches = _match(
+        codes[order],
+        (tr["Action"] == "buy").to_numpy()[order],
+        is_sell[order],
+        shares[order],
+        price[order],
+        lifo=method == "lifo",
+    )
+
+    sells = tr.loc[is_sell, ["Ticker", "Time", "No. of shares"]]
+    sold = sells["No. of shares"].to_numpy(dtype="float")
+    sell_pos = np.empty(len(tr), dtype="int64")
+    sell_pos[order] = np.arange(len(tr))
+    sell_pos = sell_pos[is_sell]
+    sells["unmatched_shares"] = unmatched[sell_pos]
+    sells["proceeds_eur"] = price[is_sell] * (sold - sells["unmatched_shares"].to_numpy())
+    sells["cost_eur"] = cost[sell_pos]
+    sells["profit_eur"] = sells["proceeds_eur"] - sells["cost_eur"]
+
+    # rows of the matches, back in tr
+    sell_row = order[np.asarray(matches["sell_row"], dtype="int64")]
+    buy_row = order[np.asarray(matches["buy_row"], dtype="int64")]
+    lot_shares = np.asarray(matches["shares"], dtype="float")
+    times = tr["Time"].to_numpy()
+    lots = pd.DataFrame(
+        {
+            "Ticker": tr["Ticker"].to_numpy()[sell_row],
+            "buy_time": times[buy_row],
+            "sell_time": times[sell_row],
+            "shares": lot_shares,
+            "cost_eur": lot_shares * np.asarray(matches["price"], dtype="float"),
+            "proceeds_eur": lot_shares * price[sell_row],
+        }
+    )
+    lots["profit_eur"] = lots["proceeds_eur"] - lots["cost_eur"]
+    lots["holding_days"] = (lots["sell_time"] - lots["buy_time"]).dt.days
+    lots["buy_row"] = tr.index.to_numpy()[buy_row]
+    lots["sell_row"] = tr.index.to_numpy()[sell_row]
+    return sells[SELL_COLUMNS], lots
@@ -1,11 +1,20 @@
-from datetime import datetime, timedelta
-
-import altair as alt
 import numpy as np
 import pandas as pd
-import panel as pn
-import yfinance as yf
-from altair import datum
+from pandas.api.types import union_categoricals
+
+from scr.market_data import get_provider
+
+# the charts, imported from scr.plotting on first use so that reading the data does not load
+# altair
+_PLOTTING = ("plot_transactions", "plot_transactions_2")
+
+
+def __getattr__(name):
+    if name in _PLOTTING:
+        from scr import plotting
+
+        return getattr(plotting, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def _action_direction(action):
@@ -24,206 +33,125 @@ def _action_direction(action):
     else:
         return action
     
-def read_transactions(fln):
+# columns kept from the export, with the type they are read as. Result (EUR) is not used in
+# any calculation, single precision is enough
+TRANSACTION_DTYPES = {
+    "Action": "category",
+    "Time": "object",
+    "Ticker": "category",
+    "No. of shares": "float64",
+    "Price / share": "float64",
+    "Currency (Price / share)": "category",
+    "Exchange rate": "float64",
+    "Result (EUR)": "float32",
+}
+
+# read as numbers when they can be, otherwise left as text for scr.validation to report
+NUMERIC_COLUMNS = ["No. of shares", "Price / share", "Exchange rate", "Result (EUR)"]
+
+# columns not in the older exports, see scr.fx.DEFAULT_CURRENCY
+OPTIONAL_COLUMNS = ["Currency (Price / share)"]
+
+
+def _classify_actions(actions):
+    """buy or sell for each action, NaN for the other actions (deposit, dividend, ect.)
+
+    Args:
+        actions (pd.Series): categorical actions as in the export, eg 'Market buy'
+
+    Returns:
+        (pd.Categorical): with categories buy and sell
+    """
+    directions = np.array(
+        [_action_direction(action) for action in actions.cat.categories] + [np.nan],
+        dtype="object",
+    )
+    # code -1 (missing action) takes the last element, NaN
+    return pd.Categorical(directions[actions.cat.codes], categories=["buy", "sell"])
+
+
+def _header(fln):
+    """columns of a csv file, none when it is empty, an uploaded file is left at the position it
+    was"""
+    pos = fln.tell() if hasattr(fln, "read") else None
+    try:
+        return pd.read_csv(fln, nrows=0).columns
+    except pd.errors.EmptyDataError:
+        return pd.Index([])
+    finally:
+        if pos is not None:
+            fln.seek(pos)
+
+
+def read_transactions(fln, chunksize=100_000):
     """Read transaction *csv file downloaded from trading212.com. 
 
     how to download the transaction history is available here: https://community.trading212.com/t/new-feature-export-your-investing-history/35612
 
+    The file is read in chunks, keeping only the relevant columns, so that large exports fit in memory.
+    The numbers and dates that cannot be read are kept as text, see scr.validation.validate_transactions.
+    The columns of OPTIONAL_COLUMNS are left out when not in the export, the others raise
+    scr.validation.ValidationError before any row is read.
 
     Args:
-        fln (str): csv file name 
+        fln (str or file-like): csv file name, or an uploaded file 
+        chunksize (int, optional): number of rows read at once
 
     Returns:
         tr (pd.Dataframe): 
     """
-    tr = pd.read_csv(
-        fln, parse_dates=["Time"]
+    # imported here, scr.validation depends on the columns defined in this module
+    from scr.validation import check_schema
+
+    chunks = []
+    header = _header(fln)
+    check_schema(header)
+    columns = [column for column in TRANSACTION_DTYPES if column in header]
+    dtypes = {
+        column: TRANSACTION_DTYPES[column] for column in columns if column not in NUMERIC_COLUMNS
+    }
+    reader = pd.read_csv(
+        fln,
+        usecols=columns,
+        dtype=dtypes,
+        na_values={"Exchange rate": ["Not available"]},
+        parse_dates=["Time"],
+        chunksize=chunksize,
     )
+    for chunk in reader:
+        chunk["Action"] = _classify_actions(chunk["Action"])
+        for column in NUMERIC_COLUMNS:
+            if pd.api.types.is_numeric_dtype(chunk[column]):
+                chunk[column] = chunk[column].astype(TRANSACTION_DTYPES[column])
+
+        # drop reocords for deposing money or withdrawing money
+        chunks.append(chunk.loc[chunk["Action"].notna(), columns])
 
-    # keep only the most relevant columns
-    col_to_keep = [
-        "Action",
-        "Time",
-        "Ticker",
-        "No. of shares",
-        "Price / share",
-        "Exchange rate",
-        "Result (EUR)",
-    ]
-    tr = tr[col_to_keep]
-    tr.loc[tr["Action"].str.contains("buy"), "Action"] = "buy"
-    tr.loc[tr["Action"].str.contains("sell"), "Action"] = "sell"
-
-    # drop reocords for deposing money or withdrawing money
-    tr = tr.loc[tr["Action"].isin(["buy", "sell"])]
+    # share the categories of the tickers, so that they stay categorical when combined
+    tickers = union_categoricals([chunk["Ticker"] for chunk in chunks], sort_categories=True)
+    for chunk in chunks:
+        chunk["Ticker"] = chunk["Ticker"].cat.set_categories(tickers.categories)
+    tr = pd.concat(chunks)
 
     return tr
 
-def read_ticker_ts(ticker, start, end):
+def read_ticker_ts(ticker, start, end, provider=None):
     """Read the trading history through yfinance API, for the specified ticker. Note that the time history is provided for timezone (GMT)
 
     Args:
         ticker ([type]): [name of the stock, eg apple: APPL]
         start ([type]): [description]
         end ([type]): [description]
+        provider (optional): source of the daily bars, by default yahoo finance behind the on-disk cache
 
     Returns:
         [type]: [description]
     """
-    ticker = yf.Ticker(ticker)
-    ts = ticker.history(start=start, end=end, interval="1d", tz="GMT")
-    ts.reset_index(inplace=True)
+    provider = provider or get_provider()
+    ts = provider.download([ticker], start, end).xs(ticker, axis=1, level=1)
+    ts = ts.dropna(how="all").rename_axis("date").reset_index()
     ts.columns = [x.lower() for x in ts.columns]  # Rename the columns using lower case
 
     if not ts.empty:
         ts["date"] = ts["date"].dt.floor("d")
     return ts
-
-# base plot
-
-def plot_transactions(subset, ts):
-    """[summary]
-
-    Args:
-        subset ([type]): [description]
-        ts ([type]): [description]
-    """
-    open_close_color = alt.condition(
-        "datum.open <= datum.close", alt.value("#06982d"), alt.value("#ae1325")
-    )
-
-    base = (
-        alt.Chart(ts).encode(
-            alt.X(
-                "date:T", axis=alt.Axis(format="%y/%m/%d", labelAngle=-45, title="Date")
-            ),
-            color=open_close_color,
-        ).properties(width=400, height=300)
-    )
-
-    rule = base.mark_rule().encode(
-        alt.Y("low:Q", title="Price", scale=alt.Scale(zero=False),), alt.Y2("high:Q")
-    )
-
-    bar = base.mark_bar(size=2).encode(alt.Y("open:Q"), alt.Y2("close:Q")).interactive()
-
-    # add annotation for action undertook
-    annotation = (
-        alt.Chart(subset)
-        .mark_text(align="left", baseline="middle", fontSize=10, dx=7)
-        .encode(
-            x=alt.X(
-                "Time",
-                axis=alt.Axis(
-                    format="%y/%m/%d",
-                    labelAngle=0,
-                    #               title='Date'
-                ),
-            ),
-            y="Price / share",
-            text="label:N",
-            color="action",
-        )
-        .transform_calculate(label='datum.action + " " + datum["No. of shares"]')
-    )
-
-    # add the markers
-    text = (
-        alt.Chart(subset)
-        .mark_text(dx=0, dy=0, angle=90, fontSize=14)
-        .encode(
-            x=alt.X(
-                "Time",
-                axis=alt.Axis(
-                    format="%y/%m/%d",
-                    labelAngle=-45,
-                    #               title='Date'
-                ),
-            ),
-            y="Price / share",
-            text="textof",
-            color="action",
-        )
-    )
-
-    return rule + bar + annotation + text
-
-def plot_transactions_2(subset, ts):
-
-    # Add selection bar
-    nearest = alt.selection(
-        type="single", nearest=True, on="mouseover", fields=["date"], empty="none"
-    )
-
-    # The basic line
-    line = (
-        alt.Chart(ts)
-        .mark_line(interpolate="basis")
-        .encode(
-            x=alt.X(
-                "date:T",
-                axis=alt.Axis(
-                    format="%y/%m/%d",
-                    labelAngle=0,
-                    #               title='Date'
-                ),
-            ),
-            y="close:Q",
-        ).properties(width=400, height=300)
-    )
-
-    # Transparent selectors across the chart. This is what tells us
-    # the x-value of the cursor
-    selectors = (
-        alt.Chart(ts)
-        .mark_point()
-        .encode(x="date:T", opacity=alt.value(0),)
-        .add_selection(nearest)
-    )
-
-    # Draw points on the line, and highlight based on selection
-    points = line.mark_point().encode(
-        opacity=alt.condition(nearest, alt.value(1), alt.value(0))
-    )
-
-    # Draw text labels near the points, and highlight based on selection
-    text_close = line.mark_text(align="left", dx=5, dy=-5).encode(
-        text=alt.condition(nearest, "close:Q", alt.value(""), format=",.2f")
-    )
-
-    # Draw a rule at the location of the selection
-    rules = (
-        alt.Chart(ts)
-        .mark_rule(color="gray")
-        .encode(x="date:T",)
-        .transform_filter(nearest)
-    )
-
-    # add marker for the actions undertook
-    markers = (
-        alt.Chart(subset)
-        .mark_circle(color="action", filled=True)
-        .encode(x="Time:T", y="Price / share:Q")
-    )
-
-    # add annotation for action undertook
-    annotation = (
-        alt.Chart(subset)
-        .mark_text(align="left", baseline="middle", fontSize=10, dx=7)
-        .encode(
-            x=alt.X(
-                "Time",
-                axis=alt.Axis(
-                    format="%y/%m/%d",
-                    labelAngle=-45,
-                    #               title='Date'
-                ),
-            ),
-            y="Price / share",
-            text="label:N",
-            color="action",
-        )
-        .transform_calculate(label='datum["No. of shares"]')
-    )
-
-    return line + selectors + points + text_close + rules + annotation + markers
\ No newline at end of file
@@ -0,0 +1,284 @@
+"""Data-quality checks of the transactions, vectorized over all the rows at once, so that a bad
+export stops or is cleaned before the prices are fetched and the positions calculated
+
+    tr, report = validate_transactions(read_transactions(fln))
+
+The columns are checked by read_transactions as soon as the header is read, see check_schema.
+validate_transactions needs the export only: the columns and their types, the numbers and dates
+that could not be read, the missing or non-positive shares, prices and exchange rates, and the
+transactions out of time order. check_positions runs once the daily bars are downloaded, as the
+shares are compared in the basis of the splits: the sells of more shares than held, and the
+tickers without prices.
+
+The issues are gathered in a ValidationReport. With the policy "fail", an error raises
+ValidationError before the next stage starts. With "quarantine", the rows at fault are set
+aside in the report, the transactions out of order are sorted, and the pipeline continues with
+the others. The warnings, eg a ticker without prices, never stop the pipeline. An export without
+any transaction left raises whatever the policy, see check_not_empty. The policy is set
+by PORTFOLIO_VALIDATION, quarantine by default.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from scr.utility import NUMERIC_COLUMNS, OPTIONAL_COLUMNS, TRANSACTION_DTYPES
+
+POLICIES = ("fail", "quarantine")
+POLICY = os.environ.get("PORTFOLIO_VALIDATION", "quarantine")
+
+# rows of the export listed per issue, the others are counted
+MAX_EXAMPLES = 5
+
+# shares left over by the rounding of the fractional shares
+SHARES_TOLERANCE = 1e-6
+
+
+class ValidationError(ValueError):
+    """transactions failing the validation, with the policy fail"""
+
+    def __init__(self, report):
+        super().__init__(str(report))
+        self.report = report
+
+
+class ValidationReport:
+    """issues found in the transactions of an export, by the checks run so far
+
+    Attributes:
+        policy (str): one of POLICIES
+        n_rows (int): number of transactions checked
+        issues (list): one dict per issue, with the check, its severity (error or warning), the
+            column, the number of rows at fault, the first of them (row of the export) and a
+            message
+        quarantined (pd.DataFrame): rows set aside, with the check they failed
+    """
+
+    def __init__(self, policy=None):
+        policy = POLICY if policy is None else policy
+        if policy not in POLICIES:
+            raise ValueError(f"unknown policy {policy}, expected one of {POLICIES}")
+        self.policy = policy
+        self.n_rows = 0
+        self.issues = []
+        self.quarantined = pd.DataFrame()
+
+    def add(self, check, message, rows=(), column=None, severity="error"):
+        self.issues.append(
+            {
+                "check": check,
+                "severity": severity,
+                "column": column,
+                "rows": len(rows),
+                "examples": [int(row) for row in rows[:MAX_EXAMPLES]],
+                "message": message,
+            }
+        )
+
+    @property
+    def errors(self):
+        return [issue for issue in self.issues if issue["severity"] == "error"]
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def to_dict(self):
+        """json-ready report"""
+        return {
+            "policy": self.policy,
+            "rows": self.n_rows,
+            "quarantined": len(self.quarantined),
+            "issues": self.issues,
+        }
+
+    @classmethod
+    def from_dict(cls, report, quarantined=None):
+        """report from to_dict, with the rows set aside
+
+        Args:
+            report (dict): as returned by to_dict
+            quarantined (pd.DataFrame, optional): rows set aside, not kept by to_dict
+        """
+        restored = cls(report["policy"])
+        restored.n_rows = report["rows"]
+        restored.issues = list(report["issues"])
+        if quarantined is not None:
+            restored.quarantined = quarantined
+        return restored
+
+    def __str__(self):
+        lines = [f"{len(self.errors)} errors in {self.n_rows} transactions"]
+        for issue in self.issues:
+            column = f" [{issue['column']}]" if issue["column"] else ""
+            rows = f", {issue['rows']} rows eg {issue['examples']}" if issue["rows"] else ""
+            lines.append(f"{issue['severity']} {issue['check']}{column}: {issue['message']}{rows}")
+        return "\n".join(lines)
+
+
+def _flag(report, reason, tr, bad, check, message, column=None):
+    """record the rows of tr at fault, the first check failed is kept as the reason"""
+    if bad.any():
+        report.add(check, message, tr.index[bad], column)
+        reason[bad & (reason == "")] = check
+
+
+def _enforce(report, tr, reason):
+    """raise on the errors with the policy fail, otherwise set the rows at fault aside"""
+    if report.policy == "fail" and not report.ok:
+        raise ValidationError(report)
+    bad = reason != ""
+    if bad.any():
+        quarantined = tr.loc[bad].assign(check=reason[bad])
+        report.quarantined = pd.concat([report.quarantined, quarantined])
+        tr = tr.loc[~bad]
+    return tr
+
+
+def check_schema(columns, report=None):
+    """raise when columns of TRANSACTION_DTYPES are not in the export, whatever the policy:
+    nothing can be set aside, the export is not a transaction history
+
+    Args:
+        columns (list): columns of the export
+        report (ValidationReport, optional): report to add the issue to
+    """
+    report = ValidationReport() if report is None else report
+    missing = [
+        column
+        for column in TRANSACTION_DTYPES
+        if column not in columns and column not in OPTIONAL_COLUMNS
+    ]
+    if missing:
+        report.add("schema", f"missing columns {missing}")
+        raise ValidationError(report)
+    return report
+
+
+def check_not_empty(tr, report=None):
+    """raise when no transaction with a ticker is left, whatever the policy: there are no prices
+    to fetch, eg an export without any buy or sell, or with all of them set aside
+
+    Args:
+        tr (pd.DataFrame): transactions left to process
+        report (ValidationReport, optional): report to add the issue to
+    """
+    report = ValidationReport() if report is None else report
+    if not tr["Ticker"].notna().any():
+        report.add("empty", "no buy or sell of a ticker left to process")
+        raise ValidationError(report)
+    return report
+
+
+def validate_transactions(tr, policy=None, report=None):
+    """schema, type, value and order checks of the transactions, before any download
+
+    Args:
+        tr (pd.DataFrame): transactions, as returned by read_transactions
+        policy (str, optional): one of POLICIES, POLICY by default
+        report (ValidationReport, optional): report to add the issues to
+
+    Returns:
+        (pd.DataFrame, ValidationReport): the transactions to process, with the types of
+            TRANSACTION_DTYPES, and the report
+    """
+    report = ValidationReport(policy) if report is None else report
+    check_schema(tr.columns, report)
+    report.n_rows += len(tr)
+    reason = np.full(len(tr), "", dtype="object")
+
+    # the values that could not be read are left as text by read_transactions
+    converted = {}
+    for column in NUMERIC_COLUMNS:
+        if not pd.api.types.is_numeric_dtype(tr[column]):
+            values = pd.to_numeric(tr[column], errors="coerce")
+            bad = (values.isna() & tr[column].notna()).to_numpy()
+            _flag(report, reason, tr, bad, "types", "not a number", column)
+            converted[column] = values
+    if not pd.api.types.is_datetime64_dtype(tr["Time"]):
+        values = pd.to_datetime(tr["Time"], errors="coerce")
+        bad = (values.isna() & tr["Time"].notna()).to_numpy()
+        _flag(report, reason, tr, bad, "types", "not a date", "Time")
+        converted["Time"] = values
+    if converted:
+        tr = tr.assign(**converted)
+    tr = tr.astype({column: TRANSACTION_DTYPES[column] for column in NUMERIC_COLUMNS})
+
+    time = tr["Time"].to_numpy()
+    _flag(report, reason, tr, np.isnat(time) & (reason == ""), "values", "missing", "Time")
+    for column in ["No. of shares", "Price / share", "Exchange rate"]:
+        values = tr[column].to_numpy()
+        bad = ~(values > 0) & (reason == "")
+        _flag(report, reason, tr, bad, "values", "missing or not positive", column)
+
+    # the cost basis runs through the transactions of a ticker in the order of the export
+    valid = ~np.isnat(time)
+    unsorted = np.zeros(len(tr), dtype="bool")
+    if valid.any():
+        latest = np.maximum.accumulate(np.where(valid, time, time[valid].min()))
+        unsorted = valid & (time < latest)
+    if unsorted.any():
+        report.add("order", "earlier than the transaction before", tr.index[unsorted], "Time")
+
+    tr = _enforce(report, tr, reason)
+    check_not_empty(tr, report)
+    if unsorted.any():
+        tr = tr.sort_values(by="Time", kind="mergesort")
+    return tr, report
+
+
+def check_positions(tr, held=None, policy=None, report=None):
+    """sells of more shares than held, the shares adjusted for the splits
+
+    The sells are checked in order, a sell flagged counts as selling all the shares held: the
+    position is clipped at 0 after it, the sells after it are checked against the shares bought
+    since.
+
+    Args:
+        tr (pd.DataFrame): transactions, as returned by scr.corporate_actions.adjust_splits
+        held (pd.Series, optional): shares held per ticker before the transactions
+        policy (str, optional): one of POLICIES, POLICY by default
+        report (ValidationReport, optional): report to add the issues to
+
+    Returns:
+        (pd.DataFrame, ValidationReport): the transactions to process and the report
+    """
+    report = ValidationReport(policy) if report is None else report
+    shares = tr["No. of shares"].to_numpy(dtype="float")
+    is_sell = (tr["Action"] == "sell").to_numpy()
+    codes, tickers = pd.factorize(tr["Ticker"])
+    start = np.zeros(len(tickers)) if held is None else held.reindex(tickers).fillna(0).to_numpy()
+
+    # running position per ticker without the clipping, the transactions without ticker on
+    # code -1 start from 0
+    signed = pd.Series(np.where(is_sell, -shares, shares))
+    unclipped = signed.groupby(codes).cumsum().to_numpy() + np.append(start, 0.0)[codes]
+    # clipping at 0 after each sell flagged is the same as subtracting the lowest the unclipped
+    # position went below 0 on the rows before, per ticker
+    floor = pd.Series(np.minimum(unclipped, 0)).groupby(codes).cummin()
+    floor = floor.groupby(codes).shift(fill_value=0).to_numpy()
+    position = unclipped - floor
+    bad = is_sell & (codes >= 0) & (position < -SHARES_TOLERANCE)
+
+    reason = np.full(len(tr), "", dtype="object")
+    _flag(report, reason, tr, bad, "positions", "more shares sold than held", "No. of shares")
+    return _enforce(report, tr, reason), report
+
+
+def check_tickers(missing, failures=None, report=None):
+    """tickers without prices, left out of the positions
+
+    Args:
+        missing (list): tickers without a price history
+        failures (dict, optional): failed downloads, per ticker, see scr.fetcher.FetchError
+        report (ValidationReport, optional): report to add the issues to
+
+    Returns:
+        (ValidationReport): the report
+    """
+    report = ValidationReport() if report is None else report
+    failures = failures or {}
+    for ticker in missing:
+        reason = f" ({failures[ticker].reason})" if ticker in failures else ""
+        report.add("tickers", f"{ticker} not in the database{reason}", severity="warning")
+    return report
@@ -1,3 +1,4 @@
+import logging
 import sys
 from datetime import date, datetime, timedelta
 
@@ -9,7 +10,16 @@ import plotly.io as pio
 import streamlit as st
 from plotly.subplots import make_subplots
 
-from scr.data_preparation import data_preprocessing
+from scr.analytics import Analytics
+from scr.dashboard import PNL_SERIES
+from scr.downsampling import render_mode
+from scr.memo import content_hash
+from scr import profiling
+from scr.artifacts import ArtifactStore
+from scr.profiling import stage
+from scr.validation import ValidationError
+
+logger = logging.getLogger("web_app")
 
 pio.templates.default = "plotly_white"
 st.set_page_config(layout="wide")
@@ -32,21 +42,48 @@ if uploaded_file is not None:
 else:
     fln = "./data/dummy_transactions.csv"
 
-df_combined, tr, start, end, data = data_preprocessing(fln)
-df_combined = df_combined.rename(
-    {"time_ts": "time", "value": "open position",
-        "cum_total_eur": "invested amount", },
-    axis=1,
-)
-df_agg = df_combined.pivot_table(
-    index="time",
-    values=["open position", "invested amount", "profit_eur"],
-    aggfunc="sum",
-).reset_index()
-df_agg["realized profit"] = df_agg["profit_eur"].cumsum()
-df_agg["floating profit"] = df_agg["open position"] - df_agg["invested amount"]
+@st.cache(allow_output_mutation=True)
+def analytics():
+    """dashboards prepared by this server, keyed by the content hash of the export, and the
+    exports processed by any worker, stored on disk and kept across restarts"""
+    return Analytics(ArtifactStore())
+
+
+# stages measured in this run only, shown at the bottom when PORTFOLIO_PROFILE=1
+profiling.reset()
+
+# reruns with the same export reuse the prepared dashboard
+with stage("content_hash"):
+    fln_hash = content_hash(fln)
+try:
+    fln_hash, dash = analytics().prepare(fln, fln_hash)
+except ValidationError as err:
+    if any(issue["check"] == "schema" for issue in err.report.issues):
+        st.error(f"The file is not a transaction history exported from Trading 212:\n\n{err}")
+    else:
+        st.error(f"The export cannot be processed, set PORTFOLIO_VALIDATION=quarantine to leave out the rows at fault:\n\n{err}")
+    st.stop()
+except Exception:
+    # a bug rather than a bad export, the details stay in the log of the server
+    logger.exception("preparing the dashboard failed")
+    st.error("The export could not be processed because of an internal error.")
+    st.stop()
+if dash.validation is not None and dash.validation.issues:
+    st.warning(
+        "Some transactions of the export need a look, {:} of {:} are left out:\n\n{:}".format(
+            len(dash.validation.quarantined), dash.validation.n_rows, dash.validation
+        )
+    )
+
+end = dash.end
+pnl = dash.section("pnl")
+df_agg = pnl["df_agg"]
 last_row = df_agg.tail(1)
 
+# long histories are downsampled, unless asked otherwise
+full_resolution = st.sidebar.checkbox("charts at full resolution")
+df_plot = df_agg if full_resolution else pnl["df_agg_plot"]
+
 # row1
 st.write("")
 row1_space1, row1_1, row1_space2, row1_2, row1_space3 = st.beta_columns(
@@ -54,14 +91,14 @@ row1_space1, row1_1, row1_space2, row1_2, row1_space3 = st.beta_columns(
 )
 
 # line plot for portfolio time history
-with row1_1:
+with row1_1, stage("row1: portfolio history"):
     fig = px.line(
-        df_agg,
+        df_plot,
         x="time",
-        y=["open position", "invested amount",
-            "floating profit", "realized profit"],
+        y=PNL_SERIES,
         hover_data={"time": "|%B %d, %Y"},
         title="profit and loss",
+        render_mode=render_mode(len(df_plot) * len(PNL_SERIES)),
     )
 
     fig.update_xaxes(dtick="M1", tickformat="%b\n%Y")
@@ -72,13 +109,15 @@ with row1_1:
 
     st.write("")
     st.markdown(
-        "Up to {:}, you've invested **{:,.1f}** EUR on this platform. The total profit amounts to **{:,.1f}** EUR: the realized profit is **{:,.1f}** EUR while the floating profit is **{:,.1f}** EUR".format(
+        "Up to {:}, you've invested **{:,.1f}** EUR on this platform. The total profit amounts to **{:,.1f}** EUR: the realized profit is **{:,.1f}** EUR while the floating profit is **{:,.1f}** EUR, and the dividends paid **{:,.1f}** EUR".format(
             (end).strftime("%b %d, %Y"),
             last_row["invested amount"].values[0],
             last_row["floating profit"].values[0]
-            + last_row["realized profit"].values[0],
+            + last_row["realized profit"].values[0]
+            + last_row["dividends"].values[0],
             last_row["realized profit"].values[0],
             last_row["floating profit"].values[0],
+            last_row["dividends"].values[0],
         )
     )
     if last_row["realized profit"].values[0] > 0:
@@ -86,30 +125,45 @@ with row1_1:
     else:
         st.markdown("Not bad!")
     st.markdown(
-        "*note: profit and loss calculation includes only US listed stock. Your actual profit/loss may vary, depending on the portion of non-US listed*"
+        "*note: the prices are converted to EUR at the exchange rate of the currency they are quoted in, the shares bought before a split are counted in the shares after it and the dividends are estimated from the shares held on the ex-date. Profit and loss calculation includes only the stocks found on yahoo finance, your actual profit/loss may vary, depending on the portion of the others*"
     )
 
-with row1_2:
-    df_ = df_combined.loc[
-        (df_combined["time"] == (end - timedelta(1)).floor("1d"))
-        & (df_combined["cum_shares"] > 0.25)
-    ]
-    df_ = df_.drop_duplicates(
-        subset=["time", "ticker"], keep="last", inplace=False, ignore_index=False
+    # time-weighted and money-weighted returns of the whole portfolio
+    performance = dash.section("performance")["portfolio_performance"]
+    st.markdown(
+        "The time-weighted return measures the performance of your picks, whatever the amounts invested, the money-weighted return (XIRR) what you made on your money, annualized:"
+    )
+    returns = (performance[["twr", "twr_annualized", "xirr"]] * 100).round(1)
+    returns.columns = ["TWR [%]", "TWR annualized [%]", "XIRR [%]"]
+    st.table(returns.assign(since=performance["start"].dt.date))
+
+with row1_2, stage("row1: current portfolio"):
+    # the composition at any date, from the holdings index
+    holdings = dash.section("holdings")["holdings"]
+    last_day = (end - timedelta(1)).floor("1d")
+    as_of = st.slider(
+        "portfolio as of",
+        min_value=holdings.days[0].date(),
+        max_value=last_day.date(),
+        value=last_day.date(),
+        format="MMM DD, YYYY",
     )
+    df_ = holdings.composition(as_of).reset_index()
 
     fig = px.pie(
         df_, values="open position", names="ticker", title="portfolio composition"
     )
     st.plotly_chart(fig)
 
-    tickers_sorted = df_.sort_values(
-        by="open position", ascending=False).ticker.values
-    st.markdown(
-        "**{:}** has the heaviest weight in your current portfolio, followed by {:} ".format(
-            tickers_sorted[0], ", ".join(tickers_sorted[1:5])
+    tickers_sorted = df_.ticker.values
+    if len(tickers_sorted):
+        st.markdown(
+            "**{:}** has the heaviest weight in your portfolio on {:}, followed by {:} ".format(
+                tickers_sorted[0],
+                as_of.strftime("%b %d, %Y"),
+                ", ".join(tickers_sorted[1:5]),
+            )
         )
-    )
 
 # row2
 st.write("")
@@ -118,16 +172,11 @@ row2_space1, row2_1, row2_space2, row2_2, row2_space3 = st.beta_columns(
 )
 
 # fig_2-1, monthly transaction overview
-with row2_1:
-    mt = (
-        tr.groupby(by=[pd.Grouper(key="Time", freq="M"), "Action"])["Action"]
-        .count()
-        .rename("transactions")
-        .reset_index()
-    )  # monthly transaction
+with row2_1, stage("row2: monthly transactions"):
+    monthly = dash.section("monthly")
+    mt = monthly["mt"]  # monthly transaction
 
     fig = go.Figure()
-    mt["mnth_yr"] = mt["Time"].apply(lambda x: x.strftime("%b-%Y"))
 
     for action in ["buy", "sell"]:
         mt_ = mt.loc[mt["Action"] == action]
@@ -143,29 +192,17 @@ with row2_1:
     st.plotly_chart(fig)
 
     # include some statistics about the transactions
-    start_date = tr.Time.min().strftime("%b %d, %Y")
-    end_date = tr.Time.max().strftime("%b %d, %Y")
-    total_orders = mt.transactions.sum()
-    buy_orders = mt.loc[mt["Action"] == "buy"].transactions.sum()
-    sell_orders = mt.loc[mt["Action"] == "sell"].transactions.sum()
-    most_frequent_month = mt.groupby(
-        by="mnth_yr")["transactions"].sum().idxmax()
-    most_frequent_count = mt.groupby(by="mnth_yr")["transactions"].sum().max()
-
-    def diff_month(d1, d2):
-        return (d1.year - d2.year) * 12 + d1.month - d2.month
-
-    diff_month = diff_month(tr.Time.max(), tr.Time.min())
-    monthly_orders = total_orders / (diff_month + 1)
+    monthly_stats = monthly["monthly_stats"]
     # st.markdown('During the selected period, in total ')
     st.markdown(
-        f"Between {start_date:} and {end_date:}, you executed in total **{total_orders:0.0f}** orders: {buy_orders:0.0f} buying and {sell_orders:0.0f} selling orders. In average, you sell and buy **{monthly_orders:0.1f}** times each month. {most_frequent_month:} is the month with the most frequent transactions, reaching {most_frequent_count:} orders."
+        "Between {start_date:} and {end_date:}, you executed in total **{total_orders:0.0f}** orders: {buy_orders:0.0f} buying and {sell_orders:0.0f} selling orders. In average, you sell and buy **{monthly_orders:0.1f}** times each month. {most_frequent_month:} is the month with the most frequent transactions, reaching {most_frequent_count:} orders.".format(**monthly_stats)
     )  #
 
 # fig_2-2 chart of distribution over the day and week
-with row2_2:
-    day_names = tr.Time.dt.day_name()
-    hours = tr.Time.round("1h").dt.time
+with row2_2, stage("row2: trading times"):
+    trading_times = dash.section("trading_times")
+    day_counts = trading_times["day_counts"]
+    hour_counts = trading_times["hour_counts"]
 
     fig = go.Figure()
 
@@ -176,14 +213,14 @@ with row2_2:
                         "distribution over the week"],
     )
 
-    m = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
-    fig.add_trace(go.Histogram(
-        x=sorted(day_names, key=m.index),), row=1, col=1)
+    # counts binned on the server, rather than one value per transaction
+    fig.add_trace(go.Bar(
+        x=day_counts.index, y=day_counts.values,), row=1, col=1)
     fig.update_xaxes(title_text="day of a week", row=1,
                      col=1, tickformat="%H-%M-%S")
     fig.update_yaxes(title_text="counts", row=1, col=1)
 
-    fig.add_trace(go.Histogram(x=sorted(hours),), row=1, col=2)
+    fig.add_trace(go.Bar(x=hour_counts.index, y=hour_counts.values,), row=1, col=2)
     fig.update_xaxes(title_text="time of day", row=1,
                      col=2, tickformat="%H:%M")
     fig.update_yaxes(title_text="counts", row=1, col=2)
@@ -193,57 +230,67 @@ with row2_2:
     st.plotly_chart(fig)
 
     st.markdown(
-        f"You are more likely to trade on **{day_names.value_counts().idxmax()}** than the rest of the week. When looking at the distribution over the day, **{hours.value_counts().idxmax():%H} o'clock(GMT)** is the peak hour for you to place an order."
+        f"You are more likely to trade on **{trading_times['peak_day']}** than the rest of the week. When looking at the distribution over the day, **{trading_times['peak_hour']:%H} o'clock ({dash.tz})** is the peak hour for you to place an order."
     )
 
 
-# row3
+# row3, calculated on demand: the correlation and the risk need the returns of every ticker
 st.write("")
-row3_space1, row3_1, row3_space2, row3_2, row3_space3 = st.beta_columns(
-    (0.1, 1, 0.1, 1, 0.1)
-)
-
-with row3_1:
-    retscomp = data["Adj Close"].pct_change()
-    corr = retscomp.corr()
-    cols = df_.ticker.dropna().unique()
-    retscomp = data.loc[:, ("Adj Close", cols)].droplevel(0, axis=1)
-    retscomp = retscomp.pct_change()
-    corr = retscomp.corr()
-    fig31 = go.Figure(
-        data=go.Heatmap(
-            z=corr,
-            x=cols,
-            y=cols,
-            colorscale="Hot",
-            reversescale=True,
-            zmax=1.0,
-            zmin=0.0,
-        )
+if st.checkbox("show the correlation and the return/risk of the current portfolio"):
+    row3_space1, row3_1, row3_space2, row3_2, row3_space3 = st.beta_columns(
+        (0.1, 1, 0.1, 1, 0.1)
     )
 
-    fig31.update_layout(title_text="stock correlation analysis",)
-
-    st.plotly_chart(fig31)
+    with row3_1, stage("row3: correlation"):
+        correlation = dash.section("correlation")
+        cols = correlation["cols"]
+        corr = correlation["corr"]
+        fig31 = go.Figure(
+            data=go.Heatmap(
+                z=corr,
+                x=cols,
+                y=cols,
+                colorscale="Hot",
+                reversescale=True,
+                zmax=1.0,
+                zmin=0.0,
+            )
+        )
 
-    most_correlated = corr.unstack().sort_values(
-        ascending=False).drop_duplicates().index[1]
-# print(*most_correlated)
-    st.markdown('The correlation measures how the price of one stock moves in relation to the other. Knowing the correlation will help us understand whether the return of one stock is affected by other stocks. In the chart, the darker the color the more correlated are the two stocks, i.e. the pair is more likely to move in the same direction. In your portfolio, {:} and {:} is the most correlated pair.'.format(
-        *most_correlated))
-    st.markdown(
-        'If you are interested in the technical background, please refer to this [post](https://towardsdatascience.com/in-12-minutes-stocks-analysis-with-pandas-and-scikit-learn-a8d8a7b50ee7)')
-
-with row3_2:
-    fig32 = px.scatter(x=retscomp.mean(), y=retscomp.std(), text=cols)
-    fig32.update_traces(textposition="top center")
-    fig32.update_layout(
-        #     height=800,
-        title_text="return and Risk",
-        xaxis_title="Return",
-        yaxis_title="Risk",
-    )
-    st.plotly_chart(fig32)
-    max_ratio = (retscomp.mean()/retscomp.std()).index[0]
-    st.markdown(
-        'In this chart, the stocks are measured in two dimensions: return and risk. In your portfolio, {:} has the largest return and risk ratio. If interested in the technical details, please refer to this [post](https://towardsdatascience.com/in-12-minutes-stocks-analysis-with-pandas-and-scikit-learn-a8d8a7b50ee7).'.format(max_ratio))
+        fig31.update_layout(title_text="stock correlation analysis",)
+
+        st.plotly_chart(fig31)
+
+        most_correlated = correlation["most_correlated"]
+        # print(*most_correlated)
+        st.markdown('The correlation measures how the price of one stock moves in relation to the other. Knowing the correlation will help us understand whether the return of one stock is affected by other stocks. In the chart, the darker the color the more correlated are the two stocks, i.e. the pair is more likely to move in the same direction.')
+        # no pair with a single stock
+        if most_correlated is not None:
+            st.markdown('In your portfolio, {:} and {:} is the most correlated pair.'.format(
+                *most_correlated))
+        st.markdown(
+            'If you are interested in the technical background, please refer to this [post](https://towardsdatascience.com/in-12-minutes-stocks-analysis-with-pandas-and-scikit-learn-a8d8a7b50ee7)')
+
+    with row3_2, stage("row3: return and risk"):
+        risk_return = dash.section("risk_return")
+        fig32 = px.scatter(x=risk_return["ret_mean"], y=risk_return["ret_std"], text=cols)
+        fig32.update_traces(textposition="top center")
+        fig32.update_layout(
+            #     height=800,
+            title_text="return and Risk",
+            xaxis_title="Return",
+            yaxis_title="Risk",
+        )
+        st.plotly_chart(fig32)
+        max_ratio = risk_return["max_ratio"]
+        if max_ratio is not None:
+            st.markdown(
+                'In this chart, the stocks are measured in two dimensions: return and risk. In your portfolio, {:} has the largest return and risk ratio. If interested in the technical details, please refer to this [post](https://towardsdatascience.com/in-12-minutes-stocks-analysis-with-pandas-and-scikit-learn-a8d8a7b50ee7).'.format(max_ratio))
+        st.markdown(
+            "Over the last {:} trading days, the annualised volatility and Sharpe ratio of the stocks, next to the volatility weighting the recent days more, and the drawdown from the highest price:".format(dash.risk.window))
+        st.table(risk_return["risk_metrics"])
+
+if profiling.ENABLED:
+    with st.beta_expander("profiling"):
+        st.table(pd.DataFrame(profiling.report()))
+        st.json(profiling.report_json())